@@ -49,9 +49,11 @@ setup(
     license="GNU Affero General Public License v3",
     package_dir={'': 'src'},
     namespace_packages=['nl'],
+    extras_require={
+        "fast": ["orjson"],
+    },
     install_requires=[
         'setuptools',
-        'zope.interface',
         'requests',
         "tqdm",
         "lxml"
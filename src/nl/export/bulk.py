@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Massenänderungen
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from pathlib import Path
+import csv
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Felder, über die ein Objekt bestimmt wird
+KEY_FIELDS = ("@id", "UID")
+
+CHANGED = "geaendert"
+UNCHANGED = "unveraendert"
+DRY_RUN = "trocken"
+FAILED = "fehler"
+
+# Inhalt einer CSV Zelle, um ein Feld zu leeren, leere Zellen bleiben unverändert
+CLEAR = "<leer>"
+
+
+def decode_value(value: str) -> typing.Any:
+    """Wert einer CSV Zelle, Listen und Objekte als JSON"""
+    if value == CLEAR:
+        return None
+
+    if value[:1] in ("[", "{"):
+        try:
+            return codec.loads(value)
+        except ValueError:
+            pass
+
+    return value
+
+
+def read_csv(path: Path) -> typing.Iterator:
+    """Änderungen aus einer CSV Datei, eine Spalte je Feld"""
+    with path.open(newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh, delimiter=';', quotechar='"'):
+            yield {key: decode_value(val) for key, val in row.items() if val}
+
+
+def read_jsonl(path: Path) -> typing.Iterator:
+    """Änderungen aus einer JSON Lines Datei, ein Objekt je Zeile"""
+    with path.open("rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield codec.loads(line)
+
+
+READERS = {".csv": read_csv,
+           ".jsonl": read_jsonl}
+
+
+def read_changes(path: Path) -> typing.Iterator:
+    """Änderungen anhand der Dateiendung lesen"""
+    try:
+        return READERS[path.suffix.lower()](path)
+    except KeyError:
+        raise ValueError(f"Unbekanntes Format: {path}")
+
+
+def split_change(change: dict) -> tuple:
+    """Kennung und neue Werte einer Änderung"""
+    for field in KEY_FIELDS:
+        if change.get(field):
+            ident = change[field]
+            break
+    else:
+        raise KeyError(f"Keine Kennung ({', '.join(KEY_FIELDS)}) in der Änderung")
+
+    values = {key: val for key, val in change.items() if key not in KEY_FIELDS}
+
+    return (ident, values)
+
+
+def same_value(current: typing.Any, value: typing.Any) -> bool:
+    """Ob ein Wert aus der Datei dem Wert der REST API entspricht
+
+    Einträge aus Vokabularen (`{"token", "title"}`) gleichen ihrem Token
+    oder Titel, Zahlen und Wahrheitswerte ihrer Schreibweise in CSV.
+    """
+    if isinstance(current, dict) and "token" in current:
+        if isinstance(value, dict):
+            return current.get("token") == value.get("token")
+        return value in (current.get("token"), current.get("title"))
+
+    if isinstance(current, list) and isinstance(value, list):
+        return len(current) == len(value) and all(same_value(cur, val) for cur, val in zip(current, value))
+
+    if isinstance(current, (bool, int, float)) and isinstance(value, str):
+        return codec.dumps(current).decode("utf-8") == value.strip().lower()
+
+    if current in (None, "", []) and value in (None, "", []):
+        return True
+
+    return current == value
+
+
+def differences(item: dict, values: dict) -> dict:
+    """Die abweichenden Felder als {Feld: [alt, neu]}"""
+    return {key: [item.get(key), val] for key, val in values.items() if not same_value(item.get(key), val)}
+
+
+def resolve_url(session: typing.Any, ident: str) -> str | None:
+    """API Link zu einer Kennung, UIDs werden über die Suche aufgelöst"""
+    from nl.export.codec import response_json
+    from nl.export.errors import Unauthorized
+    from nl.export.plone import make_url
+
+    if ident.startswith(("http://", "https://")):
+        return ident
+
+    with session.get(make_url("/@search"), params={"UID": ident}) as req:
+        if req.status_code in (401, 403):
+            raise Unauthorized
+        elif req.status_code != 200:
+            return None
+
+        items = response_json(req).get("items", [])
+
+    return items[0]["@id"] if len(items) else None
+
+
+def apply_change(session: typing.Any, change: dict, dry_run: bool = False, compare: bool = False) -> dict:
+    """Eine Änderung anwenden
+
+    Ohne Vergleich wird das Objekt direkt mit den angegebenen Feldern
+    geändert, mit `@id` ohne weitere Anfrage, mit `UID` nach einer Suche.
+    Mit `compare` oder `dry_run` wird es vorher geladen und nur die
+    abweichenden Felder werden geändert bzw. gemeldet.
+
+    Args:
+        session (requests.Session): Gemeinsame Sitzung
+        change (dict): Kennung (`@id` oder `UID`) und neue Werte
+        dry_run (bool, optional): Nur die abweichenden Felder ermitteln
+        compare (bool, optional): Vor der Änderung laden und vergleichen
+
+    Returns:
+        dict: Ergebnis mit Kennung, Status, HTTP Status bei Fehlern und
+            Feldern als {Feld: [alt, neu]}, alt nur mit Vergleich
+    """
+    from nl.export.errors import Unauthorized
+    from nl.export.plone import PloneItem
+    import requests
+
+    result = {"id": "", "status": FAILED, "http": None, "felder": {}, "meldung": ""}
+
+    try:
+        result["id"], values = split_change(change)
+    except KeyError as exc:
+        result["meldung"] = str(exc)
+        return result
+
+    try:
+        url = resolve_url(session, result["id"])
+
+        if url is None:
+            result["meldung"] = "Objekt nicht gefunden"
+            return result
+
+        if not (compare or dry_run):
+            item = PloneItem(None, plone_item={"@id": url, "UID": None}, session=session)
+            item.update(values, raise_errors=True)
+            result["felder"] = {key: [None, val] for key, val in values.items()}
+            result["status"] = CHANGED
+            return result
+
+        try:
+            item = PloneItem(url, session=session)
+        except KeyError:
+            # Die Antwort enthält kein Objekt, z.B. 404
+            result["meldung"] = "Objekt nicht gefunden"
+            return result
+
+        result["felder"] = differences(item.plone_item, values)
+
+        if not len(result["felder"]):
+            result["status"] = UNCHANGED
+        elif dry_run:
+            result["status"] = DRY_RUN
+        else:
+            item.update({key: values[key] for key in result["felder"]}, raise_errors=True)
+            result["status"] = CHANGED
+    except Unauthorized:
+        raise
+    except requests.HTTPError as exc:
+        result["http"] = None if exc.response is None else exc.response.status_code
+        result["meldung"] = str(exc)
+    except Exception as exc:
+        # z.B. keine gültige JSON Antwort, die übrigen Änderungen laufen weiter
+        result["meldung"] = f"{type(exc).__name__}: {exc}"
+
+    return result
+
+
+def bulk_update(changes: typing.Iterable, max_workers: int | None = None, dry_run: bool = False,
+                compare: bool = False, session: typing.Any = None) -> typing.Iterator:
+    """Änderungen gleichzeitig anwenden
+
+    Die PATCHes laufen mit höchstens `max_workers` gleichzeitigen Anfragen
+    über eine gemeinsame Sitzung. Ohne Vergleich kostet eine Änderung mit
+    `@id` genau eine Anfrage, der Server liefert das geänderte Objekt mit
+    `Prefer: return=representation` direkt zurück.
+
+    Args:
+        changes (typing.Iterable): Änderungen mit Kennung (`@id` oder `UID`) und neuen Werten
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+        dry_run (bool, optional): Nichts ändern, nur die abweichenden Felder melden
+        compare (bool, optional): Objekte vorher laden und nur abweichende Felder ändern
+        session (requests.Session, optional): Sitzung des Aufrufers
+
+    Returns:
+        typing.Iterator: Ergebnis je Änderung, in der Reihenfolge der Eingabe
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+
+    session = get_auth_session() if session is None else session
+
+    def apply(change: dict) -> dict:
+        return apply_change(session, change, dry_run=dry_run, compare=compare)
+
+    return fetch_concurrent(apply, changes, max_workers=max_workers or MAX_WORKERS)
+
+
+def write_csv(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Ergebnisse als CSV, eine Zeile je Änderung"""
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(["id", "status", "http", "felder", "meldung"])
+
+    stats = {CHANGED: 0, UNCHANGED: 0, DRY_RUN: 0, FAILED: 0}
+
+    for result in results:
+        stats[result["status"]] += 1
+        writer.writerow([result["id"],
+                         result["status"],
+                         result["http"] or "",
+                         ",".join(result["felder"]),
+                         result["meldung"]])
+
+    return stats
+
+
+def write_jsonl(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Ergebnisse als JSON Lines, ein Datensatz je Änderung"""
+    stats = {CHANGED: 0, UNCHANGED: 0, DRY_RUN: 0, FAILED: 0}
+
+    for result in results:
+        stats[result["status"]] += 1
+        fh.write(codec.dumps(result).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
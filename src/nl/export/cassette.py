@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Aufnahme und Wiedergabe von HTTP Anfragen
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from nl.export.transport import ResilientAdapter
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import base64
+import datetime
+import fcntl
+import hashlib
+import os
+import requests
+import threading
+import time
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Umgebungsvariablen, damit auch die Pool Prozesse die Aufnahme nutzen
+CASSETTE_ENV = "NL_EXPORT_CASSETTE"
+MODE_ENV = "NL_EXPORT_CASSETTE_MODE"
+LATENCY_ENV = "NL_EXPORT_CASSETTE_LATENCY"
+
+RECORD = "aufnahme"
+REPLAY = "wiedergabe"
+
+# Größte aufgenommene Antwort bei stream=True, größere werden ohne Inhalt vermerkt
+STREAM_LIMIT = 8 << 20
+
+# Geladene Aufnahmen, alle Sitzungen eines Prozesses teilen sich die Einträge
+_CASSETTES = {}
+_LOCK = threading.Lock()
+
+
+def activate(path: Path, mode: str, latency: bool = False) -> None:
+    """Aufnahme oder Wiedergabe für diesen und alle Kindprozesse einschalten"""
+    os.environ[CASSETTE_ENV] = str(path.absolute())
+    os.environ[MODE_ENV] = mode
+    os.environ[LATENCY_ENV] = "1" if latency else ""
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """Schlüssel einer Anfrage, unabhängig von der Reihenfolge der Parameter"""
+    parts = urlsplit(request.url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    key = f"{request.method} {urlunsplit(parts._replace(query=query))}"
+
+    if request.body:
+        body = request.body if isinstance(request.body, bytes) else request.body.encode("utf-8")
+        key += " " + hashlib.sha1(body).hexdigest()
+
+    return key
+
+
+def encode_body(content: bytes) -> dict:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body64": base64.b64encode(content).decode("ascii")}
+
+
+def decode_body(entry: dict) -> bytes:
+    if "body64" in entry:
+        return base64.b64decode(entry["body64"])
+
+    return entry["body"].encode("utf-8")
+
+
+def load_cassette(path: Path) -> dict:
+    """Einträge einer Aufnahme nach Schlüssel, je Prozess nur einmal gelesen"""
+    with _LOCK:
+        if path not in _CASSETTES:
+            entries = {}
+
+            with path.open("rb") as fh:
+                fcntl.flock(fh, fcntl.LOCK_SH)
+                for line in fh:
+                    if line.strip():
+                        entry = codec.loads(line)
+                        entries.setdefault(entry["key"], []).append(entry)
+
+            _CASSETTES[path] = entries
+
+        return _CASSETTES[path]
+
+
+class RecordingAdapter(ResilientAdapter):
+    """Leitet Anfragen weiter und schreibt sie samt Antwort in die Aufnahme
+
+    Jeder Eintrag ist eine Zeile JSON. Mehrere Prozesse können in dieselbe
+    Datei schreiben, jede Zeile wird unter einer Dateisperre angehängt.
+
+    Gestreamte Antworten (stream=True) werden nicht vorab gelesen, sondern
+    beim Lesen über `iter_content` mitgeschrieben und erst aufgenommen,
+    wenn sie vollständig gelesen sind. Über STREAM_LIMIT hinaus wird nur
+    vermerkt, dass die Antwort zu groß war.
+    """
+
+    def __init__(self, path: Path, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = Path(path)
+
+    def record(self, entry: dict) -> None:
+        with self.path.open("ab") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            fh.write(codec.dumps(entry) + b"\n")
+
+    def tee(self, response: requests.Response, entry: dict) -> None:
+        """`iter_content` der Antwort mitschreiben lassen"""
+        iter_content = response.iter_content
+
+        def recording_iter_content(chunk_size: int = 1, decode_unicode: bool = False):
+            body = bytearray()
+            truncated = False
+
+            for chunk in iter_content(chunk_size, decode_unicode):
+                if not truncated:
+                    body.extend(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+                    if len(body) > STREAM_LIMIT:
+                        truncated = True
+                        body = bytearray()
+                yield chunk
+
+            self.record(entry | ({"gekuerzt": True, "body": ""} if truncated else encode_body(bytes(body))))
+
+        response.iter_content = recording_iter_content
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs) -> requests.Response:
+        response = super().send(request, stream=stream, **kwargs)
+
+        entry = {"key": request_key(request),
+                 "method": request.method,
+                 "url": request.url,
+                 "status": response.status_code,
+                 "reason": response.reason,
+                 "headers": dict(response.headers),
+                 "dauer": response.elapsed.total_seconds()}
+
+        if stream:
+            self.tee(response, entry)
+        else:
+            self.record(entry | encode_body(response.content))
+
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Beantwortet Anfragen aus einer Aufnahme, ohne Netzwerkzugriff
+
+    Wiederholte Anfragen erhalten die Antworten in der aufgenommenen
+    Reihenfolge, danach immer wieder die letzte.
+    """
+
+    def __init__(self, path: Path, latency: bool = False, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        self.latency = latency
+        self.entries = load_cassette(self.path)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+        import io
+
+        key = request_key(request)
+
+        with _LOCK:
+            entries = self.entries.get(key)
+
+            if not entries:
+                raise requests.ConnectionError(f"Nicht in der Aufnahme: {key}", request=request)
+
+            entry = entries.pop(0) if len(entries) > 1 else entries[0]
+
+        if entry.get("gekuerzt"):
+            raise requests.ConnectionError(f"Antwort zu groß für die Aufnahme: {key}", request=request)
+
+        if self.latency:
+            time.sleep(entry["dauer"])
+
+        content = decode_body(entry)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(content)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=entry["dauer"])
+        response.connection = self
+
+        return response
+
+
+def cassette_adapter(**kwargs) -> HTTPAdapter | None:
+    """Adapter für die eingeschaltete Aufnahme oder Wiedergabe"""
+    path = os.environ.get(CASSETTE_ENV)
+
+    if not path:
+        return None
+
+    if os.environ.get(MODE_ENV) == REPLAY:
+        return ReplayAdapter(path, latency=bool(os.environ.get(LATENCY_ENV)), **kwargs)
+
+    return RecordingAdapter(path, **kwargs)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""JSON Codec
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def std_loads(data: bytes | str) -> typing.Any:
+    """JSON mit der Standardbibliothek dekodieren"""
+    return json.loads(data)
+
+
+def std_dumps(obj: typing.Any) -> bytes:
+    """JSON mit der Standardbibliothek kodieren
+
+    Die Ausgabe entspricht der von orjson: kompakt und UTF-8 kodiert.
+    """
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_loads(data: bytes | str) -> typing.Any:
+    """JSON mit orjson dekodieren, mit der Standardbibliothek als Rückfall"""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # z.B. NaN, sehr große Zahlen oder keine UTF-8 Kodierung
+        return std_loads(data)
+
+
+def orjson_dumps(obj: typing.Any) -> bytes:
+    """JSON mit orjson kodieren, mit der Standardbibliothek als Rückfall"""
+    try:
+        return orjson.dumps(obj)
+    except TypeError:
+        return std_dumps(obj)
+
+
+BACKENDS = {"stdlib": (std_loads, std_dumps)}
+
+if orjson is not None:
+    BACKENDS["orjson"] = (orjson_loads, orjson_dumps)
+
+BACKEND = "orjson" if orjson is not None else "stdlib"
+
+loads, dumps = BACKENDS[BACKEND]
+
+
+def dump(obj: typing.Any, fh: typing.BinaryIO) -> None:
+    """JSON in eine binär geöffnete Datei schreiben"""
+    fh.write(dumps(obj))
+
+
+def response_json(req: typing.Any) -> typing.Any:
+    """Den Inhalt einer Antwort direkt aus den Bytes dekodieren
+
+    Args:
+        req (requests.Response): Antwort des CMS
+
+    Returns:
+        typing.Any: Das dekodierte JSON
+    """
+    return loads(req.content)
@@ -9,46 +9,28 @@
 """
 
 # Imports
-import logging
 import configparser
+import functools
+import logging
 import os
+import typing
 from enum import Enum
 from pathlib import Path
-import shutil
 
 __author__ = """Marc-J. Tegethoff <marc.tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
 
 logger = logging.getLogger(__name__)
 
-_config_path = Path(os.environ['HOME'])
-
-if "XDG_CONFIG_HOME" in os.environ:
-    _config_path = _config_path / os.environ["XDG_CONFIG_HOME"]
-else:
-    _config_path = _config_path / ".config"
-    _config_path.mkdir(exist_ok=True)
-
-NLCONFIG = _config_path / "nl_export.conf"
-NLCONFIG_Deprecated = ((Path(os.environ['HOME']) / ".nl_export.conf"),
-                       (_config_path / ".nl_export.conf"))
-
-for cpath in NLCONFIG_Deprecated:
-    if cpath.is_file():
-        shutil.move(cpath, NLCONFIG)
-
-NLACCESS_TOKEN = None
-NLBASE_URL = None
 NLUSER_AGENT = "nl-export-bot/1.0"
 
-try:
-    config = configparser.ConfigParser()
-    config.read(NLCONFIG)
+# Profil dieses Prozesses und seiner Kindprozesse
+PROFILE_ENV = "NL_EXPORT_PROFIL"
 
-    NLACCESS_TOKEN = config.get("plone", "access-token")
-    NLBASE_URL = config.get("plone", "base-url")
-except Exception:
-    pass
+# Der Abschnitt [plone] ist das Standardprofil, weitere heißen [profil:<Name>]
+DEFAULT_PROFILE = "standard"
+DEFAULT_SECTION = "plone"
+PROFILE_PREFIX = "profil:"
 
 
 class LicenceModels(Enum):
@@ -56,3 +38,147 @@ class LicenceModels(Enum):
     NLLicenceModelStandard = "Products.VDNL.content.NLLicenceModelStandard.INLLicenceModelStandard"
     NLLicenceModelOptIn = "Products.VDNL.content.NLLicenceModelOptIn.INLLicenceModelOptIn"
     # NLLicenceModelSingleUser = "Products.VDNL.content.NLLicenceModelSingleUser.INLLicenceModelSingleUser"
+
+
+def config_dir() -> Path:
+    """Verzeichnis der Konfiguration
+
+    Returns:
+        Path: $XDG_CONFIG_HOME bzw. ~/.config
+    """
+    home = Path(os.environ['HOME'])
+
+    if "XDG_CONFIG_HOME" in os.environ:
+        return home / os.environ["XDG_CONFIG_HOME"]
+
+    return home / ".config"
+
+
+def config_path() -> Path:
+    """Pfad der Konfigurationsdatei"""
+    return config_dir() / "nl_export.conf"
+
+
+def deprecated_config_paths() -> tuple:
+    """Frühere Orte der Konfigurationsdatei"""
+    return ((Path(os.environ['HOME']) / ".nl_export.conf"),
+            (config_dir() / ".nl_export.conf"))
+
+
+def config_file() -> Path | None:
+    """Die zu lesende Konfigurationsdatei
+
+    Veraltete Orte werden nur gelesen, nicht verschoben. Das Verschieben
+    übernimmt :func:`migrate_config`.
+
+    Returns:
+        Path | None: Pfad oder None, falls keine Konfiguration existiert
+    """
+    for cpath in (config_path(), ) + deprecated_config_paths()[::-1]:
+        if cpath.is_file():
+            return cpath
+
+    return None
+
+
+def migrate_config() -> None:
+    """Veraltete Konfigurationsdateien an den aktuellen Ort verschieben"""
+    import shutil
+
+    cpath = config_path()
+
+    for dpath in deprecated_config_paths():
+        if dpath.is_file():
+            cpath.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(dpath, cpath)
+            logger.info(f"Konfiguration verschoben: {dpath} -> {cpath}")
+
+    get_config.cache_clear()
+
+
+@functools.cache
+def get_config() -> configparser.ConfigParser:
+    """Die Konfiguration beim ersten Zugriff einlesen"""
+    config = configparser.ConfigParser()
+    cpath = config_file()
+
+    if cpath is not None:
+        config.read(cpath)
+
+    return config
+
+
+class Profile:
+    """Zugang zu einer Instanz des CMS"""
+
+    def __init__(self, name: str, base_url: str | None, access_token: str | None) -> None:
+        self.name = name
+        self.base_url = base_url
+        self.access_token = access_token
+
+    def __repr__(self) -> str:
+        return f"<Profile {self.name} {self.base_url}>"
+
+
+def profile_section(name: str) -> str:
+    """Abschnitt der Konfigurationsdatei eines Profils"""
+    return DEFAULT_SECTION if name == DEFAULT_PROFILE else f"{PROFILE_PREFIX}{name}"
+
+
+def profile_names() -> list:
+    """Namen aller Profile der Konfiguration"""
+    names = []
+
+    for section in get_config().sections():
+        if section == DEFAULT_SECTION:
+            names.append(DEFAULT_PROFILE)
+        elif section.startswith(PROFILE_PREFIX):
+            names.append(section[len(PROFILE_PREFIX):])
+
+    return names
+
+
+def active_profile() -> str:
+    """Name des Profils dieses Prozesses"""
+    return os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE
+
+
+def activate_profile(name: str) -> None:
+    """Ein Profil für diesen und alle Kindprozesse wählen"""
+    os.environ[PROFILE_ENV] = name
+
+
+def get_profile(name: str | None = None) -> Profile | None:
+    """Ein Profil der Konfiguration
+
+    Args:
+        name (str | None, optional): Name des Profils, Standard ist das aktive Profil
+
+    Returns:
+        Profile | None: Das Profil oder None, falls es nicht konfiguriert ist
+    """
+    name = active_profile() if name is None else name
+    section = profile_section(name)
+    config = get_config()
+
+    if not config.has_section(section):
+        return None
+
+    return Profile(name,
+                   config.get(section, "base-url", fallback=None),
+                   config.get(section, "access-token", fallback=None))
+
+
+def __getattr__(name: str) -> typing.Any:
+    """NLCONFIG, NLACCESS_TOKEN und NLBASE_URL des aktiven Profils erst bei Bedarf bestimmen"""
+    match name:
+        case "NLCONFIG":
+            return config_path()
+        case "NLACCESS_TOKEN":
+            profile = get_profile()
+            return None if profile is None else profile.access_token
+        case "NLBASE_URL":
+            profile = get_profile()
+            return None if profile is None else profile.base_url
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""Vergleich zweier Exporte
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from nl.export.errors import SchemaMismatch
+from pathlib import Path
+import collections
+import csv
+import hashlib
+import pickle
+import tempfile
+import typing
+import zlib
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+NL_NAMESPACE = "http://www.nationallizenzen.de/ns/nl"
+
+# Mögliche Schlüsselfelder in der Reihenfolge ihrer Priorität
+KEY_FIELDS = ("zuid", "uid", "UID")
+
+# Höchstzahl der Teildateien beim Auslagern
+MAX_BUCKETS = 256
+
+ADDED = "hinzugefuegt"
+REMOVED = "entfernt"
+CHANGED = "geaendert"
+DUPLICATE = "doppelt"
+
+
+def read_csv(path: Path) -> tuple:
+    """Kopfzeile und Datensätze eines CSV Exports"""
+    fh = path.open(newline="", encoding="utf-8")
+    reader = csv.reader(fh, delimiter=';', quotechar='"')
+
+    try:
+        header = next(reader)
+    except StopIteration:
+        fh.close()
+        return ([], iter(()))
+
+    def rows():
+        with fh:
+            for values in reader:
+                yield dict(zip(header, values))
+
+    return (header, rows())
+
+
+def read_xml(path: Path) -> tuple:
+    """Felder und Datensätze eines XML Exports, ohne das Dokument ganz zu laden"""
+    from lxml import etree
+
+    xnl = "{%s}" % NL_NAMESPACE
+
+    def rows():
+        for _, elem in etree.iterparse(str(path), events=("end", ), tag=xnl + "institution"):
+            row = {}
+
+            for child in elem:
+                tokens = [token.text or "" for token in child]
+                row[etree.QName(child).localname] = ",".join(tokens) if len(tokens) else (child.text or "")
+
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+            yield row
+
+    records = rows()
+    first = next(records, None)
+
+    if first is None:
+        return ([], iter(()))
+
+    def chained():
+        yield first
+        yield from records
+
+    return (list(first.keys()), chained())
+
+
+def read_jsonl(path: Path) -> tuple:
+    """Datensätze eines JSON Lines Exports, verschachtelte Werte als JSON"""
+    def rows():
+        with path.open("rb") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                item = codec.loads(line)
+                yield {key: val if isinstance(val, str) else codec.dumps(val).decode("utf-8")
+                       for key, val in item.items()}
+
+    return (None, rows())
+
+
+READERS = {".csv": read_csv,
+           ".xml": read_xml,
+           ".jsonl": read_jsonl}
+
+
+def read_export(path: Path) -> tuple:
+    """Einen Export anhand der Dateiendung lesen
+
+    Returns:
+        tuple: Felder (oder None, falls ohne festes Schema) und Datensätze
+    """
+    try:
+        return READERS[path.suffix.lower()](path)
+    except KeyError:
+        raise ValueError(f"Unbekanntes Format: {path}")
+
+
+def row_digest(row: dict, ignore: tuple) -> bytes:
+    """Prüfsumme über den Inhalt eines Datensatzes"""
+    content = {key: val for key, val in row.items() if key not in ignore}
+    return hashlib.blake2b(codec.dumps(sorted(content.items())), digest_size=16).digest()
+
+
+def row_key(row: dict) -> str:
+    for field in KEY_FIELDS:
+        if row.get(field):
+            return row[field]
+
+    raise KeyError(f"Kein Schlüssel ({', '.join(KEY_FIELDS)}) im Datensatz")
+
+
+def compare_rows(key: str, old: dict | None, new: dict | None, ignore: tuple) -> dict:
+    """Änderung eines Datensatzes mit den geänderten Feldern"""
+    if old is None:
+        return {"key": key, "aenderung": ADDED, "datensatz": new}
+    if new is None:
+        return {"key": key, "aenderung": REMOVED, "datensatz": old}
+
+    fields = {}
+    for field in list(old) + [field for field in new if field not in old]:
+        if field in ignore:
+            continue
+        if old.get(field) != new.get(field):
+            fields[field] = [old.get(field), new.get(field)]
+
+    return {"key": key, "aenderung": CHANGED, "felder": fields}
+
+
+def diff_buckets(old_rows: typing.Iterable, new_rows: typing.Iterable, ignore: tuple) -> typing.Iterator:
+    """Unterschiede zweier Mengen von (Schlüssel, Prüfsumme, Datensatz)
+
+    Kommt ein Schlüssel in einem Export mehrfach vor, wird nur der erste
+    Datensatz verglichen und der Schlüssel zusätzlich als DUPLICATE mit
+    der Anzahl in beiden Exporten gemeldet.
+    """
+    old = {}
+    old_count = collections.Counter()
+    new_count = collections.Counter()
+    changes = []
+
+    for key, digest, row in old_rows:
+        old_count[key] += 1
+        old.setdefault(key, (digest, row))
+
+    for key, digest, row in new_rows:
+        new_count[key] += 1
+
+        if new_count[key] > 1:
+            continue
+
+        entry = old.pop(key, None)
+
+        if entry is None and old_count[key]:
+            # Der erste Datensatz wurde bereits verglichen
+            continue
+
+        if entry is None:
+            changes.append(compare_rows(key, None, row, ignore))
+        elif entry[0] != digest:
+            changes.append(compare_rows(key, entry[1], row, ignore))
+
+    for key, (digest, row) in old.items():
+        changes.append(compare_rows(key, row, None, ignore))
+
+    for key in (old_count | new_count):
+        if old_count[key] > 1 or new_count[key] > 1:
+            changes.append({"key": key, "aenderung": DUPLICATE, "anzahl": [old_count[key], new_count[key]]})
+
+    return iter(sorted(changes, key=lambda change: change["key"]))
+
+
+def hashed_rows(rows: typing.Iterable, ignore: tuple) -> typing.Iterator:
+    for row in rows:
+        yield (row_key(row), row_digest(row, ignore), row)
+
+
+def spill(rows: typing.Iterable, tmpdir: Path, prefix: str, buckets: int) -> list:
+    """Datensätze nach Schlüssel auf Teildateien verteilen"""
+    paths = [tmpdir / f"{prefix}-{idx:03d}" for idx in range(buckets)]
+    handles = [bpath.open("wb") for bpath in paths]
+
+    try:
+        for entry in rows:
+            idx = zlib.crc32(entry[0].encode("utf-8")) % buckets
+            pickle.dump(entry, handles[idx], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for fh in handles:
+            fh.close()
+
+    return paths
+
+
+def load_bucket(path: Path) -> typing.Iterator:
+    with path.open("rb") as fh:
+        while True:
+            try:
+                yield pickle.load(fh)
+            except EOFError:
+                return
+
+
+def diff_exports(old_path: Path, new_path: Path, ignore: tuple = (), memory: int = 256 << 20) -> typing.Iterator:
+    """Zwei Exporte desselben Schemas vergleichen
+
+    Die Datensätze werden über `zuid` bzw. `uid` verknüpft und über eine
+    Prüfsumme ihres Inhalts verglichen. Sind die Dateien größer als
+    `memory`, werden sie nach Schlüssel auf Teildateien verteilt, die
+    nacheinander verglichen werden.
+
+    Args:
+        old_path (Path): Älterer Export
+        new_path (Path): Neuerer Export
+        ignore (tuple, optional): Nicht verglichene Felder
+        memory (int, optional): Grenze in Bytes, ab der ausgelagert wird
+
+    Raises:
+        SchemaMismatch: Die Exporte haben unterschiedliche Felder
+
+    Returns:
+        typing.Iterator: Änderung je Datensatz
+    """
+    old_fields, old_rows = read_export(old_path)
+    new_fields, new_rows = read_export(new_path)
+
+    if None not in (old_fields, new_fields) and len(old_fields) and len(new_fields) and old_fields != new_fields:
+        raise SchemaMismatch("Die Exporte haben unterschiedliche Felder")
+
+    return _diff_rows(old_rows, new_rows, ignore, old_path.stat().st_size + new_path.stat().st_size, memory)
+
+
+def _diff_rows(old_rows: typing.Iterable, new_rows: typing.Iterable, ignore: tuple, size: int, memory: int) -> typing.Iterator:
+    buckets = min(MAX_BUCKETS, size // max(memory, 1) + 1)
+
+    if buckets == 1:
+        yield from diff_buckets(hashed_rows(old_rows, ignore), hashed_rows(new_rows, ignore), ignore)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="nl-export-diff-") as tmpname:
+        tmpdir = Path(tmpname)
+        old_buckets = spill(hashed_rows(old_rows, ignore), tmpdir, "alt", buckets)
+        new_buckets = spill(hashed_rows(new_rows, ignore), tmpdir, "neu", buckets)
+
+        for old_bucket, new_bucket in zip(old_buckets, new_buckets):
+            yield from diff_buckets(load_bucket(old_bucket), load_bucket(new_bucket), ignore)
+            old_bucket.unlink()
+            new_bucket.unlink()
+
+
+def write_csv(changes: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Änderungen als CSV, eine Zeile je geändertem Feld
+
+    Bei doppelten Schlüsseln stehen in `alt` und `neu` die Anzahl der
+    Datensätze je Export.
+    """
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(["key", "aenderung", "feld", "alt", "neu"])
+
+    stats = {ADDED: 0, REMOVED: 0, CHANGED: 0, DUPLICATE: 0}
+
+    for change in changes:
+        stats[change["aenderung"]] += 1
+
+        if change["aenderung"] == CHANGED:
+            for field, (old, new) in change["felder"].items():
+                writer.writerow([change["key"], CHANGED, field, old, new])
+        elif change["aenderung"] == DUPLICATE:
+            writer.writerow([change["key"], DUPLICATE, "", *change["anzahl"]])
+        else:
+            writer.writerow([change["key"], change["aenderung"], "", "", ""])
+
+    return stats
+
+
+def write_jsonl(changes: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Änderungen als JSON Lines, ein Datensatz je Zeile"""
+    stats = {ADDED: 0, REMOVED: 0, CHANGED: 0, DUPLICATE: 0}
+
+    for change in changes:
+        stats[change["aenderung"]] += 1
+        fh.write(codec.dumps(change).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""Verteilter Export über ein gemeinsames Auftragsverzeichnis
+
+Der Koordinator teilt die Suchergebnisse eines Lizenz-Modells anhand von
+`b_start` in Bereiche auf und legt sie als Dateien im Verzeichnis `offen`
+eines Auftrags ab. Arbeiter auf beliebigen Rechnern mit Zugriff auf das
+Verzeichnis übernehmen einen Bereich, indem sie die Datei nach `vergeben`
+verschieben, und legen die kodierten Zeilen in `fertig` ab: die Bytes der
+Zeilen hintereinander und daneben eine JSON Datei mit Länge und Schlüssel
+je Zeile. Vergebene Bereiche, deren Datei zu lange nicht mehr berührt
+wurde, gibt der Koordinator wieder frei. Fehlschläge notieren die Arbeiter
+in `fehlgeschlagen`. Scheitert ein Bereich zu oft oder dauert der Export
+zu lange, bricht der Koordinator ab. Sonst fügt er zum Schluss die Teile in
+der Reihenfolge der Bereiche zusammen.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+from nl.export import codec
+from nl.export.errors import JobFailed
+from pathlib import Path
+import logging
+import os
+import time
+import typing
+import uuid
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+JOB_FILE = "auftrag.json"
+TODO = "offen"
+CLAIMED = "vergeben"
+DONE = "fertig"
+FAILED = "fehlgeschlagen"
+
+# Endung der Datei mit den Bytes der Zeilen eines fertigen Bereichs
+ROWS_SUFFIX = ".zeilen"
+
+# Lizenzen je Bereich
+RANGE_SIZE = 500
+
+# Sekunden ohne Lebenszeichen, nach denen ein Bereich neu vergeben wird
+STALE_AFTER = 120
+
+# Sekunden zwischen zwei Blicken in das Auftragsverzeichnis
+POLL_INTERVAL = 2
+
+# Stabile Reihenfolge der Suche, damit die Bereiche zusammenpassen
+SORT_ON = "UID"
+
+
+def range_name(start: int) -> str:
+    return f"bereich-{start:09d}"
+
+
+def range_start(name: str) -> int:
+    return int(name.split("-")[1])
+
+
+def create_job(queue: Path, lmodel: typing.Any, options: Namespace, total: int) -> Path:
+    """Einen Auftrag mit allen Bereichen anlegen
+
+    Die Auftragsdatei wird zuletzt geschrieben, Arbeiter sehen den Auftrag
+    also erst, wenn alle Bereiche vorhanden sind.
+
+    Returns:
+        Path: Verzeichnis des Auftrags
+    """
+    query = lmodel.lic_query | {"sort_on": SORT_ON}
+
+    if options.status is not None:
+        query["review_state"] = options.status
+
+    jobdir = queue / uuid.uuid4().hex
+
+    for name in (TODO, CLAIMED, DONE, FAILED):
+        (jobdir / name).mkdir(parents=True)
+
+    for start in range(0, total, options.bereich):
+        (jobdir / TODO / range_name(start)).touch()
+
+    job = {"produkt": lmodel.productTitle(),
+           "query": query,
+           "format": options.format,
+           "version": options.version,
+           "sortierung": options.sort_by,
+           "bereich": options.bereich,
+           "versuche": options.versuche,
+           "zeilen": total}
+
+    tmp = jobdir / f"{JOB_FILE}.tmp"
+    with tmp.open("wb") as fh:
+        codec.dump(job, fh)
+    os.replace(tmp, jobdir / JOB_FILE)
+
+    return jobdir
+
+
+def load_job(jobdir: Path) -> dict | None:
+    try:
+        with (jobdir / JOB_FILE).open("rb") as fh:
+            return codec.loads(fh.read())
+    except FileNotFoundError:
+        return None
+
+
+def claim_range(jobdir: Path, worker: str, attempts: int | None = None) -> Path | None:
+    """Einen offenen Bereich übernehmen
+
+    Das Verschieben ist atomar, von mehreren Arbeitern gelingt es nur einem.
+    Bereiche mit `attempts` Fehlschlägen werden nicht mehr übernommen.
+    """
+    try:
+        names = sorted(entry.name for entry in (jobdir / TODO).iterdir())
+    except FileNotFoundError:
+        return None
+
+    for name in names:
+        target = jobdir / CLAIMED / name
+
+        if (jobdir / DONE / name).exists():
+            (jobdir / TODO / name).unlink(missing_ok=True)
+            continue
+
+        if attempts is not None and failures(jobdir, name) >= attempts:
+            continue
+
+        try:
+            os.rename(jobdir / TODO / name, target)
+        except FileNotFoundError:
+            continue
+
+        target.write_text(worker)
+        return target
+
+    return None
+
+
+def release_stale(jobdir: Path, stale_after: float) -> list:
+    """Bereiche ohne Lebenszeichen wieder freigeben
+
+    Returns:
+        list: Namen der freigegebenen Bereiche
+    """
+    released = []
+    now = time.time()
+
+    for entry in (jobdir / CLAIMED).iterdir():
+        try:
+            if now - entry.stat().st_mtime < stale_after:
+                continue
+            os.rename(entry, jobdir / TODO / entry.name)
+        except FileNotFoundError:
+            continue
+
+        released.append(entry.name)
+
+    return released
+
+
+def process_range(jobdir: Path, job: dict, claimed: Path, processes: int = 4) -> int:
+    """Einen Bereich laden, kodieren und in `fertig` ablegen
+
+    Nach jeder Aufgabe des Pools wird die Datei des Bereichs berührt, das
+    dient dem Koordinator als Lebenszeichen.
+
+    Returns:
+        int: Anzahl der Zeilen
+    """
+    from multiprocessing import Pool
+    from nl.export.plone import get_search_range
+    from nl.export.utils import ROWS_PER_TASK, get_licence_variants
+
+    start = range_start(claimed.name)
+    size = min(job["bereich"], job["zeilen"] - start)
+
+    licences_ids = [{"licencee": entry["licencee"]["@id"], "licence": entry["@id"]}
+                    for entry in get_search_range(job["query"], start, size)]
+    os.utime(claimed)
+
+    tasks = [(((job["format"], job["version"]),), None,
+              licences_ids[idx:idx + ROWS_PER_TASK], job.get("sortierung"), False)
+             for idx in range(0, len(licences_ids), ROWS_PER_TASK)]
+
+    keys = None
+    rows = []
+
+    with Pool(processes=processes) as pool:
+        for chunk_keys, (chunk,), _ in pool.imap(get_licence_variants, tasks):
+            if chunk_keys is not None:
+                keys = (keys or []) + chunk_keys
+            rows.extend(chunk)
+            os.utime(claimed)
+
+    write_result(jobdir / DONE / claimed.name, keys, rows)
+    claimed.unlink(missing_ok=True)
+
+    return len(rows)
+
+
+def write_result(path: Path, keys: list | None, rows: list) -> None:
+    """Die Zeilen eines Bereichs ablegen, ohne Pickle
+
+    Die Bytes der Zeilen stehen hintereinander in `<name>.zeilen`, Länge,
+    Schlüssel und bei Dateien je Lizenznehmer (Format json) deren Namen in
+    der JSON Datei `<name>`. Sie wird zuletzt geschrieben und zeigt an,
+    dass der Bereich fertig ist.
+    """
+    names = None
+
+    if len(rows) and isinstance(rows[0], tuple):
+        names = [name for name, _ in rows]
+        rows = [data for _, data in rows]
+
+    index = {"laengen": [len(row) for row in rows],
+             "schluessel": keys,
+             "dateien": names}
+
+    for target, data in ((path.with_name(path.name + ROWS_SUFFIX), b"".join(rows)),
+                         (path, codec.dumps(index))):
+        tmp = target.with_name(f".{target.name}.{os.getpid()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+
+def read_result(path: Path) -> tuple:
+    """Schlüssel (oder None) und Zeilen eines fertigen Bereichs
+
+    Raises:
+        ValueError: Die Dateien des Bereichs passen nicht zusammen
+    """
+    index = codec.loads(path.read_bytes())
+    data = path.with_name(path.name + ROWS_SUFFIX).read_bytes()
+    lengths = index["laengen"]
+
+    if sum(lengths) != len(data):
+        raise ValueError(f"{path.name}: {len(data)} Bytes statt {sum(lengths)}")
+
+    rows = []
+    offset = 0
+
+    for length in lengths:
+        rows.append(data[offset:offset + length])
+        offset += length
+
+    if index.get("dateien") is not None:
+        rows = list(zip(index["dateien"], rows))
+
+    keys = index.get("schluessel")
+
+    if keys is not None:
+        if len(keys) != len(rows):
+            raise ValueError(f"{path.name}: {len(keys)} Schlüssel für {len(rows)} Zeilen")
+        keys = [tuple(key) for key in keys]
+
+    return (keys, rows)
+
+
+def record_failure(jobdir: Path, name: str, worker: str, exc: BaseException) -> None:
+    """Einen Fehlschlag eines Bereichs für den Koordinator notieren"""
+    message = f"{worker}: {type(exc).__name__}: {exc}".replace("\n", " ")
+
+    try:
+        with (jobdir / FAILED / name).open("a", encoding="utf-8") as fh:
+            fh.write(message + "\n")
+    except FileNotFoundError:
+        # Der Auftrag wurde inzwischen entfernt
+        pass
+
+
+def failures(jobdir: Path, name: str) -> int:
+    """Anzahl der notierten Fehlschläge eines Bereichs"""
+    try:
+        with (jobdir / FAILED / name).open(encoding="utf-8") as fh:
+            return sum(1 for _ in fh)
+    except FileNotFoundError:
+        return 0
+
+
+def run_worker(queue: Path, worker: str, processes: int = 4, idle: float = 60) -> int:
+    """Bereiche aller Aufträge abarbeiten, bis `idle` Sekunden nichts zu tun war
+
+    Returns:
+        int: Anzahl der bearbeiteten Bereiche
+    """
+    logger = logging.getLogger(__name__)
+
+    done = 0
+    last_work = time.monotonic()
+
+    while time.monotonic() - last_work < idle:
+        claimed = None
+
+        for jobdir in sorted(queue.iterdir()):
+            job = load_job(jobdir)
+
+            if job is None:
+                continue
+
+            claimed = claim_range(jobdir, worker, job.get("versuche"))
+
+            if claimed is not None:
+                break
+
+        if claimed is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        try:
+            num = process_range(jobdir, job, claimed, processes=processes)
+            logger.info(f"{jobdir.name}/{claimed.name}: {num} Zeile(n)")
+            done += 1
+        except Exception as exc:
+            logger.error(f"{jobdir.name}/{claimed.name} fehlgeschlagen", exc_info=True)
+            record_failure(jobdir, claimed.name, worker, exc)
+            try:
+                os.rename(claimed, jobdir / TODO / claimed.name)
+            except FileNotFoundError:
+                pass
+
+        last_work = time.monotonic()
+
+    return done
+
+
+def touched(jobdir: Path) -> bool:
+    """Ob ein Arbeiter schon einen Bereich des Auftrags übernommen hat"""
+    return any(next((jobdir / name).iterdir(), None) is not None for name in (CLAIMED, DONE, FAILED))
+
+
+def coordinate(queue: Path, lmodel: typing.Any, options: Namespace, total: int) -> Path:
+    """Einen Export verteilen, überwachen und zusammenfügen
+
+    Args:
+        queue (Path): Gemeinsames Auftragsverzeichnis
+        lmodel (LicenceModel): Das Lizenz-Modell
+        options (Namespace): Optionen des Exports (`bereich`, `zeitlimit`,
+            `versuche`, `gesamtzeit`)
+        total (int): Anzahl der Lizenzen
+
+    Raises:
+        JobFailed: Ein Bereich ist zu oft gescheitert, kein Arbeiter hat den
+            Auftrag übernommen oder die Gesamtzeit ist abgelaufen
+
+    Returns:
+        Path: Die Ausgabedatei
+    """
+    from nl.export.formatter import get_formatter
+    from nl.export.sorting import ExternalSorter
+    from tqdm import tqdm
+    import shutil
+
+    logger = logging.getLogger(__name__)
+
+    jobdir = create_job(queue, lmodel, options, total)
+    names = [range_name(start) for start in range(0, total, options.bereich)]
+    released = dict.fromkeys(names, 0)
+    started = time.monotonic()
+    deadline = None if options.gesamtzeit is None else started + options.gesamtzeit
+
+    try:
+        with tqdm(total=len(names)) as progress:
+            while progress.n < len(names):
+                time.sleep(POLL_INTERVAL)
+
+                for name in release_stale(jobdir, options.zeitlimit):
+                    released[name] += 1
+                    msg = f"Bereich {name} neu vergeben"
+                    logger.warning(msg)
+
+                done = [name for name in names if (jobdir / DONE / name).exists()]
+                progress.update(len(done) - progress.n)
+
+                if len(done) == len(names):
+                    break
+
+                for name in names:
+                    if (attempts := failures(jobdir, name) + released[name]) >= options.versuche:
+                        raise JobFailed(f"Bereich {name} nach {attempts} Versuch(en) gescheitert")
+
+                if not (touched(jobdir) or any(released.values())) and time.monotonic() - started > options.zeitlimit:
+                    raise JobFailed(f"Kein Arbeiter hat den Auftrag nach {options.zeitlimit} Sekunden übernommen")
+
+                if deadline is not None and time.monotonic() > deadline:
+                    raise JobFailed(f"Nach {options.gesamtzeit} Sekunden sind {len(names) - len(done)} "
+                                    f"von {len(names)} Bereich(en) nicht fertig")
+
+        with get_formatter(options.format)(lmodel, options) as formatter, ExternalSorter() as sorter:
+            for name in names:
+                keys, rows = read_result(jobdir / DONE / name)
+
+                if keys is None:
+                    formatter.write(rows)
+                else:
+                    sorter.extend(zip(keys, rows))
+
+            for rows in sorter.batches():
+                formatter.write(rows)
+    finally:
+        # Auch bei einem Abbruch, damit die Arbeiter den Auftrag nicht weiter bearbeiten
+        shutil.rmtree(jobdir, ignore_errors=True)
+
+    return formatter.path
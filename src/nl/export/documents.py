@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""Herunterladen von EULAs und Dokumenten der Institutionen
+
+Die Dateien werden gleichzeitig und in Blöcken auf die Festplatte geladen.
+Jeder Inhalt liegt nur einmal unter `.objekte/<sha256>`, die Dateien in
+der Ablage sind harte Verweise darauf. Unterbrochene Downloads werden per
+HTTP Range mit If-Range fortgesetzt, nur solange ETag bzw. Last-Modified
+und `modified` zum Teil passen, unveränderte Dateien (Größe und `modified` wie
+beim letzten Lauf) werden nicht erneut geladen.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from pathlib import Path
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+OBJECTS = ".objekte"
+STATE_FILE = ".dokumente.json"
+
+# Blockgröße beim Schreiben
+CHUNK_SIZE = 1 << 16
+
+DOWNLOADED = "geladen"
+DEDUPLICATED = "dedupliziert"
+UNCHANGED = "unveraendert"
+FAILED = "fehler"
+
+# Dateien der Lizenz-Modelle
+EULA_FIELDS = ("f_eula", "f_eula_sign")
+
+
+def load_state(destination: Path) -> dict:
+    try:
+        with (destination / STATE_FILE).open("rb") as fh:
+            return codec.loads(fh.read())
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(destination: Path, state: dict) -> None:
+    tmp = destination / f"{STATE_FILE}.tmp"
+    with tmp.open("wb") as fh:
+        codec.dump(state, fh)
+    os.replace(tmp, destination / STATE_FILE)
+
+
+def file_document(fileinfo: dict, datei: str, modified: str | None) -> dict:
+    """Eintrag für ein Dateifeld eines Plone Objekts"""
+    return {"url": fileinfo["download"],
+            "datei": datei,
+            "size": fileinfo.get("size"),
+            "modified": modified}
+
+
+def licencemodel_documents(lmodel: typing.Any) -> list:
+    """EULA und unterschriebene EULA eines Lizenz-Modells
+
+    Die Dateien liegen unter `<Produkt>/<UID des Lizenz-Modells>/`, denn
+    ein Produkt kann mehrere Lizenz-Modelle (z.B. Standard und Opt-In) mit
+    gleich benannten EULAs haben.
+    """
+    from nl.export.utils import secure_filename
+
+    product = secure_filename(lmodel.productTitle())
+    documents = []
+
+    for field in EULA_FIELDS:
+        fileinfo = lmodel.plone_item.get(field)
+
+        if not isinstance(fileinfo, dict) or "download" not in fileinfo:
+            continue
+
+        name = field
+
+        if fileinfo.get("filename"):
+            name = f"{field}_{secure_filename(fileinfo['filename'])}"
+
+        documents.append(file_document(fileinfo,
+                                       f"{product}/{lmodel.plone_uid}/{name}",
+                                       lmodel.plone_item.get("modified")))
+
+    return documents
+
+
+def institution_documents(licencee_urls: typing.Iterable, session: typing.Any = None) -> list:
+    """Anmeldeformulare und unterschriebene EULAs der Institutionen
+
+    Die Namen der Dateien stehen in der Registry, die Objekte werden
+    gleichzeitig geladen. Fehlende Dateien werden übergangen.
+    """
+    from nl.export.codec import response_json
+    from nl.export.plone import Registry, fetch_concurrent, get_auth_session
+    from nl.export.utils import secure_filename
+
+    session = get_auth_session() if session is None else session
+    registry = Registry(session)
+    names = [registry.get("nl.site.registration_form_name"),
+             registry.get("nl.site.registration_eula_name")]
+
+    def load(url: str) -> dict | None:
+        with session.get(url) as req:
+            if req.status_code != 200:
+                return None
+            return response_json(req)
+
+    urls = [f"{licencee_url.rstrip('/')}/files/{name}"
+            for licencee_url in sorted(set(licencee_urls)) for name in names]
+    documents = []
+
+    for url, item in zip(urls, fetch_concurrent(load, urls)):
+        if item is None or not isinstance(item.get("file"), dict):
+            continue
+
+        institution = url.rsplit("/", 3)[-3]
+        documents.append(file_document(item["file"],
+                                       f"institutionen/{secure_filename(institution)}/{secure_filename(url.rsplit('/', 1)[-1])}",
+                                       item.get("modified")))
+
+    return documents
+
+
+def link(blob: Path, target: Path) -> None:
+    """Die Datei in der Ablage auf den Inhalt verweisen lassen
+
+    Die Downloads laufen in Threads, die temporäre Datei ist daher je
+    Prozess und Thread eindeutig.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}")
+    tmp.unlink(missing_ok=True)
+
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        shutil.copyfile(blob, tmp)
+
+    os.replace(tmp, target)
+
+
+def part_validator(response: typing.Any) -> str | None:
+    """Wert für If-Range: ein starkes ETag, sonst Last-Modified"""
+    etag = response.headers.get("ETag")
+
+    if etag and not etag.startswith("W/"):
+        return etag
+
+    return response.headers.get("Last-Modified")
+
+
+def load_part(part: Path, document: dict) -> str | None:
+    """If-Range für einen vorhandenen Teil, None falls er nicht fortgesetzt werden kann
+
+    Ein Teil ohne Prüfwert oder eines inzwischen geänderten Dokuments wird verworfen.
+    """
+    meta = part.with_suffix(".json")
+
+    try:
+        info = codec.loads(meta.read_bytes())
+    except (FileNotFoundError, ValueError):
+        info = {}
+
+    if part.exists() and info.get("validator") and \
+            (info.get("size"), info.get("modified")) == (document["size"], document["modified"]):
+        return info["validator"]
+
+    part.unlink(missing_ok=True)
+    meta.unlink(missing_ok=True)
+
+    return None
+
+
+def fetch_document(session: typing.Any, document: dict, destination: Path, known: dict | None) -> dict:
+    """Ein Dokument laden, falls es sich geändert hat
+
+    Args:
+        session (requests.Session): Gemeinsame Sitzung
+        document (dict): URL, Datei in der Ablage, Größe und `modified`
+        destination (Path): Die Ablage
+        known (dict | None): Eintrag des letzten Laufs
+
+    Returns:
+        dict: Eintrag für den Zustand mit Prüfsumme und Status
+    """
+    from nl.export.shards import file_sha256
+    import requests
+
+    logger = logging.getLogger(__name__)
+
+    target = destination / document["datei"]
+
+    if known is not None and target.exists() and document["size"] is not None \
+            and (known["size"], known["modified"]) == (document["size"], document["modified"]):
+        return known | {"status": UNCHANGED}
+
+    part = destination / OBJECTS / "teile" / f"{hashlib.sha1(document['url'].encode('utf-8')).hexdigest()}.part"
+    part.parent.mkdir(parents=True, exist_ok=True)
+
+    meta = part.with_suffix(".json")
+
+    for _ in range(2):
+        validator = load_part(part, document)
+        offset = part.stat().st_size if validator is not None else 0
+        # Mit If-Range liefert der Server die ganze Datei (200), falls sie sich geändert hat
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+        try:
+            with session.get(document["url"], headers=headers, stream=True) as req:
+                if req.status_code == 416:
+                    # Der Teil passt nicht mehr zur Datei, von vorn beginnen
+                    part.unlink()
+                    meta.unlink(missing_ok=True)
+                    continue
+                elif req.status_code not in (200, 206):
+                    logger.error(f"{document['url']}: {req.status_code} {req.reason}")
+                    return document | {"sha256": None, "status": FAILED}
+
+                if req.status_code == 200:
+                    meta.write_bytes(codec.dumps({"validator": part_validator(req),
+                                                  "size": document["size"],
+                                                  "modified": document["modified"]}))
+
+                with part.open("ab" if req.status_code == 206 else "wb") as fh:
+                    for chunk in req.iter_content(CHUNK_SIZE):
+                        fh.write(chunk)
+        except requests.RequestException as exc:
+            # Der Teil bleibt für den nächsten Lauf erhalten
+            logger.error(f"{document['url']}: {exc}")
+            return document | {"sha256": None, "status": FAILED}
+
+        break
+    else:
+        return document | {"sha256": None, "status": FAILED}
+
+    meta.unlink(missing_ok=True)
+
+    sha256 = file_sha256(part)
+    blob = destination / OBJECTS / sha256[:2] / sha256
+    status = DOWNLOADED
+
+    if blob.exists():
+        part.unlink()
+        status = DEDUPLICATED
+    else:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(part, blob)
+
+    link(blob, target)
+
+    return document | {"size": document["size"] if document["size"] is not None else blob.stat().st_size,
+                       "sha256": sha256,
+                       "status": status}
+
+
+def download_documents(documents: list, destination: Path, max_workers: int | None = None, session: typing.Any = None) -> dict:
+    """Dokumente gleichzeitig in die Ablage laden
+
+    Args:
+        documents (list): Einträge aus :func:`licencemodel_documents` bzw. :func:`institution_documents`
+        destination (Path): Die Ablage
+        max_workers (int, optional): Anzahl gleichzeitiger Downloads
+        session (requests.Session, optional): Sitzung des Aufrufers
+
+    Returns:
+        dict: Anzahl der Dokumente je Status
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+    from tqdm import tqdm
+
+    session = get_auth_session() if session is None else session
+    destination.mkdir(parents=True, exist_ok=True)
+
+    state = load_state(destination)
+    stats = {DOWNLOADED: 0, DEDUPLICATED: 0, UNCHANGED: 0, FAILED: 0}
+
+    def fetch(document: dict) -> dict:
+        return fetch_document(session, document, destination, state.get(document["datei"]))
+
+    try:
+        for result in tqdm(fetch_concurrent(fetch, documents, max_workers=max_workers or MAX_WORKERS), total=len(documents)):
+            stats[result.pop("status")] += 1
+            if result["sha256"] is not None:
+                state[result["datei"]] = result
+    finally:
+        save_state(destination, state)
+
+    return stats
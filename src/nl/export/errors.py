@@ -24,3 +24,11 @@ class NoMember(BaseException):
 
 class Unauthorized(BaseException):
     pass
+
+
+class SchemaMismatch(ValueError):
+    pass
+
+
+class JobFailed(RuntimeError):
+    pass
@@ -8,3 +8,93 @@
 #
 ##############################################################################
 """
+
+from argparse import Namespace
+from importlib import import_module
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+FORMATTERS = {"csv": "nl.export.formatter.csv:LFormatCSV",
+              "json": "nl.export.formatter.json:LFormatJSON",
+              "jsonl": "nl.export.formatter.json:LFormatJSONL",
+              "xml": "nl.export.formatter.xml:LFormatXML"}
+
+
+def get_formatter(name: str) -> type:
+    """Einen Formatierer erst bei Bedarf importieren
+
+    Args:
+        name (str): Name des Formats (csv|xml|json|jsonl)
+
+    Raises:
+        KeyError: Unbekanntes Format
+
+    Returns:
+        type: Die Formatierer Klasse
+    """
+    modname, clsname = FORMATTERS[name].split(":")
+
+    return getattr(import_module(modname), clsname)
+
+
+def parse_variants(formats: list | None, versions: list | None) -> list:
+    """Die gewünschten Kombinationen aus Format und Version
+
+    Jedes Format wird mit jeder Version kombiniert, es sei denn, die Version
+    ist angehängt, z.B. `xml:2`.
+
+    Args:
+        formats (list | None): Formate, Standard ist csv
+        versions (list | None): Versionen des Export Schemas, Standard ist 1
+
+    Raises:
+        ValueError: Unbekanntes Format oder ungültige Version
+
+    Returns:
+        list: Tupel (Format, Version) ohne Doppelte, in der angegebenen Reihenfolge
+    """
+    variants = []
+
+    for entry in formats or ["csv"]:
+        fmt, _, version = entry.partition(":")
+
+        if fmt not in FORMATTERS:
+            raise ValueError(f"Unbekanntes Format: {fmt}")
+
+        try:
+            fversions = [int(version)] if version else (versions or [1])
+        except ValueError:
+            raise ValueError(f"Ungültige Version: {entry}")
+
+        for fversion in fversions:
+            if (fmt, fversion) not in variants:
+                variants.append((fmt, fversion))
+
+    return variants
+
+
+def output_name(lmodel: typing.Any, options: Namespace, part: int | None = None) -> str:
+    """Dateiname der Ausgabe ohne Endung
+
+    Args:
+        lmodel (LicenceModel): Das Lizenz-Modell
+        options (Namespace): Optionen des Exports
+        part (int | None, optional): Nummer des Teils bei aufgeteilter Ausgabe
+
+    Returns:
+        str: Dateiname
+    """
+    from nl.export.utils import secure_filename
+
+    fname = secure_filename(lmodel.productTitle(), only_ascii=options.only_ascii)
+
+    if getattr(options, "variante", None) is not None:
+        # Mehrere Versionen im selben Format
+        fname = f"{fname}.{options.variante}"
+
+    if part is not None:
+        fname = f"{fname}.{part:04d}"
+
+    return fname
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+from contextlib import AbstractContextManager
+from nl.export.formatter import output_name
+from pathlib import Path
+from types import TracebackType
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Puffergröße der Ausgabedatei
+BUFFER_SIZE = 1 << 20
+
+
+class LFormatBase(AbstractContextManager):
+    """Gemeinsame Grundlage der Formatierer
+
+    Die Zeilen werden mit :meth:`encode_row` kodiert. Das geschieht in den
+    Pool Prozessen, der Hauptprozess schreibt die fertigen Bytes nur noch
+    mit :meth:`write` in die Ausgabedatei.
+    """
+
+    shardable = True
+    streamable = True
+    extension = ""
+
+    def __init__(self, lmodel: typing.Any, options: Namespace, part: int | None = None, sink: typing.Any = None) -> None:
+        """
+        Args:
+            lmodel (LicenceModel): Das Lizenz-Modell
+            options (Namespace): Optionen des Exports
+            part (int | None, optional): Nummer des Teils bei aufgeteilter Ausgabe
+            sink (optional): Statt einer Datei in `ablage` in dieses Ziel schreiben,
+                siehe :func:`nl.export.stream.open_sink`
+        """
+        self.lmodel = lmodel
+        self.options = options
+        self.part = part
+        self.sink = sink
+        self.destination = self.options.ablage.absolute()
+
+        self.fpath = None
+        self.fh = None
+        self.owns_fh = True
+
+    @property
+    def path(self) -> Path | None:
+        """Die Ausgabedatei"""
+        return self.fpath
+
+    @classmethod
+    def encode_row(cls, licence: typing.Any, licencee: typing.Any, version: int) -> bytes:
+        """Eine Zeile kodieren
+
+        Args:
+            licence (PloneItem | None): Die Lizenz
+            licencee (PloneItem | None): Der Lizenznehmer
+            version (int): Version des Export Schemas
+
+        Returns:
+            bytes: Die kodierte Zeile
+        """
+        raise NotImplementedError
+
+    def header(self) -> bytes:
+        """Bytes am Anfang der Ausgabe"""
+        return b""
+
+    def footer(self) -> bytes:
+        """Bytes am Ende der Ausgabe"""
+        return b""
+
+    def write(self, rows: list) -> None:
+        """Kodierte Zeilen schreiben"""
+        self.fh.writelines(rows)
+
+    def add_row(self, licence: typing.Any, licencee: typing.Any) -> None:
+        self.write([self.encode_row(licence, licencee, self.options.version)])
+
+    def __enter__(self) -> typing.Any:
+        if self.sink is None:
+            fname = output_name(self.lmodel, self.options, self.part)
+            self.fpath = self.destination / f"{fname}{self.extension}"
+            self.fh = self.fpath.open("wb", buffering=BUFFER_SIZE)
+        else:
+            from nl.export.stream import open_sink
+            self.fh, self.fpath, self.owns_fh = open_sink(self.sink)
+
+        self.fh.write(self.header())
+
+        return super().__enter__()
+
+    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        self.fh.write(self.footer())
+
+        if self.owns_fh:
+            self.fh.close()
+        else:
+            self.fh.flush()
+
+        return super().__exit__(__exc_type, __exc_value, __traceback)
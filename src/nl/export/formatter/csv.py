@@ -9,11 +9,9 @@
 ##############################################################################
 """
 
-from argparse import Namespace
-from contextlib import AbstractContextManager
-from nl.export.plone import LicenceModel
-from nl.export.utils import get_wf_state, option_title, secure_filename
-from types import TracebackType
+from io import StringIO
+from nl.export.formatter.base import LFormatBase
+from nl.export.utils import get_wf_state, option_title
 import csv
 import typing
 
@@ -21,27 +19,35 @@ __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
 
 
-class LFormatCSV(AbstractContextManager):
+class LFormatCSV(LFormatBase):
 
-    def __init__(self, lmodel: LicenceModel, options: Namespace) -> None:
-        self.lmodel = lmodel
-        self.options = options
-        self.destination = self.options.ablage.absolute()
+    extension = ".csv"
 
-        self.cfh = None
-        self.csvpath = None
-        self.writer = None
+    @classmethod
+    def encode_row(cls, licence: typing.Any, licencee: typing.Any, version: int) -> bytes:
+        licencee = {} if licencee is None else licencee.plone_item
 
-    def add_row(self, licence: dict | None, licencee: dict | None) -> dict:
-        match self.options.version:
+        match version:
             case 2:
-                self.add_row_version_2(licence, licencee)
+                row = cls.row_version_2(licencee)
             case _:
-                self.add_row_version_1(licence, licencee)
+                row = cls.row_version_1(licencee)
 
-    def add_row_version_1(self, licence: dict | None, licencee: dict | None) -> dict:
-        licencee = {} if licencee is None else licencee.plone_item
+        return cls.encode_values(row.keys() if licence is None else row.values())
+
+    @staticmethod
+    def encode_values(values: typing.Iterable) -> bytes:
+        buffer = StringIO()
+        writer = csv.writer(buffer,
+                            delimiter=';',
+                            quotechar='"',
+                            quoting=csv.QUOTE_ALL)
+        writer.writerow(values)
 
+        return buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def row_version_1(licencee: dict) -> dict:
         ipv4_allow = licencee.get("ipv4_allow", "")
         ipv4_deny = None
         ezb_id = licencee.get("ezb_id", "")
@@ -71,16 +77,10 @@ class LFormatCSV(AbstractContextManager):
         row["zuid"] = licencee.get("UID", "")
         row["mtime"] = licencee.get("modified", "")
 
-        if licence is None:
-            self.writer.writerow(row.keys())
-        else:
-            self.writer.writerow(row.values())
-
         return row
 
-    def add_row_version_2(self, licence: dict | None, licencee: dict | None) -> dict:
-        licencee = {} if licencee is None else licencee.plone_item
-
+    @staticmethod
+    def row_version_2(licencee: dict) -> dict:
         ipv4_allow = licencee.get("ipv4_allow", "")
         ipv6 = licencee.get("ipv6", "")
         ezb_id = licencee.get("ezb_id", "")
@@ -113,26 +113,7 @@ class LFormatCSV(AbstractContextManager):
         row["zuid"] = licencee.get("UID", "")
         row["mtime"] = licencee.get("modified", "")
 
-        if licence is None:
-            self.writer.writerow(row.keys())
-        else:
-            self.writer.writerow(row.values())
-
         return row
 
-    def __enter__(self) -> typing.Any:
-        fname = secure_filename(self.lmodel.productTitle(), only_ascii=self.options.only_ascii)
-        self.csvpath = self.destination / f"{fname}.csv"
-        self.cfh = self.csvpath.open("w")
-        self.writer = csv.writer(self.cfh,
-                                 delimiter=';',
-                                 quotechar='"',
-                                 quoting=csv.QUOTE_ALL)
-
-        self.add_row(None, None)
-
-        return super().__enter__()
-
-    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
-        self.cfh.close()
-        return super().__exit__(__exc_type, __exc_value, __traceback)
+    def header(self) -> bytes:
+        return self.encode_row(None, None, self.options.version)
@@ -9,38 +9,47 @@
 ##############################################################################
 """
 
-from argparse import Namespace
-from contextlib import AbstractContextManager
-from nl.export.plone import LicenceModel
-from nl.export.utils import secure_filename
+from nl.export import codec
+from nl.export.formatter import output_name
+from nl.export.formatter.base import LFormatBase
 from types import TracebackType
-import json
 import typing
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
 
 
-class LFormatJSON(AbstractContextManager):
+class LFormatJSON(LFormatBase):
+    """Eine JSON Datei je Lizenznehmer"""
 
-    def __init__(self, lmodel: LicenceModel, options: Namespace) -> None:
-        self.lmodel = lmodel
-        self.options = options
-        self.destination = self.options.ablage.absolute()
+    shardable = False
+    streamable = False
 
-        self.jpath = None
+    @classmethod
+    def encode_row(cls, licence: typing.Any, licencee: typing.Any, version: int) -> tuple:
+        return (f"{licencee.plone_item['uid']}.json", codec.dumps(licencee.plone_item))
 
-    def add_row(self, licence: dict | None, licencee: dict | None) -> dict:
-        fpath = self.jpath / f"{licencee.plone_item['uid']}.json"
-        with fpath.open("w") as jfh:
-            json.dump(licencee.plone_item, jfh)
+    def write(self, rows: list) -> None:
+        for name, data in rows:
+            with (self.fpath / name).open("wb") as jfh:
+                jfh.write(data)
 
     def __enter__(self) -> typing.Any:
-        fname = secure_filename(self.lmodel.productTitle(), only_ascii=self.options.only_ascii)
-        self.jpath = self.destination / f"{fname}"
-        self.jpath.mkdir(exist_ok=True)
+        fname = output_name(self.lmodel, self.options, self.part)
+        self.fpath = self.destination / f"{fname}"
+        self.fpath.mkdir(exist_ok=True)
 
-        return super().__enter__()
+        return self
 
     def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
-        return super().__exit__(__exc_type, __exc_value, __traceback)
+        return None
+
+
+class LFormatJSONL(LFormatBase):
+    """JSON Lines, ein Lizenznehmer je Zeile"""
+
+    extension = ".jsonl"
+
+    @classmethod
+    def encode_row(cls, licence: typing.Any, licencee: typing.Any, version: int) -> bytes:
+        return codec.dumps(licencee.plone_item) + b"\n"
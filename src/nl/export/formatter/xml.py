@@ -9,41 +9,26 @@
 ##############################################################################
 """
 
-from argparse import Namespace
-from contextlib import AbstractContextManager
 from lxml import etree
-from nl.export.plone import LicenceModel
-from nl.export.utils import get_wf_state, option_title, secure_filename
-from types import TracebackType
+from nl.export.formatter.base import LFormatBase
+from nl.export.utils import get_wf_state, option_title
 import typing
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
 
+NL_NAMESPACE = "http://www.nationallizenzen.de/ns/nl"
+XNL = "{%s}" % NL_NAMESPACE
+NSMAP = {None: NL_NAMESPACE}
 
-class LFormatXML(AbstractContextManager):
 
-    def __init__(self, lmodel: LicenceModel, options: Namespace) -> None:
-        self.lmodel = lmodel
-        self.options = options
-        self.destination = self.options.ablage.absolute()
+class LFormatXML(LFormatBase):
 
-        self.xmlpath = None
-        self.xfh = None
-        self.dom = None
-
-    def add_row(self, licence: dict | None, licencee: dict | None) -> None:
-        match self.options.version:
-            case 2:
-                self.add_row_version_2(licence, licencee)
-            case _:
-                self.add_row_version_1(licence, licencee)
-
-    def add_row_version_1(self, licence: dict | None, licencee: dict | None) -> None:
-        NL_NAMESPACE = "http://www.nationallizenzen.de/ns/nl"
-        XNL = "{%s}" % NL_NAMESPACE
-        NSMAP = {None: NL_NAMESPACE}
+    extension = ".xml"
 
+    @classmethod
+    def encode_row(cls, licence: typing.Any, licencee: typing.Any, version: int) -> bytes:
+        """Eine Institution als eingerücktes XML Fragment kodieren"""
         def cenc(key, data):
             val_node = etree.Element(XNL + key, nsmap=NSMAP)
 
@@ -62,6 +47,31 @@ class LFormatXML(AbstractContextManager):
 
         licencee = {} if licencee is None else licencee.plone_item
 
+        match version:
+            case 2:
+                row = cls.row_version_2(licencee)
+            case _:
+                row = cls.row_version_1(licencee)
+
+        # Das Fragment wird innerhalb des Wurzelelements serialisiert, damit
+        # Präfix und Einrückung der Ausgabe des gesamten Dokuments entsprechen
+        root = etree.Element(XNL + "institutions", nsmap={"nl": NL_NAMESPACE})
+        inst_node = etree.Element(XNL + "institution", nsmap=NSMAP)
+        root.append(inst_node)
+
+        for key, val in row.items():
+            val_node = cenc(key, val)
+            inst_node.append(val_node)
+
+        xml = etree.tostring(root,
+                             encoding="UTF-8",
+                             method="xml",
+                             pretty_print=True)
+
+        return xml[xml.index(b"\n") + 1:xml.rindex(b"</nl:institutions>")]
+
+    @staticmethod
+    def row_version_1(licencee: dict) -> dict:
         row = {}
         row["user_name"] = licencee.get("uid", "")
         row["status"] = get_wf_state(licencee)
@@ -85,36 +95,10 @@ class LFormatXML(AbstractContextManager):
         row["uid"] = licencee.get("UID", "")
         row["mtime"] = licencee.get("modified", "")
 
-        inst_node = etree.Element(XNL + "institution", nsmap=NSMAP)
-        self.dom.append(inst_node)
-
-        for key, val in row.items():
-            val_node = cenc(key, val)
-            inst_node.append(val_node)
-
-    def add_row_version_2(self, licence: dict | None, licencee: dict | None) -> None:
-        NL_NAMESPACE = "http://www.nationallizenzen.de/ns/nl"
-        XNL = "{%s}" % NL_NAMESPACE
-        NSMAP = {None: NL_NAMESPACE}
-
-        def cenc(key, data):
-            val_node = etree.Element(XNL + key, nsmap=NSMAP)
-
-            if isinstance(data, (list, tuple)):
-                for entry in data:
-                    token_node = etree.Element(XNL + "token", nsmap=NSMAP)
-                    token_node.text = entry
-
-                    val_node.append(token_node)
-            elif type(data) is dict:
-                pass
-            else:
-                val_node.text = data
-
-            return val_node
-
-        licencee = {} if licencee is None else licencee.plone_item
+        return row
 
+    @staticmethod
+    def row_version_2(licencee: dict) -> dict:
         row = {}
         row["user_name"] = licencee.get("uid", "")
         row["status"] = get_wf_state(licencee)
@@ -140,30 +124,11 @@ class LFormatXML(AbstractContextManager):
         row["uid"] = licencee.get("UID", "")
         row["mtime"] = licencee.get("modified", "")
 
-        inst_node = etree.Element(XNL + "institution", nsmap=NSMAP)
-        self.dom.append(inst_node)
-
-        for key, val in row.items():
-            val_node = cenc(key, val)
-            inst_node.append(val_node)
-
-    def __enter__(self) -> typing.Any:
-        fname = secure_filename(self.lmodel.productTitle(), only_ascii=self.options.only_ascii)
-        self.xmlpath = self.destination / f"{fname}.xml"
-
-        basexml = b"""<?xml version='1.0' encoding='UTF-8'?>"""
-        basexml += b"""<nl:institutions xmlns:nl="http://www.nationallizenzen.de/ns/nl"></nl:institutions>"""
-
-        self.dom = etree.fromstring(basexml)
-
-        return super().__enter__()
+        return row
 
-    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
-        with self.xmlpath.open("wb") as xfh:
-            xfh.write(etree.tostring(self.dom,
-                                     xml_declaration=True,
-                                     encoding="UTF-8",
-                                     method="xml",
-                                     pretty_print=True,))
+    def header(self) -> bytes:
+        return (b"""<?xml version='1.0' encoding='UTF-8'?>\n"""
+                b"""<nl:institutions xmlns:nl="http://www.nationallizenzen.de/ns/nl">\n""")
 
-        return super().__exit__(__exc_type, __exc_value, __traceback)
+    def footer(self) -> bytes:
+        return b"""</nl:institutions>\n"""
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Mitglieder von Plone Gruppen exportieren
+
+Die Gruppen und danach ihre Mitglieder werden gleichzeitig über eine
+gemeinsame Sitzung geladen. Mitglieder mehrerer Gruppen werden nur einmal
+geladen und ausgegeben, mit allen ihren Gruppen.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+import csv
+import logging
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Spalten der CSV Ausgabe
+MEMBER_FIELDS = ("id", "username", "fullname", "email", "roles")
+
+
+def load_group(session: typing.Any, groupname: str) -> dict | None:
+    """Eine Gruppe über @groups laden, None falls es sie nicht gibt"""
+    from nl.export.codec import response_json
+    from nl.export.errors import Unauthorized
+    from nl.export.plone import make_url
+
+    logger = logging.getLogger(__name__)
+
+    with session.get(make_url(f"/@groups/{groupname}")) as req:
+        if req.status_code in (401, 403):
+            raise Unauthorized
+        elif req.status_code != 200:
+            logger.error(f"Gruppe {groupname}: {req.status_code} {req.reason}")
+            return None
+
+        return response_json(req)
+
+
+def load_member(session: typing.Any, uid: str) -> dict | None:
+    """Ein Mitglied über @users laden, None falls es nicht vorhanden ist"""
+    from nl.export.codec import response_json
+    from nl.export.plone import make_url
+
+    logger = logging.getLogger(__name__)
+
+    with session.get(make_url(f"/@users/{uid}")) as req:
+        if req.status_code != 200:
+            logger.error(f"Mitglied {uid}: {req.status_code} {req.reason}")
+            return None
+
+        return response_json(req)
+
+
+def group_members(groupnames: typing.Iterable, max_workers: int | None = None, session: typing.Any = None) -> typing.Iterator:
+    """Die Mitglieder der Gruppen, jedes nur einmal
+
+    Args:
+        groupnames (typing.Iterable): Namen der Gruppen
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+        session (requests.Session, optional): Sitzung des Aufrufers
+
+    Returns:
+        typing.Iterator: Mitglieder mit ihren Gruppen (`gruppen`), in der
+            Reihenfolge der Gruppen, sobald sie geladen sind
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+
+    session = get_auth_session() if session is None else session
+    max_workers = max_workers or MAX_WORKERS
+    groupnames = list(dict.fromkeys(groupnames))
+
+    memberships = {}
+
+    for groupname, group in zip(groupnames, fetch_concurrent(lambda name: load_group(session, name),
+                                                             groupnames,
+                                                             max_workers=max_workers)):
+        if group is None:
+            continue
+
+        for uid in group.get("members", {}).get("items", []):
+            memberships.setdefault(uid, []).append(groupname)
+
+    def members():
+        for uid, member in zip(memberships, fetch_concurrent(lambda uid: load_member(session, uid),
+                                                             memberships,
+                                                             max_workers=max_workers)):
+            if member is not None:
+                yield member | {"gruppen": memberships[uid]}
+
+    return members()
+
+
+def write_csv(members: typing.Iterable, fh: typing.TextIO) -> int:
+    """Mitglieder als CSV, eine Zeile je Mitglied"""
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(MEMBER_FIELDS + ("gruppen",))
+
+    num = 0
+
+    for member in members:
+        values = [member.get(field) or "" for field in MEMBER_FIELDS + ("gruppen",)]
+        writer.writerow([",".join(value) if isinstance(value, list) else value for value in values])
+        num += 1
+
+    return num
+
+
+def write_jsonl(members: typing.Iterable, fh: typing.TextIO) -> int:
+    """Mitglieder als JSON Lines, ein Datensatz je Mitglied"""
+    num = 0
+
+    for member in members:
+        fh.write(codec.dumps(member).decode("utf-8") + "\n")
+        num += 1
+
+    return num
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
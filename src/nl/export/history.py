@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Workflow Historie von Lizenzen und Lizenznehmern exportieren
+
+Die Lizenzen der Lizenz-Modelle werden wie beim Export gesucht, ihre
+Lizenznehmer über die Relation `licencee` gleichzeitig geladen. Danach
+wird `@workflow` für alle Objekte gleichzeitig über eine gemeinsame
+Sitzung geladen, in Blöcken zu HISTORY_CHUNK, und jeder Eintrag der
+Historie als eigene Zeile ausgegeben.
+
+Mit einem Stand (`modified` und `review_state` je Objekt des letzten
+Laufs) werden Objekte, die sich seitdem nicht geändert haben,
+übersprungen. Ein Workflow Übergang ändert `modified` nicht unbedingt,
+daher zählt auch ein geänderter Status.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from pathlib import Path
+import csv
+import os
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Objekte je Block gleichzeitiger Abrufe
+HISTORY_CHUNK = 500
+
+LICENCE = "lizenz"
+LICENCEE = "lizenznehmer"
+
+COLUMNS = ("objekt", "uid", "url", "titel", "lizenzmodell",
+           "zeit", "aktion", "status", "status_titel", "akteur", "kommentar")
+
+
+def load_state(path: Path) -> dict:
+    """`modified` und `review_state` je URL aus dem letzten Lauf, leer falls es keinen gibt"""
+    try:
+        return codec.loads(path.read_bytes())
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(path: Path, state: dict) -> None:
+    """Den Stand atomar ersetzen"""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp.write_bytes(codec.dumps(state))
+    os.replace(tmp, path)
+
+
+def licence_objects(lmodel: typing.Any, review_state: list | None = None,
+                    session: typing.Any = None, max_workers: int | None = None) -> list:
+    """Die Lizenzen eines Lizenz-Modells
+
+    Raises:
+        requests.HTTPError: Eine Seite der Suche ist fehlgeschlagen
+
+    Returns:
+        list: Je Lizenz ein dict mit Art, UID, URL, Titel, Lizenz-Modell,
+            `modified` und URL des Lizenznehmers
+    """
+    from nl.export.plone import MAX_WORKERS, get_search_pages
+
+    query = lmodel.lic_query
+
+    if review_state:
+        query["review_state"] = review_state
+
+    return [{"objekt": LICENCE,
+             "uid": entry.get("UID", ""),
+             "url": entry["@id"],
+             "titel": entry.get("title") or "",
+             "lizenzmodell": lmodel.productTitle(),
+             "modified": entry.get("modified"),
+             "review_state": entry.get("review_state"),
+             "lizenznehmer": (entry.get("licencee") or {}).get("@id")}
+            for entry in get_search_pages(query, session=session, max_workers=max_workers or MAX_WORKERS)]
+
+
+def load_item(session: typing.Any, url: str) -> dict:
+    """Ein Objekt laden
+
+    Raises:
+        requests.HTTPError: Das Objekt konnte nicht geladen werden
+    """
+    from nl.export.codec import response_json
+    from nl.export.errors import Unauthorized
+    import requests
+
+    with session.get(url) as req:
+        if req.status_code in (401, 403):
+            raise Unauthorized
+        elif req.status_code != 200:
+            raise requests.HTTPError(f"{url}: {req.status_code} {req.reason}", response=req)
+
+        return response_json(req)
+
+
+def licencee_objects(licences: list, session: typing.Any = None, max_workers: int | None = None) -> list:
+    """Die Lizenznehmer der Lizenzen, jeder nur einmal
+
+    Die Lizenznehmer aus der Relation `licencee` der Lizenzen werden
+    gleichzeitig geladen.
+
+    Raises:
+        requests.HTTPError: Ein Lizenznehmer konnte nicht geladen werden
+
+    Returns:
+        list: Je Lizenznehmer ein dict wie bei :func:`licence_objects`, mit
+            allen Lizenz-Modellen seiner Lizenzen
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+
+    session = get_auth_session() if session is None else session
+    lmodels = {}
+
+    for licence in licences:
+        if licence["lizenznehmer"]:
+            lmodels.setdefault(licence["lizenznehmer"], {})[licence["lizenzmodell"]] = None
+
+    urls = list(lmodels)
+
+    return [{"objekt": LICENCEE,
+             "uid": item.get("UID", ""),
+             "url": url,
+             "titel": item.get("title") or "",
+             "lizenzmodell": ",".join(lmodels[url]),
+             "modified": item.get("modified"),
+             "review_state": item.get("review_state"),
+             "lizenznehmer": None}
+            for url, item in zip(urls, fetch_concurrent(lambda url: load_item(session, url),
+                                                        urls,
+                                                        max_workers=max_workers or MAX_WORKERS))]
+
+
+def object_state(obj: dict) -> dict:
+    """Eintrag eines Objekts im Stand"""
+    return {"modified": obj["modified"], "review_state": obj["review_state"]}
+
+
+def changed(objects: typing.Iterable, state: dict) -> list:
+    """Objekte, deren `modified` oder `review_state` sich seit dem letzten Lauf geändert hat
+
+    Einträge älterer Stände (nur `modified`) gelten als geändert.
+    """
+    return [obj for obj in objects if not obj["modified"] or state.get(obj["url"]) != object_state(obj)]
+
+
+def load_history(session: typing.Any, obj: dict) -> list:
+    """Die Workflow Historie eines Objekts
+
+    Raises:
+        requests.HTTPError: Die Historie konnte nicht geladen werden
+    """
+    from nl.export.codec import response_json
+    from nl.export.errors import Unauthorized
+    import requests
+
+    with session.get(f"""{obj["url"]}/@workflow""") as req:
+        if req.status_code in (401, 403):
+            raise Unauthorized
+        elif req.status_code != 200:
+            raise requests.HTTPError(f"""Workflow {obj["url"]}: {req.status_code} {req.reason}""", response=req)
+
+        return response_json(req).get("history", [])
+
+
+def transitions(obj: dict, history: list) -> typing.Iterator:
+    """Die Einträge der Historie als flache Zeilen"""
+    for entry in history:
+        yield {"objekt": obj["objekt"],
+               "uid": obj["uid"],
+               "url": obj["url"],
+               "titel": obj["titel"],
+               "lizenzmodell": obj["lizenzmodell"],
+               "zeit": entry.get("time") or "",
+               "aktion": entry.get("action") or "",
+               "status": entry.get("review_state") or "",
+               "status_titel": entry.get("title") or "",
+               "akteur": entry.get("actor") or "",
+               "kommentar": entry.get("comments") or ""}
+
+
+def workflow_histories(objects: list, state: dict | None = None,
+                       max_workers: int | None = None, session: typing.Any = None) -> typing.Iterator:
+    """Die Historien der Objekte, Block für Block geladen
+
+    Der Stand wird nur für Objekte eingetragen, deren Historie vollständig
+    ausgegeben wurde.
+
+    Args:
+        objects (list): Ergebnisse von :func:`licence_objects` bzw. :func:`licencee_objects`
+        state (dict, optional): Stand, für jedes geladene Objekt werden `modified` und `review_state` eingetragen
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+        session (requests.Session, optional): Sitzung des Aufrufers
+
+    Raises:
+        requests.RequestException: Eine Historie konnte nicht geladen werden
+
+    Returns:
+        typing.Iterator: Zeilen mit den Spalten aus COLUMNS, in der Reihenfolge der Objekte
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+
+    session = get_auth_session() if session is None else session
+    max_workers = max_workers or MAX_WORKERS
+
+    for idx in range(0, len(objects), HISTORY_CHUNK):
+        chunk = objects[idx:idx + HISTORY_CHUNK]
+
+        for obj, history in zip(chunk, fetch_concurrent(lambda obj: load_history(session, obj),
+                                                        chunk,
+                                                        max_workers=max_workers)):
+            yield from transitions(obj, history)
+
+            if state is not None and obj["modified"]:
+                state[obj["url"]] = object_state(obj)
+
+
+def write_csv(rows: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Übergänge als CSV, eine Zeile je Eintrag der Historie"""
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(COLUMNS)
+
+    stats = {LICENCE: 0, LICENCEE: 0}
+
+    for row in rows:
+        stats[row["objekt"]] += 1
+        writer.writerow([row[column] for column in COLUMNS])
+
+    return stats
+
+
+def write_jsonl(rows: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Übergänge als JSON Lines, ein Datensatz je Eintrag der Historie"""
+    stats = {LICENCE: 0, LICENCEE: 0}
+
+    for row in rows:
+        stats[row["objekt"]] += 1
+        fh.write(codec.dumps(row).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
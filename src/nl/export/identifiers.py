@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""Index der Kennungen von Lizenznehmern (Sigel, EZB ID, ISNI, Fremdschlüssel)
+
+Der Index wird beim Export (`nl-export lzn --kennungen`) mit den
+Lizenznehmern eines Lizenz-Modells aktualisiert und bildet jede Kennung
+auf die Lizenznehmer mit ihren Lizenz-Modellen ab. Er ist eine Hashtabelle
+mit offener Adressierung, die per mmap gelesen wird, eine Abfrage braucht
+im Mittel einen Zugriff.
+
+Aufbau der Datei:
+
+    Kopf      HEADER (Kennung, Anzahl Plätze und Kennungen, Länge der Treffer und Metadaten)
+    Plätze    je Platz Hash, Position und Länge der Treffer (SLOT), Hash 0 ist frei
+    Treffer   JSON je Kennung
+    Meta      JSON mit den Lizenznehmern je Lizenz-Modell für den erneuten Aufbau
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from contextlib import AbstractContextManager
+from nl.export import codec
+from pathlib import Path
+from types import TracebackType
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+MAGIC = b"NLKIDX01"
+HEADER = struct.Struct("<8sIIII")
+SLOT = struct.Struct("<QII")
+
+# Felder der Lizenznehmer mit Kennungen
+ID_FIELDS = ("sigel", "ezb_id", "isni", "foreign_keys")
+
+
+def normalize(value: typing.Any) -> str:
+    """Kennungen ohne Unterschied von Groß- und Kleinschreibung und Leerraum vergleichen"""
+    return " ".join(str(value).split()).casefold()
+
+
+def key_hash(key: str) -> int:
+    """64 Bit Hash einer normalisierten Kennung, nie 0"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") | 1
+
+
+def licencee_identifiers(licencee: typing.Any) -> dict | None:
+    """Die Kennungen eines Lizenznehmers
+
+    Args:
+        licencee (PloneItem | None): Der Lizenznehmer
+
+    Returns:
+        dict | None: UID, Titel und je Feld die Werte, None ohne Lizenznehmer
+    """
+    item = {} if licencee is None else licencee.plone_item
+
+    if not item.get("UID"):
+        return None
+
+    record = {"uid": item["UID"], "title": item.get("title", "")}
+
+    for field in ID_FIELDS:
+        values = item.get(field) or []
+        values = values if isinstance(values, list) else [values]
+        record[field] = [str(value).strip() for value in values if str(value).strip()]
+
+    return record
+
+
+def load_meta(path: Path) -> dict:
+    """Metadaten eines vorhandenen Index, leer falls keiner vorhanden ist"""
+    try:
+        with IdentifierIndex(path) as index:
+            return index.meta
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_index(path: Path, meta: dict) -> dict:
+    """Die Hashtabelle aus den Lizenznehmern je Lizenz-Modell schreiben
+
+    Returns:
+        dict: Anzahl der Lizenz-Modelle, Lizenznehmer und Kennungen
+    """
+    entries = {}
+    licencees = set()
+
+    for lmodel_uid, lmodel in sorted(meta["modelle"].items()):
+        for record in lmodel["lizenznehmer"]:
+            licencees.add(record["uid"])
+
+            for field in ID_FIELDS:
+                for value in record[field]:
+                    hits = entries.setdefault(normalize(value), {})
+                    hit = hits.setdefault((field, value, record["uid"]),
+                                          {"typ": field, "wert": value, "uid": record["uid"], "title": record["title"], "modelle": []})
+                    hit["modelle"].append({"uid": lmodel_uid, "titel": lmodel["titel"]})
+
+    num_slots = 8
+    while num_slots < 2 * len(entries):
+        num_slots *= 2
+
+    slots = [(0, 0, 0)] * num_slots
+    values = bytearray()
+
+    for key in sorted(entries):
+        data = codec.dumps({"kennung": key, "treffer": list(entries[key].values())})
+        khash = key_hash(key)
+        idx = khash & (num_slots - 1)
+
+        while slots[idx][0] != 0:
+            idx = (idx + 1) & (num_slots - 1)
+
+        slots[idx] = (khash, len(values), len(data))
+        values.extend(data)
+
+    meta_bytes = codec.dumps(meta)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+
+    with tmp.open("wb") as fh:
+        fh.write(HEADER.pack(MAGIC, num_slots, len(entries), len(values), len(meta_bytes)))
+        for slot in slots:
+            fh.write(SLOT.pack(*slot))
+        fh.write(values)
+        fh.write(meta_bytes)
+
+    os.replace(tmp, path)
+
+    return {"modelle": len(meta["modelle"]), "lizenznehmer": len(licencees), "kennungen": len(entries)}
+
+
+def update_index(path: Path, lmodel: typing.Any, records: typing.Iterable) -> dict:
+    """Die Lizenznehmer eines Lizenz-Modells im Index ersetzen
+
+    Die übrigen Lizenz-Modelle bleiben erhalten. Gleichzeitige Exporte
+    warten aufeinander, die Datei wird atomar ersetzt.
+
+    Args:
+        path (Path): Die Indexdatei
+        lmodel (LicenceModel): Das Lizenz-Modell
+        records (typing.Iterable): Ergebnisse von :func:`licencee_identifiers`
+
+    Returns:
+        dict: Anzahl der Lizenz-Modelle, Lizenznehmer und Kennungen
+    """
+    unique = {}
+
+    for record in records:
+        if record is not None:
+            unique.setdefault(record["uid"], record)
+
+    with path.with_name(f"{path.name}.lock").open("wb") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        meta = load_meta(path) or {"modelle": {}}
+        meta["modelle"][lmodel.plone_uid] = {"titel": lmodel.productTitle(),
+                                             "lizenznehmer": [unique[uid] for uid in sorted(unique)]}
+
+        return write_index(path, meta)
+
+
+class IdentifierIndex(AbstractContextManager):
+    """Lesezugriff auf einen Index per mmap
+
+    Beispiel:
+
+        with IdentifierIndex(Path("kennungen.idx")) as index:
+            index.lookup("DE-7")
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+        with self.path.open("rb") as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mm) < HEADER.size:
+            self.mm.close()
+            raise ValueError(f"Kein Index der Kennungen: {self.path}")
+
+        magic, self.num_slots, self.num_keys, values_len, meta_len = HEADER.unpack_from(self.mm, 0)
+
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f"Kein Index der Kennungen: {self.path}")
+
+        self.values_offset = HEADER.size + self.num_slots * SLOT.size
+        self.meta_offset = self.values_offset + values_len
+        self.meta_len = meta_len
+
+    @property
+    def meta(self) -> dict:
+        """Die Lizenznehmer je Lizenz-Modell, erst bei Bedarf gelesen"""
+        return codec.loads(self.mm[self.meta_offset:self.meta_offset + self.meta_len])
+
+    def close(self) -> None:
+        self.mm.close()
+
+    def lookup(self, value: str, typ: str | None = None) -> list:
+        """Lizenznehmer mit dieser Kennung
+
+        Args:
+            value (str): Sigel, EZB ID, ISNI oder Fremdschlüssel
+            typ (str | None, optional): Nur Treffer dieses Felds aus ID_FIELDS
+
+        Returns:
+            list: Treffer mit Feld, Wert, UID und Titel des Lizenznehmers und seinen Lizenz-Modellen
+        """
+        key = normalize(value)
+        khash = key_hash(key)
+        idx = khash & (self.num_slots - 1)
+
+        while True:
+            shash, offset, length = SLOT.unpack_from(self.mm, HEADER.size + idx * SLOT.size)
+
+            if shash == 0:
+                return []
+
+            if shash == khash:
+                start = self.values_offset + offset
+                entry = codec.loads(self.mm[start:start + length])
+
+                if entry["kennung"] == key:
+                    return [hit for hit in entry["treffer"] if typ is None or hit["typ"] == typ]
+
+            idx = (idx + 1) & (self.num_slots - 1)
+
+    def resolve(self, values: typing.Iterable, typ: str | None = None) -> list:
+        """Viele Kennungen auflösen
+
+        Returns:
+            list: Tupel (Kennung, Treffer) in der Reihenfolge der Eingabe
+        """
+        return [(value, self.lookup(value, typ)) for value in values]
+
+    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        self.close()
+        return super().__exit__(__exc_type, __exc_value, __traceback)
+
+
+FOUND = "gefunden"
+MISSING = "fehlt"
+
+COLUMNS = ("kennung", "status", "typ", "wert", "uid", "title", "modelle")
+
+
+def resolve_results(pairs: typing.Iterable) -> typing.Iterator:
+    """Ergebnisse aus :meth:`IdentifierIndex.resolve` als flache Datensätze, einer je Treffer"""
+    for value, hits in pairs:
+        if not hits:
+            yield {"kennung": value, "status": MISSING, "typ": "", "wert": "", "uid": "", "title": "", "modelle": []}
+
+        for hit in hits:
+            yield {"kennung": value, "status": FOUND} | hit
+
+
+def write_csv(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Treffer als CSV, die Lizenz-Modelle mit Komma getrennt"""
+    import csv
+
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(COLUMNS)
+
+    stats = {FOUND: 0, MISSING: 0}
+
+    for result in results:
+        stats[result["status"]] += 1
+        writer.writerow([result[column] for column in COLUMNS[:-1]] +
+                        [",".join(lmodel["titel"] for lmodel in result["modelle"])])
+
+    return stats
+
+
+def write_jsonl(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Treffer als JSON Lines, ein Datensatz je Treffer"""
+    stats = {FOUND: 0, MISSING: 0}
+
+    for result in results:
+        stats[result["status"]] += 1
+        fh.write(codec.dumps(result).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
@@ -9,8 +9,6 @@
 """
 
 # Imports
-from zope.interface import Attribute, Interface
 
 __author__ = """Marc-J. Tegethoff <marc.tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
-
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Überschneidungen der IP Bereiche verschiedener Lizenznehmer finden
+
+Die Bereiche aus den Exporten werden wie für den IP Index normalisiert und
+je Lizenznehmer zusammengefasst, siehe :func:`nl.export.ipindex.read_source`.
+Nach Anfang sortiert werden sie einmal durchlaufen, dabei werden nur die
+noch offenen Bereiche verglichen. Der Aufwand ist O(n log n) plus die
+Anzahl der gefundenen Paare.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from pathlib import Path
+import csv
+import heapq
+import ipaddress
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+DUPLICATE = "duplikat"
+CONTAINED = "enthalten"
+OVERLAP = "ueberschneidung"
+
+COLUMNS = ("art",
+           "bereich_a", "lizenznehmer_a", "titel_a", "quellen_a",
+           "bereich_b", "lizenznehmer_b", "titel_b", "quellen_b",
+           "gemeinsam")
+
+
+def format_range(version: int, start: int, end: int) -> str:
+    """Ein Intervall als Netz in CIDR Schreibweise oder als Bereich Anfang-Ende"""
+    first = ipaddress.IPv4Address(start) if version == 4 else ipaddress.IPv6Address(start)
+    last = ipaddress.IPv4Address(end) if version == 4 else ipaddress.IPv6Address(end)
+    networks = list(ipaddress.summarize_address_range(first, last))
+
+    return str(networks[0]) if len(networks) == 1 else f"{first}-{last}"
+
+
+def collect_intervals(sources: typing.Iterable) -> tuple:
+    """Die Intervalle aller Lizenznehmer aus den Exporten
+
+    Returns:
+        tuple: Lizenznehmer (Schlüssel, Titel, Quellen) und je IP Version
+            die Intervalle (Anfang, Ende, Schlüssel)
+    """
+    from nl.export.ipindex import read_source, source_name
+
+    licencees = {}
+
+    for spath in sources:
+        spath = Path(spath)
+
+        for key, entry in read_source(spath).items():
+            merged = licencees.setdefault(key, {"key": key, "title": entry["title"], "quellen": set(), "netze": set()})
+            merged["quellen"].add(source_name(spath))
+            merged["netze"].update(entry["netze"])
+
+    intervals = {4: [], 6: []}
+
+    for key, entry in licencees.items():
+        for version in (4, 6):
+            networks = (ipaddress.ip_network(net) for net in entry["netze"] if (":" in net) == (version == 6))
+            merged = []
+
+            # Aneinandergrenzende Netze wieder zu einem Bereich verbinden,
+            # sonst wären nur Netze ineinander enthalten, nie teilweise überlappend
+            for net in ipaddress.collapse_addresses(networks):
+                start, end = int(net.network_address), int(net.broadcast_address)
+
+                if merged and merged[-1][1] + 1 == start:
+                    merged[-1][1] = end
+                else:
+                    merged.append([start, end])
+
+            intervals[version].extend((start, end, key) for start, end in merged)
+
+    return (licencees, intervals)
+
+
+def sweep(intervals: list) -> typing.Iterator:
+    """Alle Paare sich überschneidender Intervalle verschiedener Lizenznehmer
+
+    Args:
+        intervals (list): Tupel (Anfang, Ende, Schlüssel)
+
+    Returns:
+        typing.Iterator: Tupel (Art, Intervall A, Intervall B), A beginnt nicht nach B
+    """
+    active = []
+
+    # Bei gleichem Anfang zuerst das größere Intervall, es enthält dann das kleinere
+    for interval in sorted(intervals, key=lambda entry: (entry[0], -entry[1], entry[2])):
+        start, end, key = interval
+
+        while active and active[0][0] < start:
+            heapq.heappop(active)
+
+        for _, other in active:
+            if other[2] == key:
+                continue
+
+            if (other[0], other[1]) == (start, end):
+                kind = DUPLICATE
+            elif other[1] >= end:
+                kind = CONTAINED
+            else:
+                kind = OVERLAP
+
+            yield (kind, other, interval)
+
+        heapq.heappush(active, (end, interval))
+
+
+def audit(sources: typing.Iterable) -> typing.Iterator:
+    """Überschneidungen, Enthaltensein und Duplikate in den Exporten
+
+    Args:
+        sources (typing.Iterable): Pfade der Exporte (csv, xml, jsonl)
+
+    Returns:
+        typing.Iterator: Je Paar ein dict mit den Spalten aus COLUMNS
+    """
+    licencees, intervals = collect_intervals(sources)
+
+    for version in (4, 6):
+        for kind, first, second in sweep(intervals[version]):
+            row = {"art": kind}
+
+            for suffix, (start, end, key) in (("a", first), ("b", second)):
+                row[f"bereich_{suffix}"] = format_range(version, start, end)
+                row[f"lizenznehmer_{suffix}"] = key
+                row[f"titel_{suffix}"] = licencees[key]["title"]
+                row[f"quellen_{suffix}"] = sorted(licencees[key]["quellen"])
+
+            row["gemeinsam"] = format_range(version, second[0], min(first[1], second[1]))
+
+            yield row
+
+
+def write_csv(rows: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Befunde als CSV, eine Zeile je Paar"""
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+    writer.writerow(COLUMNS)
+
+    stats = {DUPLICATE: 0, CONTAINED: 0, OVERLAP: 0}
+
+    for row in rows:
+        stats[row["art"]] += 1
+        writer.writerow(",".join(row[column]) if isinstance(row[column], list) else row[column] for column in COLUMNS)
+
+    return stats
+
+
+def write_jsonl(rows: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Befunde als JSON Lines, ein Datensatz je Paar"""
+    stats = {DUPLICATE: 0, CONTAINED: 0, OVERLAP: 0}
+
+    for row in rows:
+        stats[row["art"]] += 1
+        fh.write(codec.dumps(row).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
@@ -0,0 +1,447 @@
+# -*- coding: utf-8 -*-
+"""Index der IP Bereiche aus den Exporten
+
+Die Bereiche aus `ipv4_allow` und `ipv6` werden normalisiert, je
+Lizenznehmer zusammengefasst und als sortierte, überschneidungsfreie
+Intervalle ganzer Zahlen gespeichert. Die Datei wird per mmap gelesen,
+eine Abfrage ist eine Bisektion über die Intervalle. Beim Öffnen werden
+nur Kopf und Metadaten gelesen, die Lizenznehmer einer Menge erst bei der
+Abfrage.
+
+Aufbau der Datei:
+
+    Kopf      HEADER (Kennung, Anzahl IPv4 und IPv6 Intervalle, Mengen, Mitglieder
+              und Lizenznehmer, Länge der Lizenznehmer und Metadaten)
+    IPv4      je Intervall Anfang, Ende, Nummer der Menge (V4_RECORD)
+    IPv6      je Intervall Anfang und Ende als je zwei 64 Bit Hälften, Nummer der Menge (V6_RECORD)
+    Mengen    je Menge erstes Mitglied und Anzahl (SET_RECORD)
+    Mitglieder  Nummern der Lizenznehmer (MEMBER)
+    Plätze    je Lizenznehmer Position und Länge (ENTRY_RECORD)
+    Werte     JSON je Lizenznehmer mit Schlüssel, Titel und Quellen
+    Meta      JSON mit Größe und Änderungszeit der Quellen und der Prüfsumme der Einträge
+
+Die Lizenznehmer je Quelle für den erneuten Aufbau liegen daneben in
+`<index>.quellen` und werden nur von :func:`build_index` gelesen.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from collections import Counter, defaultdict
+from contextlib import AbstractContextManager
+from nl.export import codec
+from pathlib import Path
+from types import TracebackType
+import hashlib
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+MAGIC = b"NLIPIDX2"
+HEADER = struct.Struct("<8sIIIIIQI")
+V4_RECORD = struct.Struct("<III")
+V6_RECORD = struct.Struct("<QQQQI")
+SET_RECORD = struct.Struct("<II")
+MEMBER = struct.Struct("<I")
+ENTRY_RECORD = struct.Struct("<QI")
+
+# Endung der Datei mit den Lizenznehmern je Quelle
+SOURCES_SUFFIX = ".quellen"
+
+# Felder der Exporte mit IP Bereichen
+IP_FIELDS = ("ipv4_allow", "ipv6")
+
+MASK64 = (1 << 64) - 1
+
+
+def parse_range(value: str) -> list:
+    """Eine Angabe in Netze umwandeln
+
+    Erlaubt sind einzelne Adressen, CIDR (`134.76.0.0/16`), Platzhalter
+    (`134.76.*`, `134.76.*.*`) und Bereiche (`134.76.1.1-134.76.1.9`
+    oder kurz `134.76.1.1-9`), für IPv6 Adressen, CIDR und Bereiche.
+
+    Raises:
+        ValueError: Keine gültige Angabe
+
+    Returns:
+        list: ipaddress Netze
+    """
+    value = value.strip()
+
+    if "*" in value:
+        parts = [part for part in value.split(".") if part != ""]
+        fixed = []
+
+        for part in parts:
+            if part == "*":
+                break
+            fixed.append(part)
+
+        if len(fixed) == len(parts) or any(part != "*" for part in parts[len(fixed):]) or len(parts) > 4:
+            raise ValueError(f"Ungültiger Platzhalter: {value}")
+
+        address = ".".join(fixed + ["0"] * (4 - len(fixed)))
+        return [ipaddress.ip_network(f"{address}/{8 * len(fixed)}")]
+
+    if "-" in value:
+        first, last = (part.strip() for part in value.split("-", 1))
+        start = ipaddress.ip_address(first)
+
+        if start.version == 4 and "." not in last:
+            last = ".".join(first.split(".")[:3] + [last])
+
+        return list(ipaddress.summarize_address_range(start, ipaddress.ip_address(last)))
+
+    return [ipaddress.ip_network(value, strict=False)]
+
+
+def split_values(value: str) -> list:
+    """Listen aus CSV/XML (mit Komma getrennt) oder JSON Lines (JSON)"""
+    if value.startswith("["):
+        return [entry for entry in codec.loads(value) if isinstance(entry, str)]
+
+    return [entry for entry in value.split(",") if entry.strip()]
+
+
+def read_source(path: Path) -> dict:
+    """Lizenznehmer mit ihren zusammengefassten Netzen aus einem Export
+
+    Returns:
+        dict: Je Schlüssel (zuid bzw. uid) Titel und Netze als Text
+    """
+    from nl.export.diff import read_export, row_key
+
+    logger = logging.getLogger(__name__)
+
+    _, rows = read_export(path)
+    result = {}
+
+    for row in rows:
+        try:
+            key = row_key(row)
+        except KeyError:
+            continue
+
+        networks = []
+
+        for field in IP_FIELDS:
+            for value in split_values(row.get(field) or ""):
+                try:
+                    networks.extend(parse_range(value))
+                except ValueError:
+                    logger.warning(f"{path.name}: {key}: Ungültiger IP Bereich {value!r}")
+
+        if not networks:
+            continue
+
+        collapsed = [str(net)
+                     for version in (4, 6)
+                     for net in ipaddress.collapse_addresses(net for net in networks if net.version == version)]
+
+        result[key] = {"title": row.get("title", ""), "netze": collapsed}
+
+    return result
+
+
+def source_name(path: Path) -> str:
+    """Produkt eines Exports, die Nummer aufgeteilter Dateien entfällt"""
+    return path.name.split(".")[0]
+
+
+def segments(intervals: list) -> list:
+    """Überlappende Intervalle in überschneidungsfreie Abschnitte zerlegen
+
+    Args:
+        intervals (list): Tupel (Anfang, Ende, Lizenznehmer)
+
+    Returns:
+        list: Tupel (Anfang, Ende, Lizenznehmer als Tupel), sortiert
+    """
+    events = defaultdict(list)
+
+    for start, end, entry in intervals:
+        events[start].append((1, entry))
+        events[end + 1].append((-1, entry))
+
+    result = []
+    active = Counter()
+    prev = None
+
+    for point in sorted(events):
+        if prev is not None and active:
+            members = tuple(sorted(active))
+
+            if result and result[-1][1] == prev - 1 and result[-1][2] == members:
+                result[-1][1] = point - 1
+            else:
+                result.append([prev, point - 1, members])
+
+        for delta, entry in events[point]:
+            active[entry] += delta
+            if active[entry] == 0:
+                del active[entry]
+
+        prev = point
+
+    return [tuple(segment) for segment in result]
+
+
+def load_meta(path: Path) -> dict:
+    """Metadaten eines vorhandenen Index, leer falls keiner vorhanden ist"""
+    try:
+        with IPIndex(path) as index:
+            return index.meta
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def sources_path(path: Path) -> Path:
+    return path.with_name(path.name + SOURCES_SUFFIX)
+
+
+def load_sources(path: Path) -> dict:
+    """Die Quellen des letzten Aufbaus mit ihren Lizenznehmern
+
+    Passt die Datei nicht zur Prüfsumme im Index, werden alle Exporte neu
+    gelesen.
+    """
+    meta = load_meta(path)
+
+    try:
+        data = sources_path(path).read_bytes()
+    except FileNotFoundError:
+        return {}
+
+    if hashlib.sha256(data).hexdigest() != meta.get("sha256"):
+        return {}
+
+    entries = codec.loads(data)
+
+    return {spath: source | {"eintraege": entries.get(spath, {})}
+            for spath, source in meta.get("quellen", {}).items()
+            if spath in entries}
+
+
+def build_index(path: Path, sources: typing.Iterable) -> dict:
+    """Den Index aus Exporten (csv, xml, jsonl) aufbauen bzw. erneuern
+
+    Exporte, deren Größe und Änderungszeit sich seit dem letzten Aufbau
+    nicht geändert haben, werden nicht erneut gelesen. Nicht mehr
+    angegebene Exporte fallen heraus. Die Dateien werden atomar ersetzt.
+
+    Args:
+        path (Path): Die Indexdatei
+        sources (typing.Iterable): Pfade der Exporte
+
+    Returns:
+        dict: Anzahl gelesener und übernommener Exporte, Lizenznehmer und Intervalle
+    """
+    cached = load_sources(path)
+    stats = {"gelesen": 0, "unveraendert": 0}
+    quellen = {}
+
+    for spath in sources:
+        spath = Path(spath).absolute()
+        stat = spath.stat()
+        old = cached.get(str(spath))
+
+        if old is not None and old["mtime"] == stat.st_mtime_ns and old["size"] == stat.st_size:
+            quellen[str(spath)] = old
+            stats["unveraendert"] += 1
+            continue
+
+        quellen[str(spath)] = {"mtime": stat.st_mtime_ns,
+                               "size": stat.st_size,
+                               "name": source_name(spath),
+                               "eintraege": read_source(spath)}
+        stats["gelesen"] += 1
+
+    # Lizenznehmer über alle Exporte zusammenführen
+    entries = {}
+
+    for source in quellen.values():
+        for key, entry in source["eintraege"].items():
+            merged = entries.setdefault(key, {"key": key, "title": entry["title"], "quellen": [], "netze": set()})
+            merged["quellen"].append(source["name"])
+            merged["netze"].update(entry["netze"])
+
+    keys = sorted(entries)
+    intervals = {4: [], 6: []}
+
+    for idx, key in enumerate(keys):
+        for net in ipaddress.collapse_addresses(ipaddress.ip_network(net) for net in entries[key]["netze"] if ":" not in net):
+            intervals[4].append((int(net.network_address), int(net.broadcast_address), idx))
+        for net in ipaddress.collapse_addresses(ipaddress.ip_network(net) for net in entries[key]["netze"] if ":" in net):
+            intervals[6].append((int(net.network_address), int(net.broadcast_address), idx))
+
+    sets = {}
+    records = {}
+
+    for version in (4, 6):
+        records[version] = [(start, end, sets.setdefault(members, len(sets)))
+                            for start, end, members in segments(intervals[version])]
+
+    set_records = []
+    members = []
+
+    for set_members in sorted(sets, key=sets.get):
+        set_records.append((len(members), len(set_members)))
+        members.extend(set_members)
+
+    entry_records = []
+    values = bytearray()
+
+    for key in keys:
+        data = codec.dumps({"key": key,
+                            "title": entries[key]["title"],
+                            "quellen": sorted(set(entries[key]["quellen"]))})
+        entry_records.append((len(values), len(data)))
+        values.extend(data)
+
+    sources_bytes = codec.dumps({spath: source["eintraege"] for spath, source in quellen.items()})
+    meta = {"quellen": {spath: {key: val for key, val in source.items() if key != "eintraege"}
+                        for spath, source in quellen.items()},
+            "sha256": hashlib.sha256(sources_bytes).hexdigest()}
+    meta_bytes = codec.dumps(meta)
+
+    spath = sources_path(path)
+    tmp = spath.with_name(f".{spath.name}.{os.getpid()}")
+    tmp.write_bytes(sources_bytes)
+    os.replace(tmp, spath)
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+
+    with tmp.open("wb") as fh:
+        fh.write(HEADER.pack(MAGIC, len(records[4]), len(records[6]), len(set_records), len(members),
+                             len(entry_records), len(values), len(meta_bytes)))
+        for start, end, set_idx in records[4]:
+            fh.write(V4_RECORD.pack(start, end, set_idx))
+        for start, end, set_idx in records[6]:
+            fh.write(V6_RECORD.pack(start >> 64, start & MASK64, end >> 64, end & MASK64, set_idx))
+        for record in set_records:
+            fh.write(SET_RECORD.pack(*record))
+        for idx in members:
+            fh.write(MEMBER.pack(idx))
+        for record in entry_records:
+            fh.write(ENTRY_RECORD.pack(*record))
+        fh.write(values)
+        fh.write(meta_bytes)
+
+    os.replace(tmp, path)
+
+    stats.update({"lizenznehmer": len(keys), "ipv4": len(records[4]), "ipv6": len(records[6])})
+
+    return stats
+
+
+class IPIndex(AbstractContextManager):
+    """Lesezugriff auf einen Index per mmap
+
+    Beispiel:
+
+        with IPIndex(Path("ip.idx")) as index:
+            index.lookup("134.76.10.1")
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+
+        with self.path.open("rb") as fh:
+            self.mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.mm) < HEADER.size:
+            self.mm.close()
+            raise ValueError(f"Kein IP Index: {self.path}")
+
+        magic, self.num_v4, self.num_v6, num_sets, num_members, num_entries, values_len, meta_len = HEADER.unpack_from(self.mm, 0)
+
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f"Kein IP Index: {self.path}")
+
+        self.v4_offset = HEADER.size
+        self.v6_offset = self.v4_offset + self.num_v4 * V4_RECORD.size
+        self.sets_offset = self.v6_offset + self.num_v6 * V6_RECORD.size
+        self.members_offset = self.sets_offset + num_sets * SET_RECORD.size
+        self.entries_offset = self.members_offset + num_members * MEMBER.size
+        self.values_offset = self.entries_offset + num_entries * ENTRY_RECORD.size
+        meta_offset = self.values_offset + values_len
+
+        if len(self.mm) != meta_offset + meta_len:
+            self.mm.close()
+            raise ValueError(f"IP Index unvollständig: {self.path}")
+
+        self.meta = codec.loads(self.mm[meta_offset:meta_offset + meta_len])
+
+    def close(self) -> None:
+        self.mm.close()
+
+    def _record(self, version: int, idx: int) -> tuple:
+        if version == 4:
+            return V4_RECORD.unpack_from(self.mm, self.v4_offset + idx * V4_RECORD.size)
+
+        start_hi, start_lo, end_hi, end_lo, set_idx = V6_RECORD.unpack_from(self.mm, self.v6_offset + idx * V6_RECORD.size)
+
+        return ((start_hi << 64) | start_lo, (end_hi << 64) | end_lo, set_idx)
+
+    def _entry(self, idx: int) -> dict:
+        position, length = ENTRY_RECORD.unpack_from(self.mm, self.entries_offset + idx * ENTRY_RECORD.size)
+        start = self.values_offset + position
+
+        return codec.loads(self.mm[start:start + length])
+
+    def lookup(self, address: str) -> list:
+        """Lizenznehmer, deren Bereiche die Adresse enthalten
+
+        Args:
+            address (str): IPv4 oder IPv6 Adresse
+
+        Raises:
+            ValueError: Keine gültige Adresse
+
+        Returns:
+            list: Lizenznehmer mit Schlüssel, Titel und Quellen (Produkten)
+        """
+        ip = ipaddress.ip_address(address.strip())
+
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+
+        value = int(ip)
+        low, high = 0, self.num_v4 if ip.version == 4 else self.num_v6
+
+        # Letztes Intervall mit Anfang <= Adresse
+        while low < high:
+            mid = (low + high) // 2
+            if self._record(ip.version, mid)[0] <= value:
+                low = mid + 1
+            else:
+                high = mid
+
+        if low == 0:
+            return []
+
+        start, end, set_idx = self._record(ip.version, low - 1)
+
+        if value > end:
+            return []
+
+        first, count = SET_RECORD.unpack_from(self.mm, self.sets_offset + set_idx * SET_RECORD.size)
+
+        return [self._entry(MEMBER.unpack_from(self.mm, self.members_offset + (first + num) * MEMBER.size)[0])
+                for num in range(count)]
+
+    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        self.close()
+        return super().__exit__(__exc_type, __exc_value, __traceback)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Abgleich von Listen mit Anmeldenamen
+
+Siehe :meth:`nl.export.plone.Member.byLogonNames`.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+from pathlib import Path
+import csv
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+FOUND = "gefunden"
+MISSING = "fehlt"
+
+
+def read_logonnames(path: Path) -> list:
+    """Ein Anmeldename je Zeile, leere Zeilen und Kommentare (#) entfallen"""
+    with path.open(encoding="utf-8-sig") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+
+def lookup_results(pairs: typing.Iterable, fields: typing.Iterable) -> typing.Iterator:
+    """Ergebnisse aus :meth:`Member.byLogonNames` als flache Datensätze"""
+    for name, member in pairs:
+        item = {} if member is None else member.plone_item
+        yield {"logonname": name,
+               "status": MISSING if member is None else FOUND,
+               "@id": item.get("@id", "")} | {field: item.get(field, "") for field in fields if field != "logonname"}
+
+
+def write_csv(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Ergebnisse als CSV, eine Zeile je Anmeldename"""
+    writer = None
+    stats = {FOUND: 0, MISSING: 0}
+
+    for result in results:
+        if writer is None:
+            writer = csv.writer(fh,
+                                delimiter=';',
+                                quotechar='"',
+                                quoting=csv.QUOTE_ALL)
+            writer.writerow(result.keys())
+
+        stats[result["status"]] += 1
+        writer.writerow("" if value is None else value for value in result.values())
+
+    return stats
+
+
+def write_jsonl(results: typing.Iterable, fh: typing.TextIO) -> dict:
+    """Ergebnisse als JSON Lines, ein Datensatz je Anmeldename"""
+    stats = {FOUND: 0, MISSING: 0}
+
+    for result in results:
+        stats[result["status"]] += 1
+        fh.write(codec.dumps(result).decode("utf-8") + "\n")
+
+    return stats
+
+
+WRITERS = {"csv": write_csv,
+           "jsonl": write_jsonl}
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""Lokaler SQLite Spiegel
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from contextlib import AbstractContextManager
+from datetime import datetime, timezone
+from nl.export import codec
+from nl.export.config import LicenceModels
+from pathlib import Path
+from types import TracebackType
+import logging
+import os
+import sqlite3
+import uuid
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lmodels (
+    uid TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    getid TEXT NOT NULL,
+    type TEXT NOT NULL,
+    product_url TEXT,
+    product_getid TEXT,
+    modified TEXT,
+    item BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS licences (
+    uid TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    lmodel_uid TEXT NOT NULL,
+    licencee_url TEXT,
+    review_state TEXT,
+    modified TEXT,
+    item BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS licencees (
+    uid TEXT PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    review_state TEXT,
+    modified TEXT,
+    item BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS wf_states (
+    review_state TEXT PRIMARY KEY,
+    title TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sync (
+    name TEXT PRIMARY KEY,
+    value TEXT);
+CREATE INDEX IF NOT EXISTS lmodels_url ON lmodels (url);
+CREATE INDEX IF NOT EXISTS lmodels_getid ON lmodels (getid);
+CREATE INDEX IF NOT EXISTS lmodels_product_getid ON lmodels (product_getid);
+CREATE INDEX IF NOT EXISTS lmodels_modified ON lmodels (modified);
+CREATE INDEX IF NOT EXISTS licences_url ON licences (url);
+CREATE INDEX IF NOT EXISTS licences_lmodel_uid ON licences (lmodel_uid, review_state);
+CREATE INDEX IF NOT EXISTS licences_review_state ON licences (review_state);
+CREATE INDEX IF NOT EXISTS licences_modified ON licences (modified);
+CREATE INDEX IF NOT EXISTS licencees_review_state ON licencees (review_state);
+CREATE INDEX IF NOT EXISTS licencees_modified ON licencees (modified);
+"""
+
+# Geöffnete Spiegel der Pool Prozesse
+_MIRRORS = {}
+
+
+def url_id(url: str) -> str:
+    """Die ID (getId) aus der URL eines Objekts"""
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+class Mirror(AbstractContextManager):
+    """Spiegel von Lizenz-Modellen, Lizenzen, Lizenznehmern und Workflow Titeln"""
+
+    def __init__(self, path: Path, readonly: bool = False) -> None:
+        self.path = Path(path)
+
+        if readonly:
+            if not self.path.is_file():
+                raise FileNotFoundError(self.path)
+            self.db = sqlite3.connect(f"{self.path.absolute().as_uri()}?mode=ro", uri=True)
+        else:
+            self.db = sqlite3.connect(self.path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def get_value(self, name: str) -> str | None:
+        row = self.db.execute("SELECT value FROM sync WHERE name = ?", (name, )).fetchone()
+        return None if row is None else row[0]
+
+    def set_value(self, name: str, value: str) -> None:
+        self.db.execute("INSERT OR REPLACE INTO sync (name, value) VALUES (?, ?)", (name, value))
+
+    def put_lmodel(self, item: dict) -> None:
+        parent = item.get("parent") or {}
+        product_url = parent.get("@id")
+
+        self.db.execute("INSERT OR REPLACE INTO lmodels VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (item["UID"],
+                         item["@id"],
+                         url_id(item["@id"]),
+                         item["@type"],
+                         product_url,
+                         None if product_url is None else url_id(product_url),
+                         item.get("modified"),
+                         codec.dumps(item)))
+
+    def put_licence(self, item: dict, lmodel_uid: str) -> None:
+        licencee = item.get("licencee") or {}
+
+        self.db.execute("INSERT OR REPLACE INTO licences VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (item["UID"],
+                         item["@id"],
+                         lmodel_uid,
+                         licencee.get("@id"),
+                         item.get("review_state"),
+                         item.get("modified"),
+                         codec.dumps(item)))
+
+    def put_licencee(self, item: dict) -> None:
+        self.db.execute("DELETE FROM licencees WHERE url = ? AND uid != ?", (item["@id"], item["UID"]))
+        self.db.execute("INSERT OR REPLACE INTO licencees VALUES (?, ?, ?, ?, ?)",
+                        (item["UID"],
+                         item["@id"],
+                         item.get("review_state"),
+                         item.get("modified"),
+                         codec.dumps(item)))
+
+    def put_wf_state(self, review_state: str, title: str) -> None:
+        self.db.execute("INSERT OR REPLACE INTO wf_states VALUES (?, ?)", (review_state, title))
+
+    def wf_states(self) -> dict:
+        return dict(self.db.execute("SELECT review_state, title FROM wf_states"))
+
+    def licencee_types(self) -> list:
+        """Die `portal_type` der gespiegelten Lizenznehmer"""
+        query = """SELECT DISTINCT json_extract(CAST(item AS TEXT), '$."@type"') FROM licencees"""
+        return sorted(row[0] for row in self.db.execute(query) if row[0])
+
+    def licencee_urls(self) -> set:
+        return {row[0] for row in self.db.execute("SELECT url FROM licencees")}
+
+    def missing_licencee_urls(self) -> set:
+        """Lizenznehmer, auf die eine Lizenz verweist, die aber fehlen"""
+        query = """SELECT DISTINCT l.licencee_url FROM licences l
+                   LEFT JOIN licencees p ON p.url = l.licencee_url
+                   WHERE l.licencee_url IS NOT NULL AND p.uid IS NULL"""
+        return {row[0] for row in self.db.execute(query)}
+
+    def missing_wf_states(self) -> dict:
+        """Je fehlendem Workflow Status ein Objekt, über das der Titel geladen wird"""
+        query = """SELECT review_state, url FROM licencees
+                   WHERE review_state IS NOT NULL
+                   AND review_state NOT IN (SELECT review_state FROM wf_states)
+                   GROUP BY review_state"""
+        return dict(self.db.execute(query))
+
+    def get_licencemodel(self, lurl: str) -> dict | None:
+        """Lizenz-Modell über UUID, URL oder ID des Modells bzw. Produkts finden"""
+        try:
+            row = self.db.execute("SELECT item FROM lmodels WHERE uid = ?",
+                                  (uuid.UUID(lurl).hex, )).fetchone()
+        except ValueError:
+            getid = url_id(lurl)
+            row = self.db.execute("""SELECT item FROM lmodels WHERE url = ? OR getid = ?
+                                     ORDER BY url = ? DESC""",
+                                  (lurl, getid, lurl)).fetchone()
+
+            if row is None:
+                row = self.db.execute("""SELECT item FROM lmodels
+                                         WHERE (product_url = ? OR product_getid = ?) AND type = ?""",
+                                      (lurl.rstrip("/"), getid,
+                                       LicenceModels.NLLicenceModelStandard.name)).fetchone()
+
+        return None if row is None else codec.loads(row[0])
+
+    def licences_ids(self, lmodel_uid: str, review_state: list | None = None) -> list:
+        """Einträge mit den URLs von Lizenz und Lizenznehmer, wie bei der Suche"""
+        query = "SELECT url, licencee_url FROM licences WHERE lmodel_uid = ?"
+        params = [lmodel_uid]
+
+        if review_state:
+            query += f" AND review_state IN ({','.join('?' * len(review_state))})"
+            params += review_state
+
+        query += " ORDER BY url"
+
+        return [{"licencee": licencee_url, "licence": url}
+                for url, licencee_url in self.db.execute(query, params)]
+
+    def get_licence_data(self, lids: dict) -> tuple:
+        """Lizenz und Lizenznehmer als JSON Items"""
+        licence = self.db.execute("SELECT item FROM licences WHERE url = ?",
+                                  (lids["licence"], )).fetchone()
+        licencee = self.db.execute("SELECT item FROM licencees WHERE url = ?",
+                                   (lids["licencee"], )).fetchone()
+
+        return (None if licence is None else codec.loads(licence[0]),
+                None if licencee is None else codec.loads(licencee[0]))
+
+    def prune(self, lmodel_uids: set, licence_uids: set) -> None:
+        """Nicht mehr vorhandene Objekte nach einem vollständigen Abgleich entfernen"""
+        for table, uids in (("lmodels", lmodel_uids), ("licences", licence_uids)):
+            known = {row[0] for row in self.db.execute(f"SELECT uid FROM {table}")}
+            self.db.executemany(f"DELETE FROM {table} WHERE uid = ?",
+                                [(uid, ) for uid in known - uids])
+
+        self.db.execute("""DELETE FROM licencees WHERE url NOT IN
+                           (SELECT licencee_url FROM licences WHERE licencee_url IS NOT NULL)""")
+
+    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        if __exc_type is None:
+            self.db.commit()
+        self.close()
+        return super().__exit__(__exc_type, __exc_value, __traceback)
+
+
+def get_licencee_item(url: str) -> dict | None:
+    """Einen Lizenznehmer im Pool Prozess laden"""
+    from nl.export.plone import PloneItem
+
+    try:
+        return PloneItem(url).plone_item
+    except Exception:
+        logger = logging.getLogger(__name__)
+        logger.error(f"Lizenznehmer nicht geladen: {url}", exc_info=True)
+        return None
+
+
+def get_licence_data(lids: dict, path: Path) -> tuple:
+    """Lizenz und Lizenznehmer im Pool Prozess aus dem Spiegel lesen
+
+    Entspricht :func:`nl.export.utils.get_licence_data`, ohne Zugriff auf
+    das CMS. Die Workflow Titel werden aus dem Spiegel übernommen.
+    """
+    from nl.export import utils
+    from nl.export.plone import PloneItem, get_auth_session
+
+    key = (os.getpid(), str(path))
+
+    if key not in _MIRRORS:
+        mirror = Mirror(path, readonly=True)
+        utils.WF_STATES_CACHE.update(mirror.wf_states())
+        _MIRRORS[key] = (mirror, get_auth_session())
+
+    mirror, session = _MIRRORS[key]
+    licence, licencee = mirror.get_licence_data(lids)
+
+    return (PloneItem(None, plone_item=licence, session=session),
+            None if licencee is None else PloneItem(None, plone_item=licencee, session=session))
+
+
+def sync_time(value: str) -> str:
+    """Zeitpunkt eines Abgleichs als ISO 8601 mit Zeitzone
+
+    Ältere Spiegel speichern die Zeit in UTC ohne Zeitzone.
+    """
+    stamp = datetime.fromisoformat(value)
+
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+
+    return stamp.isoformat(timespec="seconds")
+
+
+def sync(path: Path, full: bool = False) -> dict:
+    """Den Spiegel mit dem CMS abgleichen
+
+    Ohne `full` werden nur Objekte geladen, die seit dem letzten Abgleich
+    geändert (`modified`) wurden. Mit `full` wird alles geladen und nicht
+    mehr vorhandene Objekte werden entfernt.
+
+    Args:
+        path (Path): Pfad der SQLite Datei
+        full (bool, optional): Vollständiger Abgleich
+
+    Returns:
+        dict: Anzahl der abgeglichenen Objekte je Art
+    """
+    from multiprocessing import Pool
+    from nl.export.plone import get_search_results
+    from nl.export.utils import get_wf_state
+    from tqdm import tqdm
+
+    logger = logging.getLogger(__name__)
+
+    stats = {"lmodels": 0, "licences": 0, "licencees": 0, "wf_states": 0}
+
+    with Mirror(path) as mirror:
+        since = None if full else mirror.get_value("modified")
+        since = None if since is None else sync_time(since)
+        started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        modified = {}
+        if since is not None:
+            modified = {"modified.query": since, "modified.range": "min"}
+
+        # Lizenz-Modelle, bei einem vollständigen Abgleich alle
+        lm_query = {"portal_type": [entry.name for entry in LicenceModels],
+                    "fullobjects": 1}
+
+        known_lmodels = {row[0] for row in mirror.db.execute("SELECT uid FROM lmodels")}
+        seen_lmodels = set()
+
+        for item in get_search_results(lm_query | modified):
+            mirror.put_lmodel(item)
+            seen_lmodels.add(item["UID"])
+            stats["lmodels"] += 1
+
+        # Lizenzen je Lizenz-Modell, bei neuen Lizenz-Modellen alle
+        seen_licences = set()
+
+        print("Lizenzen")
+        for lmodel_uid in tqdm(sorted(known_lmodels | seen_lmodels)):
+            query = {"lmuid": lmodel_uid,
+                     'object_provides': ["nl.behavior.behaviors.licence.ILicenceMarker"],
+                     "fullobjects": 1}
+
+            if lmodel_uid in known_lmodels:
+                query |= modified
+
+            for item in get_search_results(query):
+                mirror.put_licence(item, lmodel_uid)
+                seen_licences.add(item["UID"])
+                stats["licences"] += 1
+
+        if full:
+            mirror.prune(seen_lmodels, seen_licences)
+
+        # Lizenznehmer: fehlende sowie seit dem letzten Abgleich geänderte
+        urls = mirror.missing_licencee_urls()
+
+        if full:
+            urls |= mirror.licencee_urls()
+        elif since is not None and (types := mirror.licencee_types()):
+            # Nur geänderte Objekte der Typen der gespiegelten Lizenznehmer
+            known = mirror.licencee_urls()
+            query = {"portal_type": types, "b_size": 500} | modified
+            changed = {entry["@id"] for entry in get_search_results(query)}
+            urls |= known & changed
+
+        print("Lizenznehmer")
+        with Pool(processes=4) as pool:
+            for item in tqdm(pool.imap_unordered(get_licencee_item, sorted(urls)), total=len(urls)):
+                if item is not None:
+                    mirror.put_licencee(item)
+                    stats["licencees"] += 1
+
+        # Workflow Titel
+        if full:
+            mirror.db.execute("DELETE FROM wf_states")
+
+        for review_state, url in mirror.missing_wf_states().items():
+            try:
+                title = get_wf_state({"@id": url, "review_state": review_state})
+            except Exception:
+                logger.error(f"Kein Workflow Titel: {review_state}", exc_info=True)
+                continue
+
+            mirror.put_wf_state(review_state, title)
+            stats["wf_states"] += 1
+
+        mirror.set_value("modified", started)
+
+    return stats
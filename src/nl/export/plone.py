@@ -10,10 +10,13 @@
 """
 
 import logging
+import os
 import requests
 import typing
 import uuid
-from nl.export.config import NLACCESS_TOKEN, NLUSER_AGENT, NLBASE_URL
+from concurrent.futures import ThreadPoolExecutor
+from nl.export import config
+from nl.export.codec import response_json
 from nl.export.errors import NoConfig, NoMember, Unauthorized
 from urllib.parse import urlparse, urlunparse
 from pathlib import Path
@@ -21,26 +24,83 @@ from pathlib import Path
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
 
+# Anzahl gleichzeitiger Anfragen je Sitzung
+MAX_WORKERS = 8
 
-def get_auth_session() -> requests.Session:
-    """"""
+# Aufnahme bzw. Wiedergabe der Anfragen, siehe nl.export.cassette
+CASSETTE_ENV = "NL_EXPORT_CASSETTE"
+
+# Geänderte Objekte direkt in der Antwort eines PATCH
+PREFER_REPRESENTATION = {"Prefer": "return=representation"}
+
+# Anmeldenamen je Suche und die dabei geladenen Felder
+LOGONNAME_CHUNK = 50
+LOGONNAME_FIELDS = ("logonname", "UID", "title", "review_state", "modified")
+
+
+def get_auth_session(profile: config.Profile | None = None) -> requests.Session:
+    """Eine Sitzung für das aktive oder das angegebene Profil"""
+    token = config.NLACCESS_TOKEN if profile is None else profile.access_token
     headers = {'Accept': 'application/json',
                'Accept-Language': "de",
                'Content-Type': 'application/json',
-               "Authorization": f"Bearer {NLACCESS_TOKEN}",
-               'User-Agent': NLUSER_AGENT}
+               "Authorization": f"Bearer {token}",
+               'User-Agent': config.NLUSER_AGENT}
 
     session = requests.Session()
     session.headers.update(headers)
 
+    # Genug Verbindungen für gleichzeitige Anfragen über dieselbe Sitzung,
+    # mit Zeitlimits und Wiederholungen (nl.export.transport)
+    adapter = None
+
+    if os.environ.get(CASSETTE_ENV):
+        from nl.export.cassette import cassette_adapter
+        adapter = cassette_adapter(pool_maxsize=4 * MAX_WORKERS)
+
+    if adapter is None:
+        from nl.export.transport import ResilientAdapter
+        adapter = ResilientAdapter(pool_maxsize=4 * MAX_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
     return session
 
 
-def make_url(path: str) -> str:
-    """"""
+def fetch_concurrent(func: typing.Callable, args: typing.Iterable, max_workers: int = MAX_WORKERS) -> typing.Iterator:
+    """`func` gleichzeitig für alle `args` ausführen
+
+    Die Ergebnisse werden in der Reihenfolge von `args` geliefert.
+
+    Args:
+        func (typing.Callable): Funktion mit einem Argument, z.B. ein GET
+        args (typing.Iterable): Argumente
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+
+    Returns:
+        typing.Iterator: Die Ergebnisse
+    """
+    args = list(args)
+
+    if len(args) < 2:
+        return iter([func(arg) for arg in args])
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(args)))
+
+    def results():
+        try:
+            yield from executor.map(func, args)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return results()
+
+
+def make_url(path: str, profile: config.Profile | None = None) -> str:
+    """URL eines Pfads im CMS des aktiven oder des angegebenen Profils"""
     from urllib.parse import urlparse, urlunparse
 
-    uobj = list(urlparse(NLBASE_URL))
+    uobj = list(urlparse(config.NLBASE_URL if profile is None else profile.base_url))
     uobj[2] = path
 
     return urlunparse(uobj)
@@ -59,15 +119,109 @@ def get_items_found(query: dict) -> int:
 
     with session.get(search_url, params=params) as req:
         if req.status_code == 200:
-            res = req.json()
+            res = response_json(req)
             num_found = res.get("items_total", 0)
 
     return num_found
 
 
-def get_search_results(params: dict) -> typing.Iterator:
+def get_search_pages(params: dict, session: requests.Session = None, max_workers: int = MAX_WORKERS) -> typing.Iterator:
+    """Alle Seiten einer Suche gleichzeitig laden
+
+    Nach der ersten Seite ist `items_total` bekannt, die übrigen Seiten
+    werden dann über `b_start` gleichzeitig mit derselben Sitzung geladen.
+    Vorübergehende Fehler wiederholt bereits die Sitzung, danach bricht
+    eine fehlgeschlagene Seite die Suche ab, statt Einträge auszulassen.
+
+    Args:
+        params (dict): Die Suchanfrage
+        session (requests.Session, optional): Sitzung des Aufrufers
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+
+    Raises:
+        requests.HTTPError: Eine Seite ist fehlgeschlagen
+
+    Returns:
+        typing.Iterator: Die Einträge in der Reihenfolge der Suche
+    """
+    logger = logging.getLogger(__name__)
+
     search_url = make_url("/@search")
-    session = get_auth_session()
+    session = get_auth_session() if session is None else session
+
+    _params = params.copy()
+    _params.setdefault("b_size", 100)
+    _params.setdefault("b_start", 0)
+
+    def page(b_start: int) -> dict:
+        with session.get(search_url, params=_params | {"b_start": b_start}) as req:
+            if req.status_code in (401, 403):
+                raise Unauthorized
+            elif req.status_code != 200:
+                msg = f"Suche fehlgeschlagen: {req.status_code} {req.reason} (b_start={b_start})"
+                logger.error(msg)
+                raise requests.HTTPError(msg, response=req)
+
+            return response_json(req)
+
+    first = page(_params["b_start"])
+    total = first.get("items_total", 0)
+    starts = range(_params["b_start"] + _params["b_size"], total, _params["b_size"])
+
+    def entries():
+        yield from first.get("items", [])
+
+        for res in fetch_concurrent(page, starts, max_workers=max_workers):
+            yield from res.get("items", [])
+
+    return entries()
+
+
+def get_search_range(params: dict, start: int, size: int, session: requests.Session = None, max_workers: int = MAX_WORKERS) -> typing.Iterator:
+    """Die Einträge `start` bis `start + size` einer Suche laden
+
+    Die Seiten des Bereichs werden gleichzeitig geladen. Damit die Bereiche
+    verschiedener Aufrufe zusammenpassen, muss die Suche sortiert sein.
+
+    Args:
+        params (dict): Die Suchanfrage
+        start (int): Erster Eintrag
+        size (int): Anzahl der Einträge
+        session (requests.Session, optional): Sitzung des Aufrufers
+        max_workers (int, optional): Anzahl gleichzeitiger Anfragen
+
+    Returns:
+        typing.Iterator: Die Einträge in der Reihenfolge der Suche
+    """
+    logger = logging.getLogger(__name__)
+
+    search_url = make_url("/@search")
+    session = get_auth_session() if session is None else session
+
+    _params = params.copy()
+    page_size = _params.pop("b_size", 100)
+    end = start + size
+
+    def page(b_start: int) -> dict:
+        query = _params | {"b_start": b_start, "b_size": min(page_size, end - b_start)}
+
+        with session.get(search_url, params=query) as req:
+            if req.status_code in (401, 403):
+                raise Unauthorized
+            elif req.status_code != 200:
+                msg = "Suche fehlgeschlagen"
+                logger.error(msg)
+                raise requests.HTTPError(msg, response=req)
+
+            return response_json(req)
+
+    for res in fetch_concurrent(page, range(start, end, page_size), max_workers=max_workers):
+        yield from res.get("items", [])
+
+
+def get_search_results(params: dict, session: requests.Session = None) -> typing.Iterator:
+    search_url = make_url("/@search")
+    session = get_auth_session() if session is None else session
 
     _params = params.copy()
 
@@ -79,7 +233,7 @@ def get_search_results(params: dict) -> typing.Iterator:
             if req.status_code != 200:
                 yield None
 
-            res = req.json()
+            res = response_json(req)
 
         for entry in res["items"]:
             yield entry
@@ -111,7 +265,7 @@ class Registry:
 
         with self.session.get(regurl) as req:
             if req.status_code == 200:
-                value = req.json()
+                value = response_json(req)
             else:
                 msg = "Keine Konfiguration"
                 logger.error(msg)
@@ -142,6 +296,7 @@ class PloneItem:
         self.plone_uid = None
         self.__item_url__ = None
         self.plone_item = {}
+        self.prefetched = {}
         self.registry = Registry(self.session)
 
         if isinstance(plone_item, dict):
@@ -161,7 +316,7 @@ class PloneItem:
                 with self.session.get(self.item_url, params=params) as req:
                     if req.status_code in (401, 403):
                         raise Unauthorized
-                    self.plone_item = req.json()
+                    self.plone_item = response_json(req)
                     self.plone_uid = self.plone_item["UID"]
             except IndexError:
                 pass
@@ -185,30 +340,79 @@ class PloneItem:
                 logger.error(msg)
                 raise NoMember
 
-            res = req.json()
+            res = response_json(req)
             logger.debug(res)
 
             regurl = res["items"][0]['@id']
 
         with self.session.get(regurl) as req:
-            self.plone_item = req.json()
+            self.plone_item = response_json(req)
             self.__item_url__ = urlparse(self.plone_item['@id'])
 
+    def prefetch(self, *relations: str) -> typing.Any:
+        """Beziehungen gleichzeitig vorab laden
+
+        Die Methoden gleichen Namens liefern danach die geladenen Objekte,
+        ohne erneute Anfrage.
+
+        Args:
+            relations (str): Namen der Methoden, z.B. "licences", "files", "workflow"
+
+        Returns:
+            Das Objekt selbst
+        """
+        funcs = [getattr(self, name) for name in relations]
+
+        def load(func):
+            res = func()
+            return res if isinstance(res, dict) else list(res)
+
+        results = fetch_concurrent(load, funcs, max_workers=len(funcs) or 1)
+        self.prefetched.update(zip(relations, results))
+
+        return self
+
     def get_registry_record(self, entry):
         """"""
         return self.registry.get(entry)
 
-    def update(self, values: dict):
-        """"""
+    def update(self, values: dict, raise_errors: bool = False) -> bool:
+        """Werte ändern
+
+        Mit `Prefer: return=representation` liefert der Server das geänderte
+        Objekt direkt. Nur wenn er mit 204 antwortet, wird es nachgeladen.
+
+        Args:
+            values (dict): Die neuen Werte
+            raise_errors (bool, optional): Fehler des Servers als requests.HTTPError melden
+
+        Raises:
+            requests.HTTPError: Die Änderung ist fehlgeschlagen, nur mit `raise_errors`
+
+        Returns:
+            bool: Ob die Änderung gelungen ist
+        """
         logger = logging.getLogger(__name__)
 
-        with self.session.patch(self.item_url, json=values) as req:
-            if req.status_code != 204:
+        with self.session.patch(self.item_url, json=values, headers=PREFER_REPRESENTATION) as req:
+            if req.status_code in (401, 403):
+                raise Unauthorized
+            elif req.status_code == 200:
+                self.plone_item = response_json(req)
+                return True
+            elif req.status_code != 204:
                 msg = "Konnte Member nicht ändern"
+
+                if raise_errors:
+                    raise requests.HTTPError(f"{msg}: {req.status_code} {req.reason}", response=req)
+
                 logger.error(msg)
+                return False
 
         with self.session.get(self.item_url) as req:
-            self.plone_item = req.json()
+            self.plone_item = response_json(req)
+
+        return True
 
 
 class Member(PloneItem):
@@ -233,7 +437,7 @@ class Member(PloneItem):
                 logger.error(msg)
                 raise NoMember
 
-            res = req.json()
+            res = response_json(req)
             logger.debug(res)
 
         try:
@@ -243,9 +447,60 @@ class Member(PloneItem):
             logger.error(msg)
             raise NoMember
 
+    @classmethod
+    def byLogonNames(cls, logonnames: typing.Iterable, fields: typing.Iterable = LOGONNAME_FIELDS,
+                     chunk_size: int = LOGONNAME_CHUNK, session: requests.Session = None,
+                     max_workers: int = MAX_WORKERS) -> list:
+        """Viele Nutzer anhand ihrer Kennungen finden
+
+        Je `chunk_size` Kennungen gibt es eine Suche mit mehreren Werten für
+        `logonname`, die Suchen laufen gleichzeitig. Statt ganzer Objekte
+        werden nur `fields` geladen. Jede Suche wird über alle Seiten
+        gelesen.
+
+        Args:
+            logonnames (typing.Iterable): Die Kennungen
+            fields (typing.Iterable, optional): Felder der Ergebnisse, `logonname` und `UID` immer
+            chunk_size (int, optional): Kennungen je Suche
+            session (requests.Session, optional): Sitzung des Aufrufers
+            max_workers (int, optional): Anzahl gleichzeitiger Suchen
+
+        Raises:
+            requests.HTTPError: Eine Suche ist fehlgeschlagen
+
+        Returns:
+            list: Tupel (Kennung, Nutzer oder None) in der Reihenfolge der Eingabe
+        """
+        logonnames = list(logonnames)
+        session = get_auth_session() if session is None else session
+        fields = list(dict.fromkeys(("logonname", "UID") + tuple(fields)))
+
+        unique = list(dict.fromkeys(logonnames))
+        chunks = [unique[idx:idx + chunk_size] for idx in range(0, len(unique), chunk_size)]
+
+        def search(chunk: list) -> list:
+            # Andere Objekte mit `logonname` können mehr Treffer als
+            # Kennungen ergeben, daher alle Seiten bis `items_total`
+            query = {"logonname": chunk, "metadata_fields": fields, "b_size": len(chunk)}
+            return list(get_search_pages(query, session=session, max_workers=1))
+
+        found = {}
+
+        for items in fetch_concurrent(search, chunks, max_workers=max_workers):
+            for item in items:
+                found.setdefault(item.get("logonname"), item)
+
+        return [(name, cls(None, plone_item=found[name], session=session) if name in found else None)
+                for name in logonnames]
+
     def licences(self, licence_type=None, review_state=None):
-        """"""
-        logger = logging.getLogger(__name__)
+        """Lizenzen des Nutzers, alle Seiten der Suche
+
+        Raises:
+            requests.HTTPError: Eine Seite der Suche ist fehlgeschlagen
+        """
+        if licence_type is None and review_state is None and "licences" in self.prefetched:
+            return iter(self.prefetched["licences"])
 
         query = {'nlLicenseOwner': self.plone_uid,
                  'object_provides': ["nl.behavior.behaviors.licence.ILicenceMarker"],
@@ -257,26 +512,22 @@ class Member(PloneItem):
         if isinstance(licence_type, str):
             query["licence_type"] = licence_type
 
-        with self.session.get(self.search_url, params=query) as req:
-            if req.status_code != 200:
-                msg = "Keine Lizenzen gefunden"
-                logger.error(msg)
-                return []
-
-            res = req.json()
-
-        return (Licence(None, plone_item=entry) for entry in res["items"])
+        return (Licence(None, plone_item=entry, session=self.session)
+                for entry in get_search_pages(query, session=self.session))
 
     def workflow(self):
         logger = logging.getLogger(__name__)
 
+        if "workflow" in self.prefetched:
+            return self.prefetched["workflow"]
+
         with self.session.get(self.plone_item["@components"]["workflow"]["@id"]) as req:
             if req.status_code != 200:
                 msg = "Kein Workflow gefunden"
                 logger.error(msg)
                 return []
 
-            res = req.json()
+            res = response_json(req)
 
         return res
 
@@ -293,19 +544,24 @@ class Institution(Member):
         uobj[2] = (self.ipath / "files").as_posix()
         self.filespath = urlunparse(uobj)
 
-        formname = Path(self.get_registry_record(
-            "nl.site.registration_form_name"))
-        eulaname = Path(self.get_registry_record(
-            "nl.site.registration_eula_name"))
+        formname = self.get_registry_record(
+            "nl.site.registration_form_name")
+        eulaname = self.get_registry_record(
+            "nl.site.registration_eula_name")
 
-        self.formpath = self.filespath / formname
-        self.eulapath = self.filespath / eulaname
+        # Als URL zusammensetzen, Path würde das // des Schemas zusammenfassen
+        self.formpath = f"{self.filespath}/{formname}"
+        self.eulapath = f"{self.filespath}/{eulaname}"
 
     def files(self):
-        """"""
+        """Die Dateien der Institution, gleichzeitig geladen"""
+        if "files" in self.prefetched:
+            return iter(self.prefetched["files"])
+
         fcontainer = PloneItem(self.filespath, session=self.session)
 
-        return (PloneItem(item["@id"]) for item in fcontainer.plone_item["items"])
+        return fetch_concurrent(lambda url: PloneItem(url, session=self.session),
+                                [item["@id"] for item in fcontainer.plone_item["items"]])
 
 
 class Product(PloneItem):
@@ -375,8 +631,12 @@ class Registration(PloneItem):
     """"""
 
     def lmodels(self):
-        """"""
-        return (LicenceModel(entry["@id"]) for entry in self.plone_item["licence_models"])
+        """Die Lizenz-Modelle der Registrierung, gleichzeitig geladen"""
+        if "lmodels" in self.prefetched:
+            return iter(self.prefetched["lmodels"])
+
+        return fetch_concurrent(lambda url: LicenceModel(url, session=self.session),
+                                [entry["@id"] for entry in self.plone_item["licence_models"]])
 
 
 class Vocabulary:
@@ -397,7 +657,7 @@ class Vocabulary:
         self.plone_vocab = {}
 
         with self.session.get(self.vocab_url) as req:
-            self.plone_vocab = req.json()
+            self.plone_vocab = response_json(req)
             self.item_url = self.plone_vocab["@id"]
 
     def getTitle(self, token):
@@ -425,27 +685,23 @@ class Group:
         self.plone_group = {}
 
         with self.session.get(self.group_url) as req:
-            self.plone_group = req.json()
+            self.plone_group = response_json(req)
             self.item_url = self.plone_group["@id"]
 
     def members(self):
-        """Alle Mitglieder einer Gruppe"""
-        mlist = []
+        """Alle Mitglieder einer Gruppe, gleichzeitig über die Sitzung der Gruppe geladen"""
+        return list(fetch_concurrent(lambda uid: getMember(uid, session=self.session),
+                                     self.plone_group["members"]["items"]))
 
-        for uid in self.plone_group["members"]["items"]:
-            mlist.append(getMember(uid))
 
-        return mlist
-
-
-def getMember(uid):
+def getMember(uid, session=None):
     """Einen Plone Member auslesen"""
-    session = get_auth_session()
+    session = get_auth_session() if session is None else session
 
     member = {}
 
     purl = make_url(f"/@users/{uid}")
     with session.get(purl) as req:
-        member = req.json()
+        member = response_json(req)
 
     return member
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Laufzeitprofile je Phase des Exports
+
+Die Phasen (Suche, Auflösen, Kodieren, Schreiben) werden mit
+:func:`phase` markiert, im Hauptprozess wie in den Pool Prozessen. Ist
+das Profil mit :func:`activate` eingeschaltet, schreibt jeder Prozess am
+Ende je Phase:
+
+    <phase>.<pid>.pstats   cProfile Statistik (nur Modus voll)
+    <phase>.<pid>.folded   Stapel je Zeile mit Anzahl der Stichproben, für Flame Graphs
+    zeiten.<pid>.json      Aufrufe und Sekunden je Phase
+
+:func:`finish` fasst im Hauptprozess alle Dateien zu `<phase>.pstats`,
+`<phase>.folded` und `zeiten.json` zusammen.
+
+Im Modus `stichprobe` läuft nur ein Thread, der alle SAMPLE_INTERVAL
+Sekunden den Stapel des Threads in der aktiven Phase liest. Der Aufwand
+ist klein genug für den Dauerbetrieb.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import collections
+import os
+import sys
+import threading
+import time
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Umgebungsvariablen, damit auch die Pool Prozesse das Profil schreiben
+PROFILE_ENV = "NL_EXPORT_PROFILE"
+MODE_ENV = "NL_EXPORT_PROFILE_MODE"
+
+FULL = "voll"
+SAMPLING = "stichprobe"
+MODES = (FULL, SAMPLING)
+
+SEARCH = "suche"
+RESOLVE = "aufloesen"
+FORMAT = "format"
+WRITE = "schreiben"
+
+SAMPLE_INTERVAL = 0.01
+
+# Zustand dieses Prozesses, nach fork neu angelegt
+_STATE = None
+
+
+def activate(directory: Path, mode: str = FULL) -> None:
+    """Profile für diesen und alle Kindprozesse einschalten"""
+    if mode not in MODES:
+        raise ValueError(f"Unbekannter Modus: {mode}")
+
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Dateien früherer Läufe würden sonst mit zusammengefasst
+    for path in directory.iterdir():
+        if process_file(path) is not None:
+            path.unlink()
+
+    os.environ[PROFILE_ENV] = str(directory.absolute())
+    os.environ[MODE_ENV] = mode
+
+
+def active() -> bool:
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+def process_file(path: Path) -> tuple | None:
+    """(Phase, Endung) einer Datei eines einzelnen Prozesses, sonst None"""
+    parts = path.name.split(".")
+
+    if len(parts) == 3 and parts[1].isdigit() and parts[2] in ("pstats", "folded", "json"):
+        return (parts[0], parts[2])
+
+    return None
+
+
+class ProcessProfile:
+    """Profile, Stichproben und Zeiten der Phasen eines Prozesses"""
+
+    def __init__(self, directory: Path, mode: str) -> None:
+        from multiprocessing.util import Finalize
+
+        self.directory = directory
+        self.mode = mode
+        self.pid = os.getpid()
+        self.profilers = {}
+        self.samples = collections.defaultdict(collections.Counter)
+        self.times = collections.defaultdict(lambda: {"aufrufe": 0, "sekunden": 0.0})
+        # Verschachtelte Phasen: die innerste zählt
+        self.stack = []
+        self.thread = None
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, name="nl-export-profil", daemon=True)
+        self.sampler.start()
+
+        # Pool Prozesse schreiben beim regulären Ende (Pool.close/join)
+        Finalize(self, self.dump, exitpriority=10)
+
+    def enter(self, name: str) -> None:
+        if self.mode == FULL:
+            if self.stack:
+                self.profilers[self.stack[-1][0]].disable()
+            if name not in self.profilers:
+                import cProfile
+                self.profilers[name] = cProfile.Profile()
+            self.profilers[name].enable()
+
+        self.thread = threading.get_ident()
+        self.stack.append((name, time.perf_counter()))
+
+    def leave(self) -> None:
+        name, start = self.stack.pop()
+        self.times[name]["aufrufe"] += 1
+        self.times[name]["sekunden"] += time.perf_counter() - start
+
+        if self.mode == FULL:
+            self.profilers[name].disable()
+            if self.stack:
+                self.profilers[self.stack[-1][0]].enable()
+
+    def sample(self) -> None:
+        """Im eigenen Thread den Stapel der aktiven Phase lesen"""
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            try:
+                name = self.stack[-1][0]
+            except IndexError:
+                continue
+
+            frame = sys._current_frames().get(self.thread)
+            names = []
+
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+
+            self.samples[name][";".join(reversed(names))] += 1
+
+    def dump(self) -> None:
+        """Die Dateien dieses Prozesses schreiben"""
+        from nl.export import codec
+
+        if self.stopped.is_set():
+            return
+
+        self.stopped.set()
+        self.sampler.join(timeout=1)
+
+        for name, profiler in self.profilers.items():
+            profiler.dump_stats(self.directory / f"{name}.{self.pid}.pstats")
+
+        for name, counts in list(self.samples.items()):
+            write_folded(self.directory / f"{name}.{self.pid}.folded", counts)
+
+        if self.times:
+            (self.directory / f"zeiten.{self.pid}.json").write_bytes(codec.dumps(dict(self.times)))
+
+
+def process_profile() -> ProcessProfile | None:
+    global _STATE
+
+    if not active():
+        return None
+
+    if _STATE is None or _STATE.pid != os.getpid():
+        _STATE = ProcessProfile(Path(os.environ[PROFILE_ENV]), os.environ.get(MODE_ENV) or FULL)
+
+    return _STATE
+
+
+@contextmanager
+def _phase(profile: ProcessProfile, name: str) -> typing.Iterator:
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.leave()
+
+
+def phase(name: str) -> typing.ContextManager:
+    """Einen Abschnitt einer Phase zuordnen, ohne Profil ohne Wirkung
+
+    Beispiel:
+
+        with phase(RESOLVE):
+            loaded = [loader(lids) for lids in licences_ids]
+    """
+    profile = process_profile()
+
+    return nullcontext() if profile is None else _phase(profile, name)
+
+
+def write_folded(path: Path, counts: typing.Mapping) -> None:
+    with path.open("wt", encoding="utf-8") as fh:
+        for stack, num in sorted(counts.items()):
+            fh.write(f"{stack} {num}\n")
+
+
+def merge(directory: Path) -> dict:
+    """Die Dateien aller Prozesse je Phase zusammenfassen
+
+    Returns:
+        dict: Aufrufe und Sekunden je Phase, über alle Prozesse
+    """
+    from nl.export import codec
+    import pstats
+
+    files = collections.defaultdict(lambda: collections.defaultdict(list))
+
+    for path in directory.iterdir():
+        if (entry := process_file(path)) is not None:
+            files[entry[1]][entry[0]].append(path)
+
+    for name, paths in files["pstats"].items():
+        pstats.Stats(*map(str, sorted(paths))).dump_stats(directory / f"{name}.pstats")
+
+    for name, paths in files["folded"].items():
+        counts = collections.Counter()
+
+        for path in paths:
+            with path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    stack, _, num = line.rstrip("\n").rpartition(" ")
+                    counts[stack] += int(num)
+
+        write_folded(directory / f"{name}.folded", counts)
+
+    times = {}
+
+    for path in files["json"].get("zeiten", []):
+        for name, entry in codec.loads(path.read_bytes()).items():
+            total = times.setdefault(name, {"aufrufe": 0, "sekunden": 0.0})
+            total["aufrufe"] += entry["aufrufe"]
+            total["sekunden"] += entry["sekunden"]
+
+    (directory / "zeiten.json").write_bytes(codec.dumps(times))
+
+    return times
+
+
+def finish() -> dict | None:
+    """Im Hauptprozess nach dem Ende der Pool Prozesse aufrufen
+
+    Returns:
+        dict | None: Aufrufe und Sekunden je Phase, None ohne Profil
+    """
+    global _STATE
+
+    if not active():
+        return None
+
+    if _STATE is not None and _STATE.pid == os.getpid():
+        _STATE.dump()
+        _STATE = None
+
+    return merge(Path(os.environ[PROFILE_ENV]))
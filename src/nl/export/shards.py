@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""Aufgeteilte Ausgabe
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+from pathlib import Path
+import hashlib
+import typing
+import zlib
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Pool Prozesse zum Laden und Kodieren, unabhängig von der Anzahl der Teile
+POOL_PROCESSES = 4
+
+
+def shard_key(lids: dict) -> bytes:
+    """Schlüssel für die Aufteilung nach Hash
+
+    Die Suchergebnisse enthalten die UID des Lizenznehmers nicht, daher
+    wird die ebenso stabile URL des Lizenznehmers genutzt.
+    """
+    return lids["licencee"].encode("utf-8")
+
+
+def partition_by_hash(licences_ids: list, shards: int) -> list:
+    """Lizenzen stabil nach Lizenznehmer auf `shards` Teile verteilen
+
+    Args:
+        licences_ids (list): Einträge mit den URLs von Lizenz und Lizenznehmer
+        shards (int): Anzahl der Teile
+
+    Returns:
+        list: Eine Liste je Teil
+    """
+    parts = [[] for _ in range(shards)]
+
+    for lids in licences_ids:
+        parts[zlib.crc32(shard_key(lids)) % shards].append(lids)
+
+    return parts
+
+
+def partition_by_size(licences_ids: list, size: int) -> list:
+    """Lizenzen in Teile mit höchstens `size` Zeilen aufteilen
+
+    Die Suche ist nicht sortiert, daher wird vorher nach den URLs von
+    Lizenznehmer und Lizenz sortiert. So landet ein Lizenznehmer bei
+    gleichen Daten immer im selben Teil.
+    """
+    ordered = sorted(licences_ids, key=lambda lids: (lids["licencee"], lids["licence"]))
+
+    return [ordered[idx:idx + size]
+            for idx in range(0, len(ordered), size)]
+
+
+def file_sha256(fpath: Path) -> str:
+    """SHA-256 Prüfsumme einer Datei"""
+    digest = hashlib.sha256()
+
+    with fpath.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def write_shards(lmodel: typing.Any, options: Namespace, licences_ids: list) -> Path:
+    """Die Lizenznehmer eines Lizenz-Modells aufgeteilt exportieren
+
+    Wie beim Export ohne Aufteilung laden und kodieren POOL_PROCESSES
+    Prozesse die Lizenzen in Blöcken zu ROWS_PER_TASK, unabhängig von der
+    Anzahl der Teile. Die Blöcke kommen Teil für Teil in Reihenfolge zurück,
+    der Hauptprozess schreibt die Teile nacheinander. Ein Manifest listet
+    die Teile mit Zeilenzahl und Prüfsumme.
+
+    Args:
+        lmodel (LicenceModel): Das Lizenz-Modell
+        options (Namespace): Optionen des Exports (`shards` oder `shard_size`)
+        licences_ids (list): Einträge mit den URLs von Lizenz und Lizenznehmer
+
+    Returns:
+        Path: Pfad des Manifests
+    """
+    from contextlib import nullcontext
+    from multiprocessing import Pool
+    from nl.export import codec
+    from nl.export.formatter import get_formatter, output_name
+    from nl.export.profiling import WRITE, phase
+    from nl.export.sorting import ExternalSorter, sorting
+    from nl.export.utils import ROWS_PER_TASK, get_licence_variants
+    from tqdm import tqdm
+
+    if options.shards is not None:
+        mode = "hash"
+        parts = partition_by_hash(licences_ids, options.shards)
+    else:
+        mode = "zeilen"
+        parts = partition_by_size(licences_ids, options.shard_size)
+
+    variants = ((options.format, options.version),)
+    blocks = [[lids[idx:idx + ROWS_PER_TASK] for idx in range(0, len(lids), ROWS_PER_TASK)]
+              for lids in parts]
+    tasks = [(variants, options.from_mirror, block, options.sort_by, False)
+             for part_blocks in blocks for block in part_blocks]
+    entries = []
+
+    with Pool(processes=POOL_PROCESSES) as pool, tqdm(total=len(licences_ids)) as progress:
+        results = pool.imap(get_licence_variants, tasks)
+
+        for part, part_blocks in enumerate(blocks, start=1):
+            with get_formatter(options.format)(lmodel, options, part=part) as formatter, \
+                    (ExternalSorter() if sorting(options.sort_by) else nullcontext()) as sorter:
+                for _ in part_blocks:
+                    keys, result, _ = next(results)
+                    with phase(WRITE):
+                        if sorter is None:
+                            formatter.write(result[0])
+                        else:
+                            sorter.extend(zip(keys, result[0]))
+                    progress.update(len(result[0]))
+
+                if sorter is not None:
+                    with phase(WRITE):
+                        for rows in sorter.batches():
+                            formatter.write(rows)
+
+            entries.append({"datei": formatter.path.name,
+                            "zeilen": len(parts[part - 1]),
+                            "sha256": file_sha256(formatter.path)})
+
+        # Regulär beenden, damit die Pool Prozesse ihr Profil schreiben
+        pool.close()
+        pool.join()
+
+    manifest = {"produkt": lmodel.productTitle(),
+                "format": options.format,
+                "version": options.version,
+                "aufteilung": mode,
+                "zeilen": sum(entry["zeilen"] for entry in entries),
+                "dateien": entries}
+
+    mpath = options.ablage.absolute() / f"{output_name(lmodel, options)}.{options.format}.manifest.json"
+
+    with mpath.open("wb") as mfh:
+        codec.dump(manifest, mfh)
+
+    return mpath
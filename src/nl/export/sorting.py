@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Feste Reihenfolge der Zeilen über eine externe Sortierung
+
+Die kodierten Zeilen kommen in der Reihenfolge der Suche bzw. der Pool
+Ergebnisse. Damit gleiche Daten eine byteweise gleiche Ausgabe ergeben,
+werden sie nach einem Schlüssel des Lizenznehmers sortiert. Es werden nur
+`run_size` Zeilen im Speicher gehalten, jeder volle Lauf wird sortiert in
+eine temporäre Datei geschrieben und am Ende werden alle Läufe gemischt.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from contextlib import AbstractContextManager
+from types import TracebackType
+import heapq
+import itertools
+import pickle
+import tempfile
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Felder des Lizenznehmers, nach denen sortiert werden kann
+SORT_FIELDS = ("UID", "title", "sigel")
+DEFAULT_SORT = "UID"
+NO_SORT = "keine"
+
+# Zeilen je Lauf im Speicher und je Block in den temporären Dateien
+RUN_SIZE = 50000
+BLOCK_SIZE = 1000
+
+
+def sort_key(sort_by: str, lids: dict, licencee: typing.Any) -> tuple:
+    """Schlüssel einer Zeile
+
+    Bei gleichem Feld entscheiden UID des Lizenznehmers und URL der Lizenz,
+    so ist die Reihenfolge immer eindeutig.
+
+    Args:
+        sort_by (str): Feld aus SORT_FIELDS
+        lids (dict): URLs von Lizenz und Lizenznehmer
+        licencee (PloneItem | None): Der Lizenznehmer
+
+    Returns:
+        tuple: Der Schlüssel
+    """
+    item = {} if licencee is None else licencee.plone_item
+
+    return (str(item.get(sort_by) or ""), str(item.get("UID") or ""), lids["licence"])
+
+
+def sorting(sort_by: str | None) -> bool:
+    return sort_by is not None and sort_by != NO_SORT
+
+
+class ExternalSorter(AbstractContextManager):
+    """Einträge (Schlüssel, Wert) mit begrenztem Speicher sortieren
+
+    Beispiel:
+
+        with ExternalSorter() as sorter:
+            for key, row in rows:
+                sorter.add(key, row)
+
+            for row in sorter:
+                fh.write(row)
+    """
+
+    def __init__(self, run_size: int = RUN_SIZE, directory: typing.Any = None) -> None:
+        """
+        Args:
+            run_size (int, optional): Einträge je Lauf im Speicher
+            directory (optional): Verzeichnis der temporären Dateien, Standard ist TMPDIR
+        """
+        self.run_size = run_size
+        self.directory = directory
+        self.buffer = []
+        self.runs = []
+        self.count = 0
+
+    def add(self, key: typing.Any, value: typing.Any) -> None:
+        # Die laufende Nummer hält gleiche Schlüssel stabil und verhindert
+        # den Vergleich der Werte
+        self.buffer.append((key, self.count, value))
+        self.count += 1
+
+        if len(self.buffer) >= self.run_size:
+            self.spill()
+
+    def extend(self, entries: typing.Iterable) -> None:
+        for key, value in entries:
+            self.add(key, value)
+
+    def spill(self) -> None:
+        """Den Puffer sortiert in eine temporäre Datei schreiben"""
+        if not self.buffer:
+            return
+
+        self.buffer.sort(key=lambda entry: entry[:2])
+        fh = tempfile.TemporaryFile(prefix="nl-export-sort-", dir=self.directory)
+
+        for idx in range(0, len(self.buffer), BLOCK_SIZE):
+            pickle.dump(self.buffer[idx:idx + BLOCK_SIZE], fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.runs.append(fh)
+        self.buffer = []
+
+    @staticmethod
+    def read_run(fh: typing.Any) -> typing.Iterator:
+        fh.seek(0)
+
+        while True:
+            try:
+                block = pickle.load(fh)
+            except EOFError:
+                return
+            yield from block
+
+    def __iter__(self) -> typing.Iterator:
+        """Die Werte in der Reihenfolge der Schlüssel"""
+        self.buffer.sort(key=lambda entry: entry[:2])
+
+        if not self.runs:
+            return (value for _, _, value in self.buffer)
+
+        merged = heapq.merge(*[self.read_run(fh) for fh in self.runs],
+                             iter(self.buffer),
+                             key=lambda entry: entry[:2])
+
+        return (value for _, _, value in merged)
+
+    def batches(self, size: int = BLOCK_SIZE) -> typing.Iterator:
+        """Die sortierten Werte in Listen zu höchstens `size` Einträgen"""
+        values = iter(self)
+
+        while batch := list(itertools.islice(values, size)):
+            yield batch
+
+    def close(self) -> None:
+        for fh in self.runs:
+            fh.close()
+
+        self.runs = []
+        self.buffer = []
+
+    def __exit__(self, __exc_type: type[BaseException] | None, __exc_value: BaseException | None, __traceback: TracebackType | None) -> bool | None:
+        self.close()
+        return super().__exit__(__exc_type, __exc_value, __traceback)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Anzahl der Lizenzen je Kombination von Facetten
+
+Jede Zelle des Rasters (z.B. Lizenz-Modell × review_state × licence_type)
+ist eine Suche mit `b_size=1`, von der nur `items_total` gebraucht wird.
+Die Suchen laufen gleichzeitig über eine gemeinsame Sitzung.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from nl.export import codec
+import csv
+import itertools
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+LICENCE_QUERY = {"object_provides": ["nl.behavior.behaviors.licence.ILicenceMarker"]}
+
+# Spalten für das Lizenz-Modell und die Anzahl. Ein Produkt kann mehrere
+# Lizenz-Modelle haben (z.B. Standard und Opt-In), daher Typ und UID
+LMODEL_COLUMN = "lizenzmodell"
+TYPE_COLUMN = "modelltyp"
+UID_COLUMN = "lmuid"
+COUNT_COLUMN = "anzahl"
+
+
+def parse_facet(value: str) -> tuple:
+    """`index=wert1,wert2` als Tupel (Index, Werte)
+
+    Raises:
+        ValueError: Keine Werte angegeben
+    """
+    index, _, values = value.partition("=")
+    values = [entry.strip() for entry in values.split(",") if entry.strip()]
+
+    if not index.strip() or not values:
+        raise ValueError(f"Ungültige Facette: {value}")
+
+    return (index.strip(), values)
+
+
+def expand_grid(facets: dict) -> list:
+    """Alle Kombinationen der Werte der Facetten
+
+    Args:
+        facets (dict): Je Index die Werte
+
+    Returns:
+        list: Je Kombination ein dict aus Index und Wert
+    """
+    indexes = list(facets)
+
+    return [dict(zip(indexes, values)) for values in itertools.product(*(facets[index] for index in indexes))]
+
+
+def count_items(session: typing.Any, query: dict) -> int:
+    """Anzahl der Treffer einer Suche, ohne die Einträge zu laden
+
+    Raises:
+        requests.HTTPError: Die Suche ist fehlgeschlagen
+    """
+    from nl.export.codec import response_json
+    from nl.export.errors import Unauthorized
+    from nl.export.plone import make_url
+    import requests
+
+    with session.get(make_url("/@search"), params=query | {"b_size": 1}) as req:
+        if req.status_code in (401, 403):
+            raise Unauthorized
+        elif req.status_code != 200:
+            raise requests.HTTPError(f"Suche fehlgeschlagen: {req.status_code} {req.reason}", response=req)
+
+        return response_json(req).get("items_total", 0)
+
+
+def licence_counts(lmodels: list, facets: dict, max_workers: int | None = None, session: typing.Any = None) -> list:
+    """Die Anzahl der Lizenzen für jede Zelle des Rasters
+
+    Args:
+        lmodels (list): Lizenz-Modelle, leer für alle Lizenzen
+        facets (dict): Je Index der Suche die Werte, z.B. {"review_state": ["active", "pending"]}
+        max_workers (int, optional): Anzahl gleichzeitiger Suchen
+        session (requests.Session, optional): Sitzung des Aufrufers
+
+    Raises:
+        requests.HTTPError: Eine Suche ist fehlgeschlagen
+
+    Returns:
+        list: Je Zelle ein dict mit Produkt, Typ und UID des Lizenz-Modells,
+            den Werten der Facetten und der Anzahl
+    """
+    from nl.export.plone import MAX_WORKERS, fetch_concurrent, get_auth_session
+
+    session = get_auth_session() if session is None else session
+
+    models = [({LMODEL_COLUMN: lmodel.productTitle(),
+                TYPE_COLUMN: lmodel.plone_item.get("@type", ""),
+                UID_COLUMN: lmodel.plone_uid}, {"lmuid": lmodel.plone_uid}) for lmodel in lmodels] or [({}, {})]
+    cells = [(label, query, values) for label, query in models for values in expand_grid(facets)]
+
+    def count(cell: tuple) -> int:
+        _, query, values = cell
+        return count_items(session, LICENCE_QUERY | query | values)
+
+    return [label | values | {COUNT_COLUMN: num}
+            for (label, _, values), num in zip(cells, fetch_concurrent(count, cells, max_workers=max_workers or MAX_WORKERS))]
+
+
+def write_table(rows: list, fh: typing.TextIO) -> None:
+    """Als Tabelle mit ausgerichteten Spalten"""
+    if not rows:
+        return
+
+    columns = list(rows[0])
+    widths = [max(len(str(column)), *(len(str(row[column])) for row in rows)) for column in columns]
+
+    def line(values):
+        return "  ".join(str(value).rjust(width) if column == COUNT_COLUMN else str(value).ljust(width)
+                         for column, value, width in zip(columns, values, widths)).rstrip()
+
+    print(line(columns), file=fh)
+    print("  ".join("-" * width for width in widths), file=fh)
+
+    for row in rows:
+        print(line(row.values()), file=fh)
+
+    if len(rows) < 2:
+        return
+
+    total = sum(row[COUNT_COLUMN] for row in rows)
+    print(line([total if column == COUNT_COLUMN else ("Summe" if column == columns[0] else "") for column in columns]), file=fh)
+
+
+def write_csv(rows: list, fh: typing.TextIO) -> None:
+    writer = csv.writer(fh,
+                        delimiter=';',
+                        quotechar='"',
+                        quoting=csv.QUOTE_ALL)
+
+    if rows:
+        writer.writerow(rows[0].keys())
+
+    for row in rows:
+        writer.writerow(row.values())
+
+
+def write_json(rows: list, fh: typing.TextIO) -> None:
+    fh.write(codec.dumps(rows).decode("utf-8") + "\n")
+
+
+WRITERS = {"tabelle": write_table,
+           "csv": write_csv,
+           "json": write_json}
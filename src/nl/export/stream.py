@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Exporte als Datenstrom
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+from pathlib import Path
+import sys
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Ziel für die Standardausgabe
+STDOUT = "-"
+
+
+def open_sink(target: typing.Any) -> tuple:
+    """Ziel einer Ausgabe öffnen
+
+    Args:
+        target: "-" für die Standardausgabe, ein Pfad (auch eine benannte
+            Pipe) oder ein Dateiobjekt, in das Bytes geschrieben werden können
+
+    Returns:
+        tuple: Dateiobjekt, Pfad (oder None) und ob das Dateiobjekt beim
+            Beenden geschlossen wird
+    """
+    from nl.export.formatter.base import BUFFER_SIZE
+
+    if hasattr(target, "write"):
+        # Textströme wie sys.stdout über ihren Puffer beschreiben
+        return (getattr(target, "buffer", target), None, False)
+
+    if str(target) == STDOUT:
+        return (sys.stdout.buffer, None, False)
+
+    path = Path(target)
+
+    return (path.open("wb", buffering=BUFFER_SIZE), path, True)
+
+
+def get_licences_ids(lmodel: typing.Any, status: list | None = None, mirror: typing.Any = None) -> list:
+    """URLs der Lizenzen und Lizenznehmer eines Lizenz-Modells
+
+    Args:
+        lmodel (LicenceModel): Das Lizenz-Modell
+        status (list | None, optional): Status der Lizenzen
+        mirror (Mirror, optional): Aus dem lokalen Spiegel statt aus dem CMS
+
+    Returns:
+        list: Einträge mit den URLs von Lizenz und Lizenznehmer
+    """
+    from nl.export.plone import get_search_results
+
+    if mirror is not None:
+        return mirror.licences_ids(lmodel.plone_uid, status)
+
+    query = lmodel.lic_query
+
+    if status is not None:
+        query["review_state"] = status
+
+    return [{"licencee": licence["licencee"]["@id"], "licence": licence["@id"]}
+            for licence in get_search_results(query)]
+
+
+def export_licencees(lmodel: typing.Any, format: str = "csv", version: int = 1, status: list | None = None,
+                     from_mirror: Path | None = None, processes: int = 4, sort_by: str | None = None) -> typing.Iterator:
+    """Die Lizenznehmer eines Lizenz-Modells als Folge kodierter Blöcke
+
+    Ohne `sort_by` wird der Export nicht zwischengespeichert: Kopf, die im
+    Pool kodierten Zeilen und Fuß werden geliefert, sobald sie vorliegen, z.B.
+
+        for chunk in export_licencees(url, "csv", 2):
+            proc.stdin.write(chunk)
+
+    Args:
+        lmodel (LicenceModel | str): Das Lizenz-Modell oder seine URL bzw. UID
+        format (str, optional): Ausgabeformat (csv|xml|jsonl)
+        version (int, optional): Version des Export Schemas
+        status (list | None, optional): Status der Lizenzen
+        from_mirror (Path | None, optional): SQLite Datei des lokalen Spiegels
+        processes (int, optional): Anzahl der Pool Prozesse
+        sort_by (str | None, optional): Nach diesem Feld des Lizenznehmers
+            sortieren (UID|title|sigel), die Zeilen kommen dann erst nach dem
+            Laden aller Lizenzen
+
+    Raises:
+        ValueError: Unbekanntes Lizenz-Modell oder Format, das nicht als Datenstrom geht
+
+    Returns:
+        typing.Iterator: Die kodierten Blöcke als Bytes
+    """
+    from multiprocessing import Pool
+    from nl.export.formatter import FORMATTERS, get_formatter
+    from nl.export.sorting import ExternalSorter, sorting
+    from nl.export.utils import ROWS_PER_TASK, get_licence_variants
+
+    if format not in FORMATTERS or not get_formatter(format).streamable:
+        raise ValueError(f"Das Format {format} kann nicht als Datenstrom ausgegeben werden")
+
+    mirror = None
+
+    if from_mirror is not None:
+        from nl.export.mirror import Mirror
+        mirror = Mirror(from_mirror, readonly=True)
+
+    try:
+        if isinstance(lmodel, str):
+            lmodel = resolve_licencemodel(lmodel, mirror)
+
+        licences_ids = get_licences_ids(lmodel, status, mirror)
+    finally:
+        if mirror is not None:
+            mirror.close()
+
+    options = Namespace(format=format,
+                        version=version,
+                        status=status,
+                        from_mirror=from_mirror,
+                        ablage=Path("."),
+                        only_ascii=False)
+    formatter = get_formatter(format)(lmodel, options)
+
+    tasks = [(((format, version),), from_mirror, licences_ids[idx:idx + ROWS_PER_TASK], sort_by, False)
+             for idx in range(0, len(licences_ids), ROWS_PER_TASK)]
+
+    def chunks():
+        yield formatter.header()
+
+        if not sorting(sort_by):
+            with Pool(processes=processes) as pool:
+                for _, (rows,), _ in pool.imap(get_licence_variants, tasks):
+                    yield b"".join(rows)
+        else:
+            with ExternalSorter() as sorter:
+                with Pool(processes=processes) as pool:
+                    for keys, (rows,), _ in pool.imap_unordered(get_licence_variants, tasks):
+                        sorter.extend(zip(keys, rows))
+
+                for rows in sorter.batches():
+                    yield b"".join(rows)
+
+        yield formatter.footer()
+
+    return chunks()
+
+
+def resolve_licencemodel(url: str, mirror: typing.Any = None) -> typing.Any:
+    """Lizenz-Modell zu einer URL bzw. UID aus dem CMS oder dem Spiegel"""
+    from nl.export.plone import LicenceModel
+    from nl.export.utils import get_licencemodel
+
+    if mirror is None:
+        lmodel = get_licencemodel(url)
+    else:
+        item = mirror.get_licencemodel(url)
+        lmodel = None if item is None else LicenceModel(None, plone_item=item)
+
+    if lmodel is None:
+        raise ValueError(f"Kein Lizenz-Modell: {url}")
+
+    return lmodel
@@ -11,6 +11,7 @@
 
 import gettext
 import logging
+import sys
 from pathlib import Path
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
@@ -34,9 +35,22 @@ def main():
     gettext.gettext = translate
 
     import argparse
+    from .bench import benchmark
+    from .bulk import aendern
     from .conf import main as create_config, check_config
+    from .diff import vergleich
+    from .documents import dokumente
+    from .groups import gruppen
+    from .history import historie
+    from .identifiers import kennung
+    from .ipindex import ip_pruefung, ip_suche, ip_verzeichnis
+    from .logonnames import anmeldenamen
     from .lzn import lizenznehmer
+    from .profiles import check_profiles, run_profiles
     from .proxy import lmproxy
+    from .statistics import statistik
+    from .sync import spiegel
+    from .worker import arbeiter
     from nl.export.errors import NoConfig, Unauthorized
     from nl.export.gapi import TerminalColors
 
@@ -66,11 +80,10 @@ def main():
     sub_licencees = subparsers.add_parser(
         'lzn', help="Lizenznehmer")
     sub_licencees.add_argument('--format',
-                               nargs="?",
                                type=str,
-                               help="""Ausgabeformat (csv|xml|json). Standard ist %(default)s)""",
-                               metavar="Format",
-                               default="csv")
+                               help="""Ausgabeformat (csv|xml|json|jsonl), mit fester Version z.B. xml:2. Standard ist csv. Mehrfachnennung möglich""",
+                               action='append',
+                               metavar="Format")
     sub_licencees.add_argument('--ablage',
                                nargs="?",
                                type=Path,
@@ -93,11 +106,82 @@ def main():
                                nargs='+',
                                help='URL(s) oder eindeutige Identifier (UUID/URL-ID) von Lizenz-Modellen oder Produkten')
     sub_licencees.add_argument('--version',
-                               nargs="?",
                                type=int,
-                               help="Version des Export Schemas (1|2). Standard ist 1.",
-                               metavar="Versionsnummer",
-                               default=1)
+                               help="Version des Export Schemas (1|2). Standard ist 1. Mehrfachnennung möglich",
+                               action='append',
+                               metavar="Versionsnummer")
+    sub_licencees.add_argument('--from-mirror',
+                               dest='from_mirror',
+                               type=Path,
+                               help="Offline aus dem lokalen Spiegel (nl-export sync) exportieren",
+                               metavar="Datei",
+                               default=None)
+    sub_licencees.add_argument('--ausgabe',
+                               type=str,
+                               help="Statt in --ablage in dieses Ziel schreiben: - für die Standardausgabe, eine Datei oder benannte Pipe",
+                               metavar="Ziel",
+                               default=None)
+    sub_licencees.add_argument('--verteilt',
+                               type=Path,
+                               help="Als Koordinator über dieses gemeinsame Auftragsverzeichnis an Arbeiter (nl-export arbeiter) verteilen",
+                               metavar="Verzeichnis",
+                               default=None)
+    sub_licencees.add_argument('--bereich',
+                               type=int,
+                               help="Lizenzen je verteiltem Bereich. Standard ist %(default)s",
+                               metavar="N",
+                               default=500)
+    sub_licencees.add_argument('--zeitlimit',
+                               type=int,
+                               help="Sekunden ohne Lebenszeichen, nach denen ein Bereich neu vergeben wird. Standard ist %(default)s",
+                               metavar="Sekunden",
+                               default=120)
+    sub_licencees.add_argument('--versuche',
+                               type=int,
+                               help="Fehlschläge eines verteilten Bereichs, nach denen der Export abbricht. Standard ist %(default)s",
+                               metavar="N",
+                               default=3)
+    sub_licencees.add_argument('--gesamtzeit',
+                               type=int,
+                               help="Sekunden, nach denen ein verteilter Export abbricht. Standard ist ohne Grenze",
+                               metavar="Sekunden",
+                               default=None)
+    sub_licencees.add_argument('--sort-by',
+                               dest='sort_by',
+                               type=str,
+                               choices=("UID", "title", "sigel", "keine"),
+                               help="Zeilen nach diesem Feld des Lizenznehmers sortieren (UID|title|sigel), keine für die Reihenfolge der Suche. Standard ist %(default)s",
+                               metavar="Feld",
+                               default="UID")
+    sub_licencees.add_argument('--kennungen',
+                               type=Path,
+                               help="Index der Kennungen (Sigel, EZB ID, ISNI, Fremdschlüssel) beim Export aktualisieren",
+                               metavar="Datei",
+                               default=None)
+    sub_licencees.add_argument('--laufzeitprofil',
+                               type=Path,
+                               help="Laufzeitprofile je Phase (suche, aufloesen, format, schreiben) in dieses Verzeichnis schreiben",
+                               metavar="Verzeichnis",
+                               default=None)
+    sub_licencees.add_argument('--laufzeitprofil-modus',
+                               dest='laufzeitprofil_modus',
+                               type=str,
+                               choices=("voll", "stichprobe"),
+                               help="voll mit cProfile, stichprobe nur Stapel alle 10 ms mit geringem Aufwand. Standard ist %(default)s",
+                               metavar="Modus",
+                               default="voll")
+    shard_group = sub_licencees.add_mutually_exclusive_group()
+    shard_group.add_argument('--shards',
+                             type=int,
+                             help="Ausgabe stabil nach Lizenznehmer auf N Dateien verteilen",
+                             metavar="N",
+                             default=None)
+    shard_group.add_argument('--shard-size',
+                             dest='shard_size',
+                             type=int,
+                             help="Ausgabe in Dateien mit höchstens N Zeilen aufteilen",
+                             metavar="N",
+                             default=None)
     sub_licencees.set_defaults(func=lizenznehmer)
 
     sub_proxy = subparsers.add_parser(
@@ -112,6 +196,386 @@ def main():
                            metavar="CSVDatei",
                            default=Path("./lmodels_singleuser.csv"))
 
+    sub_sync = subparsers.add_parser(
+        'sync', help="Lokalen SQLite Spiegel des CMS abgleichen")
+    sub_sync.add_argument('--datei',
+                          type=Path,
+                          help="SQLite Datei (Standard: ./nl_export.sqlite)",
+                          metavar="Datei",
+                          default=Path("./nl_export.sqlite"))
+    sub_sync.add_argument(
+        "--voll",
+        dest='voll',
+        action='store_true',
+        default=False,
+        help='Alles neu laden und gelöschte Objekte entfernen')
+    sub_sync.set_defaults(func=spiegel)
+
+    sub_diff = subparsers.add_parser(
+        'diff', help="Zwei Exporte desselben Schemas vergleichen")
+    sub_diff.add_argument('alt',
+                          type=Path,
+                          help="Älterer Export (csv|xml|jsonl)",
+                          metavar="Alt")
+    sub_diff.add_argument('neu',
+                          type=Path,
+                          help="Neuerer Export (csv|xml|jsonl)",
+                          metavar="Neu")
+    sub_diff.add_argument('--format',
+                          type=str,
+                          help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                          metavar="Format",
+                          default="csv")
+    sub_diff.add_argument('--ausgabe',
+                          type=Path,
+                          help="Ausgabedatei (Standard: Standardausgabe)",
+                          metavar="Datei",
+                          default=None)
+    sub_diff.add_argument('--ignoriere',
+                          type=str,
+                          help="Feld nicht vergleichen, z.B. mtime. Mehrfachnennung möglich",
+                          action='append',
+                          metavar="Feld")
+    sub_diff.add_argument('--speicher',
+                          type=int,
+                          help="Ab dieser Größe der Exporte in MB wird auf die Festplatte ausgelagert. Standard ist %(default)s",
+                          metavar="MB",
+                          default=256)
+    sub_diff.set_defaults(func=vergleich)
+
+    sub_documents = subparsers.add_parser(
+        'dokumente', help="EULAs und Dokumente der Institutionen herunterladen")
+    sub_documents.add_argument('urls',
+                               type=str,
+                               nargs='+',
+                               help='URL(s) oder eindeutige Identifier (UUID/URL-ID) von Lizenz-Modellen oder Produkten')
+    sub_documents.add_argument('--ablage',
+                               type=Path,
+                               help="Ablageverzeichnis",
+                               metavar="Verzeichnis",
+                               default=Path("."))
+    sub_documents.add_argument(
+        "--institutionen",
+        dest='institutionen',
+        action='store_true',
+        default=False,
+        help='Auch Anmeldeformulare und unterschriebene EULAs der Lizenznehmer laden')
+    sub_documents.add_argument('--status',
+                               type=str,
+                               help="Status der Lizenz(en) für --institutionen. Mehrfachnennung möglich",
+                               action='append',
+                               metavar="Status")
+    sub_documents.add_argument('--parallel',
+                               type=int,
+                               help="Anzahl gleichzeitiger Downloads. Standard ist 8",
+                               metavar="N",
+                               default=None)
+    sub_documents.set_defaults(func=dokumente)
+
+    sub_groups = subparsers.add_parser(
+        'gruppen', help="Mitglieder von Gruppen exportieren")
+    sub_groups.add_argument('gruppen',
+                            type=str,
+                            nargs='+',
+                            help="Name(n) der Gruppe(n)",
+                            metavar="Gruppe")
+    sub_groups.add_argument('--format',
+                            type=str,
+                            help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                            metavar="Format",
+                            default="csv")
+    sub_groups.add_argument('--ausgabe',
+                            type=Path,
+                            help="Ausgabedatei (Standard: Standardausgabe)",
+                            metavar="Datei",
+                            default=None)
+    sub_groups.add_argument('--parallel',
+                            type=int,
+                            help="Anzahl gleichzeitiger Anfragen. Standard ist 8",
+                            metavar="N",
+                            default=None)
+    sub_groups.set_defaults(func=gruppen)
+
+    sub_history = subparsers.add_parser(
+        'historie', help="Workflow Historie der Lizenzen (und Lizenznehmer) von Lizenz-Modellen exportieren")
+    sub_history.add_argument('urls',
+                             type=str,
+                             nargs='+',
+                             help='URL(s) oder eindeutige Identifier (UUID/URL-ID) von Lizenz-Modellen oder Produkten')
+    sub_history.add_argument('--status',
+                             type=str,
+                             help="Status der Lizenz(en). Mehrfachnennung möglich",
+                             action='append',
+                             metavar="Status")
+    sub_history.add_argument(
+        "--lizenznehmer",
+        dest='lizenznehmer',
+        action='store_true',
+        default=False,
+        help='Auch die Historie der Lizenznehmer exportieren')
+    sub_history.add_argument('--stand',
+                             type=Path,
+                             help="Inkrementell: unveränderte Objekte (modified) seit dem letzten Lauf mit dieser Datei überspringen",
+                             metavar="Datei",
+                             default=None)
+    sub_history.add_argument('--format',
+                             type=str,
+                             help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                             metavar="Format",
+                             default="csv")
+    sub_history.add_argument('--ausgabe',
+                             type=Path,
+                             help="Ausgabedatei (Standard: Standardausgabe)",
+                             metavar="Datei",
+                             default=None)
+    sub_history.add_argument('--parallel',
+                             type=int,
+                             help="Anzahl gleichzeitiger Anfragen. Standard ist 8",
+                             metavar="N",
+                             default=None)
+    sub_history.set_defaults(func=historie)
+
+    sub_logonnames = subparsers.add_parser(
+        'anmeldenamen', help="Liste von Anmeldenamen mit dem CMS abgleichen")
+    sub_logonnames.add_argument('datei',
+                                type=Path,
+                                help="Ein Anmeldename je Zeile",
+                                metavar="Datei")
+    sub_logonnames.add_argument('--format',
+                                type=str,
+                                help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                                metavar="Format",
+                                default="csv")
+    sub_logonnames.add_argument('--ausgabe',
+                                type=Path,
+                                help="Ausgabedatei (Standard: Standardausgabe)",
+                                metavar="Datei",
+                                default=None)
+    sub_logonnames.add_argument('--feld',
+                                type=str,
+                                help="Weiteres Feld der Ergebnisse. Mehrfachnennung möglich",
+                                action='append',
+                                metavar="Feld")
+    sub_logonnames.add_argument('--block',
+                                type=int,
+                                help="Anmeldenamen je Suche. Standard ist %(default)s",
+                                metavar="N",
+                                default=50)
+    sub_logonnames.add_argument('--parallel',
+                                type=int,
+                                help="Anzahl gleichzeitiger Suchen. Standard ist 8",
+                                metavar="N",
+                                default=None)
+    sub_logonnames.set_defaults(func=anmeldenamen)
+
+    sub_statistics = subparsers.add_parser(
+        'statistik', help="Anzahl der Lizenzen je Lizenz-Modell, Status, Lizenztyp usw.")
+    sub_statistics.add_argument('urls',
+                                type=str,
+                                nargs='*',
+                                help='URL(s) oder eindeutige Identifier (UUID/URL-ID) von Lizenz-Modellen oder Produkten, ohne Angabe alle Lizenzen')
+    sub_statistics.add_argument('--status',
+                                type=str,
+                                help="Je Status der Lizenzen zählen. Mehrfachnennung möglich",
+                                action='append',
+                                metavar="Status")
+    sub_statistics.add_argument('--lizenztyp',
+                                type=str,
+                                help="Je Lizenztyp zählen. Mehrfachnennung möglich",
+                                action='append',
+                                metavar="Typ")
+    sub_statistics.add_argument('--facette',
+                                type=str,
+                                help="Je Wert eines weiteren Index der Suche zählen, z.B. licence_type=standard,optin. Mehrfachnennung möglich",
+                                action='append',
+                                metavar="Index=Werte")
+    sub_statistics.add_argument('--format',
+                                type=str,
+                                help="Ausgabeformat (tabelle|csv|json). Standard ist %(default)s",
+                                metavar="Format",
+                                default="tabelle")
+    sub_statistics.add_argument('--parallel',
+                                type=int,
+                                help="Anzahl gleichzeitiger Suchen. Standard ist 8",
+                                metavar="N",
+                                default=None)
+    sub_statistics.set_defaults(func=statistik)
+
+    sub_identifiers = subparsers.add_parser(
+        'kennung', help="Lizenznehmer zu Sigel, EZB ID, ISNI oder Fremdschlüssel im Index finden")
+    sub_identifiers.add_argument('index',
+                                 type=Path,
+                                 help="Indexdatei (nl-export lzn --kennungen)",
+                                 metavar="Index")
+    sub_identifiers.add_argument('kennungen',
+                                 type=str,
+                                 nargs='*',
+                                 help="Kennung(en)",
+                                 metavar="Kennung")
+    sub_identifiers.add_argument('--datei',
+                                 type=Path,
+                                 help="Kennungen aus dieser Datei auflösen, eine je Zeile",
+                                 metavar="Datei",
+                                 default=None)
+    sub_identifiers.add_argument('--typ',
+                                 type=str,
+                                 help="Nur Treffer dieses Felds (sigel|ezb_id|isni|foreign_keys)",
+                                 metavar="Feld",
+                                 default=None)
+    sub_identifiers.add_argument('--format',
+                                 type=str,
+                                 help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                                 metavar="Format",
+                                 default="csv")
+    sub_identifiers.set_defaults(func=kennung)
+
+    sub_ipindex = subparsers.add_parser(
+        'ip-index', help="IP Index aus Exporten aufbauen bzw. erneuern")
+    sub_ipindex.add_argument('index',
+                             type=Path,
+                             help="Indexdatei",
+                             metavar="Index")
+    sub_ipindex.add_argument('exporte',
+                             type=Path,
+                             nargs='+',
+                             help="Exporte (csv|xml|jsonl) mit ipv4_allow bzw. ipv6",
+                             metavar="Export")
+    sub_ipindex.set_defaults(func=ip_verzeichnis)
+
+    sub_iplookup = subparsers.add_parser(
+        'ip-lookup', help="Lizenznehmer zu IP Adressen im IP Index finden")
+    sub_iplookup.add_argument('index',
+                              type=Path,
+                              help="Indexdatei (nl-export ip-index)",
+                              metavar="Index")
+    sub_iplookup.add_argument('adressen',
+                              type=str,
+                              nargs='+',
+                              help="IPv4 oder IPv6 Adresse(n)",
+                              metavar="Adresse")
+    sub_iplookup.set_defaults(func=ip_suche)
+
+    sub_ipaudit = subparsers.add_parser(
+        'ip-audit', help="Überschneidende IP Bereiche verschiedener Lizenznehmer in Exporten finden")
+    sub_ipaudit.add_argument('exporte',
+                             type=Path,
+                             nargs='+',
+                             help="Exporte (csv|xml|jsonl) mit ipv4_allow bzw. ipv6",
+                             metavar="Export")
+    sub_ipaudit.add_argument('--format',
+                             type=str,
+                             help="Ausgabeformat (csv|jsonl). Standard ist %(default)s",
+                             metavar="Format",
+                             default="csv")
+    sub_ipaudit.add_argument('--ausgabe',
+                             type=Path,
+                             help="Ausgabedatei (Standard: Standardausgabe)",
+                             metavar="Datei",
+                             default=None)
+    sub_ipaudit.set_defaults(func=ip_pruefung)
+
+    sub_worker = subparsers.add_parser(
+        'arbeiter', help="Bereiche verteilter Exporte (lzn --verteilt) bearbeiten")
+    sub_worker.add_argument('verzeichnis',
+                            type=Path,
+                            help="Gemeinsames Auftragsverzeichnis",
+                            metavar="Verzeichnis")
+    sub_worker.add_argument('--name',
+                            type=str,
+                            help="Name des Arbeiters (Standard: Rechnername und Prozessnummer)",
+                            metavar="Name",
+                            default=None)
+    sub_worker.add_argument('--prozesse',
+                            type=int,
+                            help="Anzahl paralleler Prozesse. Standard ist %(default)s",
+                            metavar="N",
+                            default=4)
+    sub_worker.add_argument('--leerlauf',
+                            type=int,
+                            help="Beenden, wenn so viele Sekunden nichts zu tun war. Standard ist %(default)s",
+                            metavar="Sekunden",
+                            default=60)
+    sub_worker.set_defaults(func=arbeiter)
+
+    sub_update = subparsers.add_parser(
+        'aendern', help="Änderungen aus einer Datei gleichzeitig anwenden")
+    sub_update.add_argument('datei',
+                            type=Path,
+                            help="Änderungen als CSV oder JSON Lines, je Objekt @id oder UID und die neuen Werte",
+                            metavar="Datei")
+    sub_update.add_argument('--parallel',
+                            type=int,
+                            help="Anzahl gleichzeitiger Anfragen. Standard ist 8",
+                            metavar="N",
+                            default=None)
+    sub_update.add_argument(
+        "--trocken",
+        dest='trocken',
+        action='store_true',
+        default=False,
+        help='Nichts ändern, nur die abweichenden Felder melden')
+    sub_update.add_argument(
+        "--vergleichen",
+        dest='vergleichen',
+        action='store_true',
+        default=False,
+        help='Objekte vorher laden und nur abweichende Felder ändern')
+    sub_update.add_argument('--format',
+                            type=str,
+                            help="Format des Berichts (csv|jsonl). Standard ist %(default)s",
+                            metavar="Format",
+                            default="csv")
+    sub_update.add_argument('--bericht',
+                            type=Path,
+                            help="Ausgabedatei des Berichts (Standard: Standardausgabe)",
+                            metavar="Datei",
+                            default=None)
+    sub_update.set_defaults(func=aendern)
+
+    sub_bench = subparsers.add_parser(
+        'bench', help="Messungen zur Laufzeit")
+    sub_bench.add_argument('ziel',
+                           type=str,
+                           help="Was gemessen wird (start|codec|formatter)",
+                           metavar="Ziel")
+    sub_bench.add_argument('--budget',
+                           type=float,
+                           help="Maximale Startzeit in Millisekunden. Standard ist %(default)s",
+                           metavar="ms",
+                           default=50.0)
+    sub_bench.add_argument('--anzahl',
+                           type=int,
+                           help="Anzahl der angezeigten Einträge. Standard ist %(default)s",
+                           metavar="Anzahl",
+                           default=10)
+    sub_bench.add_argument('--zeilen',
+                           type=int,
+                           help="Anzahl synthetischer Lizenznehmer. Standard ist %(default)s",
+                           metavar="Anzahl",
+                           default=10000)
+    sub_bench.add_argument('--stufe',
+                           type=int,
+                           help="Zeilenzahl für formatter, z.B. 10000, 100000, 1000000. Mehrfachnennung möglich",
+                           action='append',
+                           metavar="Anzahl")
+    sub_bench.add_argument('--baseline',
+                           type=Path,
+                           help="Gespeicherte Ergebnisse für formatter (Standard: ./nl_export_bench.json)",
+                           metavar="Datei",
+                           default=Path("./nl_export_bench.json"))
+    sub_bench.add_argument(
+        "--speichern",
+        dest='speichern',
+        action='store_true',
+        default=False,
+        help='Ergebnisse als neue Baseline speichern')
+    sub_bench.add_argument('--toleranz',
+                           type=float,
+                           help="Erlaubte Verschlechterung gegenüber der Baseline in Prozent. Standard ist %(default)s",
+                           metavar="Prozent",
+                           default=20.0)
+    sub_bench.set_defaults(func=benchmark)
+
     o_parser.add_argument(
         "-v",
         dest='verbose',
@@ -119,6 +583,36 @@ def main():
         default=False,
         help='Mehr Nachrichten')
 
+    cassette_group = o_parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--aufnahme',
+                                type=Path,
+                                help="Alle Anfragen und Antworten in diese Datei aufnehmen",
+                                metavar="Datei",
+                                default=None)
+    cassette_group.add_argument('--wiedergabe',
+                                type=Path,
+                                help="Antworten aus dieser Aufnahme liefern, ohne Zugriff auf das CMS",
+                                metavar="Datei",
+                                default=None)
+    o_parser.add_argument(
+        "--mit-latenz",
+        dest='mit_latenz',
+        action='store_true',
+        default=False,
+        help='Bei der Wiedergabe die aufgenommenen Antwortzeiten einhalten')
+
+    o_parser.add_argument('--hedging',
+                          type=float,
+                          help="GETs, die länger als dieses Perzentil der Antwortzeiten dauern, ein zweites Mal stellen, z.B. 95",
+                          metavar="Perzentil",
+                          default=None)
+
+    o_parser.add_argument('--profil',
+                          type=str,
+                          help="Profil der Konfiguration (Standard: standard). Mehrfachnennung möglich, dann je Profil in --ablage/<Profil>",
+                          action='append',
+                          metavar="Name")
+
     options = o_parser.parse_args()
 
     log_level = logging.WARN
@@ -130,11 +624,45 @@ def main():
                         format="%(levelname)s - %(funcName)s - %(message)s",
                         level=log_level)
 
+    if options.aufnahme is not None or options.wiedergabe is not None:
+        from nl.export.cassette import RECORD, REPLAY, activate
+
+        if options.aufnahme is not None:
+            activate(options.aufnahme, RECORD)
+        else:
+            activate(options.wiedergabe, REPLAY, latency=options.mit_latenz)
+
+    if options.hedging is not None:
+        from nl.export.transport import enable_hedging
+        enable_hedging(options.hedging)
+
+    profiles = list(dict.fromkeys(options.profil or []))
+    exit_code = 0
+
     try:
-        if options.func != create_config:
+        if options.func not in (create_config, benchmark, vergleich, ip_verzeichnis, ip_suche, ip_pruefung, kennung):
             if not check_config():
                 raise NoConfig
-        options.func(options)
+
+            if missing := check_profiles(profiles):
+                cmd = TerminalColors.bold("nl-export --profil <Name> konfig")
+                logger.error(f"Profil nicht konfiguriert: {', '.join(missing)}. Anlegen mit {cmd}")
+                return None
+
+        if len(profiles) > 1:
+            if not hasattr(options, "ablage") or getattr(options, "ausgabe", None) or getattr(options, "verteilt", None):
+                logger.error("Mehrere Profile nur für Exporte in eine Ablage, ohne --ausgabe und --verteilt")
+                return None
+
+            if not run_profiles(profiles, options):
+                logger.error("Nicht alle Profile waren erfolgreich")
+                exit_code = 1
+        else:
+            if profiles:
+                from nl.export.config import activate_profile
+                activate_profile(profiles[0])
+
+            options.func(options)
     except Unauthorized:
         msg = "Zugriff nicht erlaubt. Bitte überprüfen Sie ihre Zugangsdaten."
         logger.error(msg)
@@ -148,3 +676,10 @@ def main():
 Diese kann mit {cmd} angelegt werden.
                 """
         logger.error(msg)
+
+    if "nl.export.transport" in sys.modules:
+        stats = sys.modules["nl.export.transport"].request_stats()
+        logger.info("HTTP: " + ", ".join(f"{num} {name}" for name, num in sorted(stats.items())))
+
+    if exit_code:
+        sys.exit(exit_code)
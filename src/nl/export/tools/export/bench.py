@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import random
+import subprocess
+import sys
+import time
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Module, die neben den Kommandos beim Start von nl-export geladen werden
+STARTUP_MODULES = ("nl.export.errors",
+                   "nl.export.gapi",
+                   "nl.export.config")
+
+# Diese Abhängigkeiten dürfen erst bei Bedarf geladen werden
+STARTUP_FORBIDDEN = ("requests", "tqdm", "lxml", "multiprocessing", "zope")
+
+# Gemessene Formatierer, je Schema Version 1 und 2
+FORMATTER_BENCHMARKS = ("csv", "xml", "json")
+
+# Anzahl verschiedener synthetischer Lizenznehmer, die reihum kodiert werden
+FORMATTER_POOL = 1000
+
+
+def importtime(modules: tuple) -> list:
+    """Importzeiten mit `python -X importtime` messen
+
+    Args:
+        modules (tuple): Zu importierende Module
+
+    Returns:
+        list: Tupel (Modul, eigene Zeit in µs, kumulierte Zeit in µs, Ebene)
+    """
+    # Das Namespace Paket nl wird vorab geladen, es gehört zur Installation
+    code = "import nl; " + "; ".join(f"import {mod}" for mod in modules)
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True,
+                          text=True,
+                          check=True)
+
+    result = []
+
+    # Nur die Einträge nach dem Namespace Paket zählen
+    lines = proc.stderr.splitlines()
+    lines = lines[next((idx for idx, line in enumerate(lines)
+                        if line.endswith("| nl")), -1) + 1:]
+
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_us, cumulative_us, name = line[12:].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+
+        result.append((name.strip(), int(self_us), int(cumulative_us), level))
+
+    return result
+
+
+def bench_start(options: Namespace) -> bool:
+    """Startzeit gegen das Budget prüfen"""
+    from nl.export.gapi import TerminalColors
+
+    import pkgutil
+    from nl.export.tools import export
+
+    commands = tuple(f"{export.__name__}.{module.name}"
+                     for module in pkgutil.iter_modules(export.__path__))
+
+    timings = importtime((export.__name__, ) + commands + STARTUP_MODULES)
+
+    total = sum(entry[2] for entry in timings if entry[3] == 0)
+    loaded = {entry[0] for entry in timings}
+    forbidden = sorted(mod for mod in loaded
+                       if mod.split(".")[0] in STARTUP_FORBIDDEN)
+
+    print(TerminalColors.bold("Importzeiten (kumuliert)"))
+    for name, self_us, cumulative_us, level in sorted(timings, key=lambda entry: entry[2], reverse=True)[:options.anzahl]:
+        print(f"{cumulative_us / 1000:8.2f} ms  {name}")
+
+    ok = total <= options.budget * 1000 and not forbidden
+
+    msg = f"\nStart: {total / 1000:.2f} ms (Budget {options.budget} ms)"
+    print(TerminalColors.green(msg) if ok else TerminalColors.red(msg))
+
+    if forbidden:
+        print(TerminalColors.red(f"Unerwünschte Importe: {', '.join(forbidden)}"))
+
+    return ok
+
+
+def synthetic_licencee(idx: int, rnd: random.Random) -> dict:
+    """Ein Lizenznehmer mit der Struktur eines Plone Objekts
+
+    Args:
+        idx (int): Laufende Nummer
+        rnd (random.Random): Zufallsgenerator
+
+    Returns:
+        dict: Das JSON Item
+    """
+    uid = f"{rnd.getrandbits(128):032x}"
+    url = f"https://nl.example.org/lizenznehmer/inst-{idx}"
+
+    return {"@id": url,
+            "@type": "NLInstitution",
+            "@components": {"workflow": {"@id": f"{url}/@workflow"}},
+            "UID": uid,
+            "uid": f"inst-{idx}",
+            "review_state": rnd.choice(("active", "inactive", "pending")),
+            "title": f"Universitätsbibliothek Beispielstadt {idx}",
+            "street": f"Bibliotheksstraße {rnd.randint(1, 200)}",
+            "zip": f"{rnd.randint(10000, 99999)}",
+            "city": "Göttingen",
+            "county": {"token": "NI", "title": "Niedersachsen"},
+            "country": {"token": "DE", "title": "Deutschland"},
+            "telephone": "+49 551 000000",
+            "fax": "",
+            "email": f"info@inst-{idx}.example.org",
+            "url": f"https://inst-{idx}.example.org",
+            "contactperson": "Erika Mustermann",
+            "sigel": f"{rnd.randint(1, 999)}",
+            "ezb_id": [f"EZB{rnd.randint(1000, 9999)}" for _ in range(rnd.randint(0, 3))],
+            "isni": f"0000 0001 {rnd.randint(1000, 9999)} {rnd.randint(1000, 9999)}",
+            "foreign_keys": [f"ISIL:DE-{rnd.randint(1, 999)}"],
+            "subscriper_group": {"token": "hochschule", "title": "Hochschulen"},
+            "ipv4_allow": [f"134.76.{rnd.randint(0, 255)}.*" for _ in range(rnd.randint(1, 20))],
+            "ipv6": [f"2001:638:{rnd.randint(0, 0xffff):x}::/48" for _ in range(rnd.randint(0, 3))],
+            "shib_provider_id": f"https://idp.inst-{idx}.example.org/idp/shibboleth",
+            "modified": "2024-05-02T10:11:12+00:00"}
+
+
+def synthetic_licencees(num: int, seed: int = 4711) -> list:
+    """Reproduzierbare Liste synthetischer Lizenznehmer"""
+    rnd = random.Random(seed)
+    return [synthetic_licencee(idx, rnd) for idx in range(num)]
+
+
+def bench_codec(options: Namespace) -> bool:
+    """JSON Backends für Antworten und JSON Ausgabe vergleichen"""
+    from nl.export import codec
+    from nl.export.gapi import TerminalColors
+
+    items = synthetic_licencees(options.zeilen)
+
+    # Suchergebnisse mit fullobjects=1 kommen in Seiten zu 100 Einträgen
+    pages = [codec.BACKENDS["stdlib"][1]({"items": items[idx:idx + 100],
+                                          "items_total": len(items)})
+             for idx in range(0, len(items), 100)]
+
+    per_10k = 10000 / max(len(items), 1)
+    results = {}
+
+    print(TerminalColors.bold(f"JSON Codec ({len(items)} Lizenznehmer, Zeit je 10.000)"))
+
+    for name, (loads, dumps) in codec.BACKENDS.items():
+        start = time.perf_counter()
+        for page in pages:
+            loads(page)
+        decode = (time.perf_counter() - start) * per_10k
+
+        start = time.perf_counter()
+        for item in items:
+            dumps(item)
+        encode = (time.perf_counter() - start) * per_10k
+
+        results[name] = (decode, encode)
+        print(f"{name:>8}: Dekodieren {decode * 1000:8.2f} ms  Kodieren {encode * 1000:8.2f} ms")
+
+    if "orjson" not in results:
+        print("\norjson ist nicht installiert, es wird die Standardbibliothek genutzt")
+        return True
+
+    decode_saved = results["stdlib"][0] - results["orjson"][0]
+    encode_saved = results["stdlib"][1] - results["orjson"][1]
+    print(TerminalColors.green(f"\nErsparnis je 10.000: Dekodieren {decode_saved * 1000:.2f} ms, "
+                               f"Kodieren {encode_saved * 1000:.2f} ms"))
+
+    return True
+
+
+def measure_formatter(formatter_class: type, version: int, items: list, rows: int) -> tuple:
+    """Zeilen mit `encode_row` kodieren
+
+    Returns:
+        tuple: Laufzeit in Sekunden und Anzahl der Bytes
+    """
+    from types import SimpleNamespace
+
+    records = [SimpleNamespace(plone_item=item) for item in items]
+    size = 0
+
+    start = time.perf_counter()
+
+    for idx in range(rows):
+        record = records[idx % len(records)]
+        row = formatter_class.encode_row(record, record, version)
+        size += len(row[1]) if isinstance(row, tuple) else len(row)
+
+    return (time.perf_counter() - start, size)
+
+
+def bench_formatter(options: Namespace) -> bool:
+    """Kosten der Formatierer ohne Netzwerk, mit Vergleich gegen eine Baseline"""
+    from nl.export import codec
+    from nl.export.formatter import get_formatter
+    from nl.export.gapi import TerminalColors
+    from nl.export.utils import WF_STATES_CACHE
+    import tracemalloc
+
+    # Die Workflow Titel würden sonst beim CMS erfragt
+    WF_STATES_CACHE.update({"active": "Aktiv", "inactive": "Inaktiv", "pending": "Wartend"})
+
+    items = synthetic_licencees(min(options.zeilen, FORMATTER_POOL))
+    results = {}
+
+    print(TerminalColors.bold("Formatierer (Zeilen/s, MB/s, Spitze tracemalloc)"))
+
+    for fmt in FORMATTER_BENCHMARKS:
+        formatter_class = get_formatter(fmt)
+
+        for version in (1, 2):
+            for rows in options.stufe or (options.zeilen, ):
+                elapsed, size = measure_formatter(formatter_class, version, items, rows)
+
+                tracemalloc.start()
+                measure_formatter(formatter_class, version, items, rows)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                key = f"{fmt}-v{version}-{rows}"
+                results[key] = {"zeilen_s": rows / elapsed,
+                                "bytes_s": size / elapsed,
+                                "spitze": peak}
+
+                print(f"{key:>20}: {rows / elapsed:12.0f} Zeilen/s {size / elapsed / (1 << 20):8.2f} MB/s "
+                      f"{peak / 1024:10.1f} KiB")
+
+    if options.speichern:
+        with options.baseline.open("wb") as fh:
+            codec.dump(results, fh)
+        print(f"\nBaseline gespeichert: {options.baseline}")
+        return True
+
+    if not options.baseline.is_file():
+        return True
+
+    with options.baseline.open("rb") as fh:
+        baseline = codec.loads(fh.read())
+
+    tolerance = options.toleranz / 100
+    regressions = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        if result["zeilen_s"] < baseline[key]["zeilen_s"] * (1 - tolerance):
+            regressions.append(f"{key}: {result['zeilen_s']:.0f} statt {baseline[key]['zeilen_s']:.0f} Zeilen/s")
+        if result["spitze"] > baseline[key]["spitze"] * (1 + tolerance):
+            regressions.append(f"{key}: Spitze {result['spitze']} statt {baseline[key]['spitze']} Bytes")
+
+    if regressions:
+        print(TerminalColors.red(f"\nVerschlechterung gegenüber {options.baseline}:"))
+        for msg in regressions:
+            print(TerminalColors.red(f"  {msg}"))
+        return False
+
+    print(TerminalColors.green(f"\nKeine Verschlechterung gegenüber {options.baseline} (Toleranz {options.toleranz}%)"))
+
+    return True
+
+
+def benchmark(options: Namespace) -> None:
+    logger = logging.getLogger(__name__)
+
+    benchmarks = {"codec": bench_codec,
+                  "formatter": bench_formatter,
+                  "start": bench_start}
+
+    if options.ziel not in benchmarks:
+        msg = "Unbekannter Benchmark"
+        logger.error(msg)
+        return None
+
+    if not benchmarks[options.ziel](options):
+        raise SystemExit(1)
+
+    return None
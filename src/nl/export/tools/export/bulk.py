@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def aendern(options: Namespace) -> None:
+    from nl.export.bulk import WRITERS, bulk_update, read_changes
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    if not options.datei.is_file():
+        msg = f"Datei existiert nicht: {options.datei}"
+        logger.error(msg)
+        return None
+
+    try:
+        changes = list(read_changes(options.datei))
+    except (ValueError, KeyError) as exc:
+        logger.error(exc)
+        return None
+
+    results = bulk_update(changes,
+                          max_workers=options.parallel,
+                          dry_run=options.trocken,
+                          compare=options.vergleichen)
+
+    if options.bericht is None:
+        stats = WRITERS[options.format](results, sys.stdout)
+    else:
+        with options.bericht.open("w", newline="", encoding="utf-8") as fh:
+            stats = WRITERS[options.format](results, fh)
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
@@ -12,7 +12,6 @@
 import configparser
 import logging
 from argparse import Namespace
-from pathlib import Path
 
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
@@ -20,13 +19,16 @@ __docformat__ = 'plaintext'
 
 
 def check_config() -> bool:
-    from nl.export.config import NLCONFIG
-    cfgpath = Path(NLCONFIG)
-    return cfgpath.is_file()
+    from nl.export.config import config_file
+    return config_file() is not None
 
 
 def main(options: Namespace) -> bool | None:
     """"""
+    from nl.export.config import migrate_config
+
+    migrate_config()
+
     if options.show:
         show_config(options)
         return None
@@ -35,38 +37,49 @@ def main(options: Namespace) -> bool | None:
 
 
 def create_config(options: Namespace) -> bool | None:
-    """"""
-    from nl.export.config import NLCONFIG
+    """Das aktive Profil (nl-export --profil <Name> konfig) anlegen
+
+    Andere Profile der Datei bleiben erhalten.
+    """
+    from nl.export.config import DEFAULT_SECTION, active_profile, config_path, profile_section
     from nl.export.gapi import TerminalColors
     from urllib.parse import urlparse
 
     logger = logging.getLogger()
-    cfgpath = Path(NLCONFIG)
+    cfgpath = config_path()
+    section = profile_section(active_profile())
 
-    if options.force is False and cfgpath.is_file():
-        msg = "Datei existiert bereits"
+    cfg = configparser.ConfigParser()
+
+    if cfgpath.is_file():
+        cfg.read(cfgpath)
+
+    if options.force is False and cfg.has_section(section):
+        msg = "Datei existiert bereits" if section == DEFAULT_SECTION else f"Profil {active_profile()} existiert bereits"
         logger.error(msg)
         return None
 
-    cfg = configparser.ConfigParser()
+    if not cfg.has_section(section):
+        cfg.add_section(section)
 
-    cfg.add_section("plone")
-    cfg.set("plone", "access-token", input("Access Token: ").strip())
-    cfg.set("plone", "base-url", input("CMS URL: ").strip())
+    cfg.set(section, "access-token", input("Access Token: ").strip())
+    cfg.set(section, "base-url", input("CMS URL: ").strip())
 
-    if len(cfg.get("plone", "access-token")) == 0:
+    if len(cfg.get(section, "access-token")) == 0:
         print(TerminalColors.bold("\nKein Token gesetzt"))
         return False
-    elif len(cfg.get("plone", "base-url")) == 0:
+    elif len(cfg.get(section, "base-url")) == 0:
         print(TerminalColors.bold("\nKeine URL gesetzt"))
         return False
 
-    uobj = urlparse(cfg.get("plone", "base-url"))
+    uobj = urlparse(cfg.get(section, "base-url"))
 
     if not uobj.scheme or not uobj.hostname:
         print(TerminalColors.bold("\nKeine valide URL gesetzt"))
         return False
 
+    cfgpath.parent.mkdir(parents=True, exist_ok=True)
+
     with cfgpath.open("wt") as cfh:
         cfg.write(cfh)
 
@@ -78,13 +91,13 @@ def create_config(options: Namespace) -> bool | None:
 
 def show_config(options: Namespace) -> bool | None:
     """"""
-    from nl.export.config import NLCONFIG
+    from nl.export.config import config_file
     from nl.export.gapi import TerminalColors
 
     logger = logging.getLogger()
-    cfgpath = Path(NLCONFIG)
+    cfgpath = config_file()
 
-    if not cfgpath.is_file():
+    if cfgpath is None:
         msg = "Datei existiert nicht"
         logger.error(msg)
         return None
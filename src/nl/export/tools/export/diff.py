@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def vergleich(options: Namespace) -> None:
+    from nl.export.diff import WRITERS, diff_exports
+    from nl.export.errors import SchemaMismatch
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    for fpath in (options.alt, options.neu):
+        if not fpath.is_file():
+            msg = f"Datei existiert nicht: {fpath}"
+            logger.error(msg)
+            return None
+
+    try:
+        changes = diff_exports(options.alt,
+                               options.neu,
+                               ignore=tuple(options.ignoriere or ()),
+                               memory=options.speicher << 20)
+
+        if options.ausgabe is None:
+            stats = WRITERS[options.format](changes, sys.stdout)
+        else:
+            with options.ausgabe.open("w", newline="", encoding="utf-8") as fh:
+                stats = WRITERS[options.format](changes, fh)
+    except (SchemaMismatch, ValueError, KeyError) as exc:
+        logger.error(exc)
+        return None
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
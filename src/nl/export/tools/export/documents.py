@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def dokumente(options: Namespace) -> None:
+    from nl.export.documents import download_documents, institution_documents, licencemodel_documents
+    from nl.export.plone import get_auth_session
+    from nl.export.stream import get_licences_ids
+    from nl.export.utils import get_licencemodel
+
+    logger = logging.getLogger(__name__)
+
+    session = get_auth_session()
+    documents = []
+    licencee_urls = set()
+
+    for url in options.urls:
+        licencemodel = get_licencemodel(url)
+
+        if licencemodel is None:
+            continue
+
+        documents.extend(licencemodel_documents(licencemodel))
+
+        if options.institutionen:
+            licencee_urls.update(lids["licencee"]
+                                 for lids in get_licences_ids(licencemodel, options.status))
+
+    if licencee_urls:
+        print(f"{len(licencee_urls)} Institution(en)")
+        documents.extend(institution_documents(licencee_urls, session=session))
+
+    print(f"{len(documents)} Dokument(e)")
+
+    stats = download_documents(documents,
+                               options.ablage.absolute(),
+                               max_workers=options.parallel,
+                               session=session)
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg)
+    logger.info(msg)
+
+    return None
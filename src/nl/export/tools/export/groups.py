@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def gruppen(options: Namespace) -> None:
+    from nl.export.groups import WRITERS, group_members
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    members = group_members(options.gruppen, max_workers=options.parallel)
+
+    if options.ausgabe is None:
+        num = WRITERS[options.format](members, sys.stdout)
+    else:
+        with options.ausgabe.open("w", newline="", encoding="utf-8") as fh:
+            num = WRITERS[options.format](members, fh)
+
+    print(f"{num} Mitglied(er)", file=sys.stderr)
+
+    return None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def historie(options: Namespace) -> None:
+    from nl.export.history import WRITERS, changed, licence_objects, licencee_objects, load_state, save_state, workflow_histories
+    from nl.export.plone import fetch_concurrent, get_auth_session
+    from nl.export.utils import get_licencemodel
+    import requests
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    lmodels = list(fetch_concurrent(get_licencemodel, options.urls))
+
+    if None in lmodels:
+        return None
+
+    session = get_auth_session()
+    state = {} if options.stand is None else load_state(options.stand)
+
+    try:
+        objects = []
+
+        for lmodel in lmodels:
+            objects.extend(licence_objects(lmodel, options.status, session=session, max_workers=options.parallel))
+
+        if options.lizenznehmer:
+            objects.extend(licencee_objects(objects, session=session, max_workers=options.parallel))
+    except requests.RequestException as exc:
+        logger.error(f"Suche fehlgeschlagen, der Stand bleibt unverändert: {exc}")
+        return None
+
+    pending = changed(objects, state)
+    print(f"{len(objects)} Objekt(e), {len(objects) - len(pending)} unverändert", file=sys.stderr)
+
+    rows = workflow_histories(pending, state=state, max_workers=options.parallel, session=session)
+
+    try:
+        if options.ausgabe is None:
+            stats = WRITERS[options.format](rows, sys.stdout)
+        else:
+            with options.ausgabe.open("w", newline="", encoding="utf-8") as fh:
+                stats = WRITERS[options.format](rows, fh)
+    except requests.RequestException as exc:
+        logger.error(f"Historie unvollständig, der Stand bleibt unverändert: {exc}")
+        return None
+
+    # Erst nach vollständiger Ausgabe, sonst fehlen Objekte beim nächsten Lauf
+    if options.stand is not None:
+        save_state(options.stand, state)
+
+    msg = "Übergänge: " + ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def kennung(options: Namespace) -> None:
+    from nl.export.identifiers import ID_FIELDS, WRITERS, IdentifierIndex, resolve_results
+    from nl.export.logonnames import read_logonnames
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    if options.typ is not None and options.typ not in ID_FIELDS:
+        msg = f"Unbekanntes Feld: {options.typ}"
+        logger.error(msg)
+        return None
+
+    values = list(options.kennungen)
+
+    if options.datei is not None:
+        if not options.datei.is_file():
+            msg = f"Datei existiert nicht: {options.datei}"
+            logger.error(msg)
+            return None
+
+        values.extend(read_logonnames(options.datei))
+
+    try:
+        index = IdentifierIndex(options.index)
+    except (FileNotFoundError, ValueError) as exc:
+        logger.error(exc)
+        return None
+
+    with index:
+        stats = WRITERS[options.format](resolve_results(index.resolve(values, options.typ)), sys.stdout)
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def ip_verzeichnis(options: Namespace) -> None:
+    from nl.export.ipindex import build_index
+
+    logger = logging.getLogger(__name__)
+
+    for fpath in options.exporte:
+        if not fpath.is_file():
+            msg = f"Datei existiert nicht: {fpath}"
+            logger.error(msg)
+            return None
+
+    try:
+        stats = build_index(options.index, options.exporte)
+    except (ValueError, KeyError) as exc:
+        logger.error(exc)
+        return None
+
+    msg = f"""IP Index {options.index.absolute()}: {stats["gelesen"]} Export(e) gelesen, {stats["unveraendert"]} unverändert, {stats["lizenznehmer"]} Lizenznehmer, {stats["ipv4"]} IPv4 und {stats["ipv6"]} IPv6 Intervall(e)"""
+    print(msg)
+    logger.info(msg)
+
+    return None
+
+
+def ip_suche(options: Namespace) -> None:
+    from nl.export.ipindex import IPIndex
+
+    logger = logging.getLogger(__name__)
+
+    try:
+        index = IPIndex(options.index)
+    except (FileNotFoundError, ValueError) as exc:
+        logger.error(exc)
+        return None
+
+    with index:
+        for address in options.adressen:
+            try:
+                entries = index.lookup(address)
+            except ValueError:
+                print(f"{address}: ungültige Adresse")
+                continue
+
+            if not entries:
+                print(f"{address}: -")
+
+            for entry in entries:
+                print(f"""{address}: {entry["key"]} {entry["title"]} ({", ".join(entry["quellen"])})""")
+
+    return None
+
+
+def ip_pruefung(options: Namespace) -> None:
+    from nl.export.ipaudit import WRITERS, audit
+    import sys
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    for fpath in options.exporte:
+        if not fpath.is_file():
+            msg = f"Datei existiert nicht: {fpath}"
+            logger.error(msg)
+            return None
+
+    try:
+        if options.ausgabe is None:
+            stats = WRITERS[options.format](audit(options.exporte), sys.stdout)
+        else:
+            with options.ausgabe.open("w", newline="", encoding="utf-8") as fh:
+                stats = WRITERS[options.format](audit(options.exporte), fh)
+    except (ValueError, KeyError) as exc:
+        logger.error(exc)
+        return None
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def anmeldenamen(options: Namespace) -> None:
+    from nl.export.logonnames import WRITERS, lookup_results, read_logonnames
+    from nl.export.plone import LOGONNAME_FIELDS, MAX_WORKERS, Member
+    import requests
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    if not options.datei.is_file():
+        msg = f"Datei existiert nicht: {options.datei}"
+        logger.error(msg)
+        return None
+
+    if options.block < 1:
+        msg = "Die Anzahl der Anmeldenamen je Suche muss größer 0 sein"
+        logger.error(msg)
+        return None
+
+    fields = list(LOGONNAME_FIELDS) + (options.feld or [])
+
+    try:
+        pairs = Member.byLogonNames(read_logonnames(options.datei),
+                                    fields=fields,
+                                    chunk_size=options.block,
+                                    max_workers=options.parallel or MAX_WORKERS)
+    except requests.RequestException as exc:
+        logger.error(f"Suche fehlgeschlagen: {exc}")
+        return None
+
+    results = lookup_results(pairs, fields)
+
+    if options.ausgabe is None:
+        stats = WRITERS[options.format](results, sys.stdout)
+    else:
+        with options.ausgabe.open("w", newline="", encoding="utf-8") as fh:
+            stats = WRITERS[options.format](results, fh)
+
+    msg = ", ".join(f"{num} {name}" for name, num in stats.items())
+    print(msg, file=sys.stderr)
+
+    return None
@@ -10,14 +10,9 @@
 """
 
 from argparse import Namespace
-from multiprocessing import Pool
-from nl.export.formatter.csv import LFormatCSV
-from nl.export.formatter.json import LFormatJSON
-from nl.export.formatter.xml import LFormatXML
-from nl.export.plone import get_items_found, get_search_results
-from nl.export.utils import get_licence_data, get_licencemodel
-from tqdm import tqdm
+from contextlib import ExitStack, redirect_stdout
 import logging
+import sys
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
 __docformat__ = 'plaintext'
@@ -27,56 +22,225 @@ global PROGRESS
 
 
 def lizenznehmer(options: Namespace) -> None:
+    from multiprocessing import Pool
+    from nl.export.distributed import coordinate
+    from nl.export.errors import JobFailed
+    from nl.export.formatter import get_formatter, parse_variants
+    from nl.export.identifiers import update_index
+    from nl.export.mirror import Mirror
+    from nl.export.plone import LicenceModel, get_items_found, get_search_results
+    from nl.export.profiling import SEARCH, WRITE, activate as activate_profiling, finish as finish_profiling, phase
+    from nl.export.shards import write_shards
+    from nl.export.sorting import ExternalSorter, sorting
+    from nl.export.stream import STDOUT
+    from nl.export.utils import ROWS_PER_TASK, get_licence_variants, get_licencemodel
+    from tqdm import tqdm
+
     logger = logging.getLogger(__name__)
 
-    formatters = {"csv": LFormatCSV,
-                  "json": LFormatJSON,
-                  "xml": LFormatXML}
+    try:
+        variants = parse_variants(options.format, options.version)
+    except ValueError as exc:
+        logger.error(str(exc))
+        return None
+
+    if len(variants) > 1 and (options.verteilt is not None or options.ausgabe is not None
+                              or options.shards is not None or options.shard_size is not None):
+        msg = "Mehrere Formate bzw. Versionen sind nur ohne --verteilt, --ausgabe und Aufteilung möglich"
+        logger.error(msg)
+        return None
+
+    fmt = variants[0][0]
+    formatter_class = get_formatter(fmt)
+
+    for value in (options.shards, options.shard_size):
+        if value is not None and value < 1:
+            msg = "Die Anzahl der Teile bzw. Zeilen muss größer 0 sein"
+            logger.error(msg)
+            return None
+
+    if (options.shards is not None or options.shard_size is not None) and not formatter_class.shardable:
+        msg = f"Das Format {fmt} kann nicht aufgeteilt werden"
+        logger.error(msg)
+        return None
 
-    if options.format not in formatters:
-        msg = "Unbekanntes Format"
+    if options.kennungen is not None and (options.verteilt is not None or options.shards is not None or options.shard_size is not None):
+        msg = "Der Index der Kennungen kann nur ohne --verteilt und Aufteilung geschrieben werden"
         logger.error(msg)
         return None
 
+    if options.verteilt is not None:
+        if options.from_mirror is not None or options.shards is not None or options.shard_size is not None:
+            msg = "Ein verteilter Export kann nicht aus dem Spiegel oder in Teilen erfolgen"
+            logger.error(msg)
+            return None
+
+        if options.bereich < 1:
+            msg = "Die Größe der Bereiche muss größer 0 sein"
+            logger.error(msg)
+            return None
+
+        if options.versuche < 1:
+            msg = "Die Anzahl der Versuche muss größer 0 sein"
+            logger.error(msg)
+            return None
+
+        options.verteilt.mkdir(parents=True, exist_ok=True)
+
+    if options.ausgabe is not None:
+        if not formatter_class.streamable:
+            msg = f"Das Format {fmt} kann nicht als Datenstrom ausgegeben werden"
+            logger.error(msg)
+            return None
+
+        if len(options.urls) > 1 or options.verteilt is not None or options.shards is not None or options.shard_size is not None:
+            msg = "Die Ausgabe in ein Ziel ist nur für ein Lizenz-Modell und ohne Aufteilung möglich"
+            logger.error(msg)
+            return None
+
+        if options.ausgabe == STDOUT:
+            # Die Standardausgabe gehört dem Export, Meldungen gehen nach stderr
+            sink = sys.stdout.buffer
+
+            with redirect_stdout(sys.stderr):
+                return lizenznehmer(Namespace(**(vars(options) | {"ausgabe": sink})))
+
+    # Je Kombination aus Format und Version eigene Optionen, mehrere
+    # Versionen eines Formats unterscheiden sich im Dateinamen
+    formats = [vfmt for vfmt, _ in variants]
+    variant_options = [Namespace(**(vars(options) | {"format": vfmt,
+                                                      "version": version,
+                                                      "variante": f"v{version}" if formats.count(vfmt) > 1 else None}))
+                       for vfmt, version in variants]
+    options = variant_options[0]
+
+    if options.laufzeitprofil is not None:
+        activate_profiling(options.laufzeitprofil, options.laufzeitprofil_modus)
+
+    mirror = None
+
+    if options.from_mirror is not None:
+        try:
+            mirror = Mirror(options.from_mirror, readonly=True)
+        except FileNotFoundError:
+            msg = f"Spiegel nicht vorhanden: {options.from_mirror}"
+            logger.error(msg)
+            return None
+
     for url in options.urls:
-        licencemodel = get_licencemodel(url)
+        if mirror is None:
+            licencemodel = get_licencemodel(url)
+        else:
+            item = mirror.get_licencemodel(url)
+            licencemodel = None if item is None else LicenceModel(None, plone_item=item)
+
+            if licencemodel is None:
+                print(f"Objekt nicht im Spiegel vorhanden: {url}")
 
         if licencemodel is None:
             continue
 
         licences_ids = []
 
-        query = licencemodel.lic_query
+        if mirror is None:
+            query = licencemodel.lic_query
 
-        if options.status is not None:
-            query["review_state"] = options.status
+            if options.status is not None:
+                query["review_state"] = options.status
+
+            with phase(SEARCH):
+                num_found = get_items_found(query)
+        else:
+            licences_ids = mirror.licences_ids(licencemodel.plone_uid, options.status)
+            num_found = len(licences_ids)
 
-        num_found = get_items_found(query)
         ptitle = licencemodel.productTitle()
         print(f"""{ptitle}: {num_found} Lizenz(en) gefunden""")
 
         if num_found == 0:
-            return None
+            continue
+
+        if options.verteilt is not None:
+            print("Verteilter Export")
+            try:
+                fpath = coordinate(options.verteilt, licencemodel, options, num_found)
+                print(f"Ausgabe: {fpath}")
+            except JobFailed as exc:
+                logger.error(exc)
+            except Exception:
+                logger.error("", exc_info=True)
+            continue
 
-        with formatters[options.format](licencemodel, options) as formatter:
+        if mirror is None:
             print("Lade Lizenzinfo herunter")
 
-            res = list(tqdm(get_search_results(query), total=num_found))
-            for licence in res:
-                ldict = {"licencee": licence["licencee"]["@id"],
-                         "licence": licence["@id"]}
-                licences_ids.append(ldict)
+            with phase(SEARCH):
+                res = list(tqdm(get_search_results(query), total=num_found))
+                for licence in res:
+                    ldict = {"licencee": licence["licencee"]["@id"],
+                             "licence": licence["@id"]}
+                    licences_ids.append(ldict)
 
-            print("Export")
+        if options.shards is not None or options.shard_size is not None:
+            print("Export in Teilen")
             try:
-                with Pool(processes=4) as pool:
-                    ldata = list(tqdm(pool.imap(get_licence_data,
-                                                licences_ids),
-                                      total=num_found))
+                mpath = write_shards(licencemodel, options, licences_ids)
+                print(f"Manifest: {mpath}")
+            except Exception:
+                logger.error("", exc_info=True)
+            continue
+
+        with ExitStack() as stack:
+            # Die Lizenzen werden einmal geladen und in jedem Pool Prozess
+            # für alle Kombinationen kodiert
+            formatters = [stack.enter_context(get_formatter(voptions.format)(licencemodel, voptions, sink=options.ausgabe))
+                          for voptions in variant_options]
+            print("Export" if len(variants) == 1 else
+                  "Export als " + ", ".join(f"{vfmt} v{version}" for vfmt, version in variants))
+            tasks = [(variants, options.from_mirror,
+                      licences_ids[idx:idx + ROWS_PER_TASK], options.sort_by, options.kennungen is not None)
+                     for idx in range(0, len(licences_ids), ROWS_PER_TASK)]
+            sorter = stack.enter_context(ExternalSorter()) if sorting(options.sort_by) else None
+            identifiers = [] if options.kennungen is not None else None
 
-                for licence, licencee in ldata:
-                    formatter.add_row(licence, licencee)
+            try:
+                with Pool(processes=4) as pool, tqdm(total=len(licences_ids)) as progress:
+                    # Mit Sortierung ist die Reihenfolge der Ergebnisse egal
+                    imap = pool.imap if sorter is None else pool.imap_unordered
+
+                    for keys, result, idents in imap(get_licence_variants, tasks):
+                        if identifiers is not None:
+                            identifiers.extend(idents)
+                        with phase(WRITE):
+                            if sorter is None:
+                                for formatter, rows in zip(formatters, result):
+                                    formatter.write(rows)
+                            else:
+                                sorter.extend(zip(keys, zip(*result)))
+                        progress.update(len(result[0]))
+
+                    # Regulär beenden, damit die Pool Prozesse ihr Profil schreiben
+                    pool.close()
+                    pool.join()
+
+                if sorter is not None:
+                    with phase(WRITE):
+                        for batch in sorter.batches():
+                            for formatter, rows in zip(formatters, zip(*batch)):
+                                formatter.write(rows)
+
+                if identifiers is not None:
+                    stats = update_index(options.kennungen, licencemodel, identifiers)
+                    print(f"""Kennungen: {stats["kennungen"]} von {stats["lizenznehmer"]} Lizenznehmer(n) aus {stats["modelle"]} Lizenz-Modell(en)""")
             except Exception:
                 logger.error("", exc_info=True)
 
+    if mirror is not None:
+        mirror.close()
+
+    if (times := finish_profiling()) is not None:
+        print(f"Laufzeitprofil: {options.laufzeitprofil}")
+        for name, entry in times.items():
+            print(f"""  {name}: {entry["sekunden"]:.2f} s in {entry["aufrufe"]} Abschnitt(en)""")
+
     return None
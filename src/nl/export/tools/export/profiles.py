@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Ein Kommando gleichzeitig für mehrere Profile ausführen
+
+Jedes Profil läuft in einem eigenen Prozess mit eigener Sitzung, eigenen
+Caches und Pool Prozessen und schreibt in ein eigenes Unterverzeichnis der
+Ablage (`<ablage>/<profil>`).
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def check_profiles(names: list) -> list:
+    """Namen der Profile, die nicht konfiguriert sind"""
+    from nl.export.config import get_profile
+
+    return [name for name in names if get_profile(name) is None]
+
+
+def run_profile(name: str, options: Namespace) -> None:
+    """Das Kommando im Prozess eines Profils ausführen"""
+    from nl.export.config import activate_profile
+    from nl.export.errors import Unauthorized
+
+    logging.basicConfig(encoding='utf-8',
+                        format=f"%(levelname)s - {name} - %(funcName)s - %(message)s",
+                        level=logging.INFO if options.verbose else logging.WARN)
+
+    activate_profile(name)
+
+    try:
+        options.func(options)
+    except Unauthorized:
+        msg = "Zugriff nicht erlaubt. Bitte überprüfen Sie ihre Zugangsdaten."
+        logging.getLogger().error(msg)
+        raise SystemExit(1)
+
+
+def run_profiles(names: list, options: Namespace) -> bool:
+    """Das Kommando für jedes Profil in einem eigenen Prozess ausführen
+
+    Args:
+        names (list): Namen der Profile
+        options (Namespace): Optionen des Kommandos, mit `ablage`
+
+    Returns:
+        bool: True, wenn alle Profile erfolgreich waren
+    """
+    from copy import copy
+    import multiprocessing
+
+    logger = logging.getLogger()
+
+    # spawn statt fork, damit kein Prozess Sitzungen oder Caches erbt
+    context = multiprocessing.get_context("spawn")
+    processes = []
+
+    for name in names:
+        poptions = copy(options)
+        poptions.ablage = options.ablage / name
+        poptions.ablage.mkdir(parents=True, exist_ok=True)
+
+        process = context.Process(target=run_profile, args=(name, poptions), name=f"nl-export-{name}")
+        process.start()
+        processes.append((name, process))
+
+    success = True
+
+    for name, process in processes:
+        process.join()
+
+        if process.exitcode != 0:
+            logger.error(f"Profil {name}: beendet mit Status {process.exitcode}")
+            success = False
+
+    return success
@@ -13,8 +13,6 @@ import csv
 import logging
 import uuid
 from argparse import Namespace
-from io import StringIO
-from nl.export.plone import get_items_found, get_search_results, LicenceModel
 from urllib.parse import urlparse
 
 __author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
@@ -22,6 +20,8 @@ __docformat__ = 'plaintext'
 
 
 def lmproxy(options: Namespace) -> None:
+    from nl.export.plone import get_items_found, get_search_results, LicenceModel
+
     logger = logging.getLogger(__name__)
 
     query = {"fullobjects": "1",
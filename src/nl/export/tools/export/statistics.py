@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def statistik(options: Namespace) -> None:
+    from nl.export.plone import fetch_concurrent
+    from nl.export.statistics import WRITERS, licence_counts, parse_facet
+    from nl.export.utils import get_licencemodel
+    import requests
+
+    logger = logging.getLogger(__name__)
+
+    if options.format not in WRITERS:
+        msg = "Unbekanntes Format"
+        logger.error(msg)
+        return None
+
+    facets = {}
+
+    if options.status is not None:
+        facets["review_state"] = options.status
+
+    if options.lizenztyp is not None:
+        facets["licence_type"] = options.lizenztyp
+
+    try:
+        for value in options.facette or []:
+            index, values = parse_facet(value)
+            facets[index] = values
+    except ValueError as exc:
+        logger.error(exc)
+        return None
+
+    lmodels = list(fetch_concurrent(get_licencemodel, options.urls))
+
+    if None in lmodels:
+        return None
+
+    try:
+        rows = licence_counts(lmodels, facets, max_workers=options.parallel)
+    except requests.RequestException as exc:
+        logger.error(exc)
+        return None
+
+    WRITERS[options.format](rows, sys.stdout)
+
+    return None
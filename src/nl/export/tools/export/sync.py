@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def spiegel(options: Namespace) -> None:
+    from nl.export.mirror import sync
+
+    logger = logging.getLogger(__name__)
+
+    stats = sync(options.datei, full=options.voll)
+
+    msg = f"""Spiegel {options.datei.absolute()}: {stats["lmodels"]} Lizenz-Modell(e), {stats["licences"]} Lizenz(en), {stats["licencees"]} Lizenznehmer, {stats["wf_states"]} Workflow Status abgeglichen"""
+    print(msg)
+    logger.info(msg)
+
+    return None
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Beschreibung
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+import logging
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def arbeiter(options: Namespace) -> None:
+    from nl.export.distributed import run_worker
+    import os
+    import socket
+
+    logger = logging.getLogger(__name__)
+
+    if not options.verzeichnis.is_dir():
+        msg = f"Verzeichnis existiert nicht: {options.verzeichnis}"
+        logger.error(msg)
+        return None
+
+    name = options.name or f"{socket.gethostname()}-{os.getpid()}"
+
+    done = run_worker(options.verzeichnis,
+                      name,
+                      processes=options.prozesse,
+                      idle=options.leerlauf)
+
+    msg = f"{name}: {done} Bereich(e) bearbeitet"
+    print(msg)
+    logger.info(msg)
+
+    return None
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""Zeitlimits, Wiederholungen und abgesicherte Anfragen
+
+Alle Sitzungen aus :func:`nl.export.plone.get_auth_session` nutzen den
+:class:`ResilientAdapter`. Er setzt Zeitlimits für Verbindung und Antwort,
+wiederholt GET und HEAD bei Zeitüberschreitung, Verbindungsfehlern und
+vorübergehenden Fehlern des Servers mit exponentiell wachsender, zufällig
+gestreuter Wartezeit und kann langsame GETs absichern: Dauert eine Anfrage
+länger als ein Perzentil der bisherigen Antwortzeiten, wird dieselbe
+Anfrage ein zweites Mal gestellt und die erste Antwort gewinnt.
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from requests.adapters import HTTPAdapter
+import logging
+import os
+import random
+import requests
+import threading
+import time
+import typing
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+# Zeitlimits in Sekunden für Verbindungsaufbau und Antwort
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# Wiederholungen, Grundwert und Obergrenze der Wartezeit in Sekunden
+MAX_RETRIES = 3
+BACKOFF = 0.5
+BACKOFF_MAX = 30
+
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+RETRY_STATUS = (429, 502, 503, 504)
+
+# Perzentil der Antwortzeiten, ab dem abgesichert wird (leer: aus)
+HEDGE_ENV = "NL_EXPORT_HEDGE"
+
+# Gemessene Antwortzeiten, bevor abgesichert wird
+HEDGE_MIN_SAMPLES = 50
+HEDGE_WINDOW = 500
+HEDGE_THREADS = 64
+
+# Zähler dieses Prozesses
+STATS = Counter()
+_STATS_LOCK = threading.Lock()
+
+# Antwortzeiten und Threads für abgesicherte Anfragen, von allen Sitzungen
+# eines Prozesses geteilt
+_LATENCIES = deque(maxlen=HEDGE_WINDOW)
+_HEDGE_LOCK = threading.Lock()
+_HEDGE_EXECUTOR = None
+
+
+def _reset_after_fork() -> None:
+    """Kindprozesse erben weder Threads noch Messungen des Elternprozesses"""
+    global _HEDGE_EXECUTOR, _HEDGE_LOCK, _STATS_LOCK
+
+    _HEDGE_EXECUTOR = None
+    _HEDGE_LOCK = threading.Lock()
+    _STATS_LOCK = threading.Lock()
+    _LATENCIES.clear()
+    STATS.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def count(name: str, num: int = 1) -> None:
+    with _STATS_LOCK:
+        STATS[name] += num
+
+
+def request_stats() -> dict:
+    """Zähler der Anfragen, Zeitüberschreitungen, Wiederholungen und Absicherungen"""
+    with _STATS_LOCK:
+        return dict(STATS)
+
+
+def enable_hedging(percentile: float) -> None:
+    """Abgesicherte GETs für diesen und alle Kindprozesse einschalten"""
+    os.environ[HEDGE_ENV] = str(percentile)
+
+
+def backoff(attempt: int) -> float:
+    """Wartezeit vor der Wiederholung `attempt` (ab 1), voll gestreut"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF * (2 ** attempt)))
+
+
+def close_response(future: typing.Any) -> None:
+    """Die Antwort der unterlegenen Anfrage verwerfen"""
+    if future.exception() is None:
+        future.result().close()
+
+
+def total_timeout(timeout: typing.Any) -> float | None:
+    """Obergrenze in Sekunden für eine Anfrage mit diesem Zeitlimit"""
+    if isinstance(timeout, tuple):
+        return None if None in timeout else sum(timeout)
+
+    return timeout
+
+
+def retry_after(response: requests.Response) -> float | None:
+    value = response.headers.get("Retry-After", "")
+    return min(float(value), BACKOFF_MAX) if value.isdigit() else None
+
+
+class ResilientAdapter(HTTPAdapter):
+    """HTTPAdapter mit Zeitlimits, Wiederholungen und abgesicherten GETs"""
+
+    def __init__(self, hedge_percentile: float | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+
+        if hedge_percentile is None and os.environ.get(HEDGE_ENV):
+            hedge_percentile = float(os.environ[HEDGE_ENV])
+
+        self.hedge_percentile = hedge_percentile
+
+    def hedge_after(self) -> float | None:
+        """Sekunden, nach denen eine zweite Anfrage gestellt wird"""
+        if self.hedge_percentile is None:
+            return None
+
+        with _HEDGE_LOCK:
+            if len(_LATENCIES) < HEDGE_MIN_SAMPLES:
+                return None
+
+            ordered = sorted(_LATENCIES)
+
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def send_once(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+
+        if response.status_code < 500:
+            with _HEDGE_LOCK:
+                _LATENCIES.append(time.perf_counter() - start)
+
+        return response
+
+    def send_hedged(self, request: requests.PreparedRequest, delay: float, **kwargs) -> requests.Response:
+        """Nach `delay` Sekunden eine zweite, gleiche Anfrage stellen, die erste Antwort gewinnt"""
+        global _HEDGE_EXECUTOR
+
+        with _HEDGE_LOCK:
+            if _HEDGE_EXECUTOR is None:
+                _HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=HEDGE_THREADS,
+                                                     thread_name_prefix="nl-export-hedge")
+            executor = _HEDGE_EXECUTOR
+
+        primary = executor.submit(self.send_once, request, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+
+        if done:
+            return primary.result()
+
+        count("hedges")
+        secondary = executor.submit(self.send_once, request, **kwargs)
+        futures = {primary, secondary}
+        winner = None
+        limit = total_timeout(kwargs.get("timeout"))
+        deadline = None if limit is None else time.monotonic() + limit
+
+        def remaining() -> float | None:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        while futures:
+            done, futures = wait(futures, timeout=remaining(), return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Keine Antwort innerhalb des Zeitlimits
+                break
+
+            winner = next((future for future in done if future.exception() is None), None)
+
+            if winner is not None:
+                break
+
+        if winner is None:
+            secondary.cancel()
+
+            if primary.cancel():
+                # Die erste Anfrage wurde nie gestartet, direkt stellen
+                return self.send_once(request, **kwargs)
+
+            try:
+                # Beide fehlgeschlagen, der Fehler der ersten Anfrage zählt
+                return primary.result(timeout=remaining())
+            except FutureTimeout:
+                # Eine tröpfelnde Antwort darf den Aufrufer nicht länger aufhalten
+                for future in (primary, secondary):
+                    future.add_done_callback(close_response)
+                raise requests.Timeout(f"Keine Antwort nach {limit} Sekunden", request=request)
+
+        for future in (primary, secondary):
+            if future is not winner:
+                future.add_done_callback(close_response)
+
+        if winner is secondary:
+            count("hedges_gewonnen")
+
+        return winner.result()
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, timeout: typing.Any = None, **kwargs) -> requests.Response:
+        logger = logging.getLogger(__name__)
+
+        if timeout is None:
+            timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+        retries = MAX_RETRIES if request.method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+
+        while True:
+            count("anfragen")
+            attempt += 1
+
+            try:
+                delay = None if stream or request.method != "GET" else self.hedge_after()
+
+                if delay is None:
+                    response = self.send_once(request, stream=stream, timeout=timeout, **kwargs)
+                else:
+                    response = self.send_hedged(request, delay, stream=stream, timeout=timeout, **kwargs)
+            except (requests.Timeout, requests.ConnectionError) as exc:
+                count("timeouts" if isinstance(exc, requests.Timeout) else "verbindungsfehler")
+
+                if attempt > retries:
+                    raise
+
+                wait_for = backoff(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS or attempt > retries:
+                    return response
+
+                wait_for = retry_after(response) or backoff(attempt)
+                response.close()
+
+            count("wiederholungen")
+            logger.info(f"Wiederholung {attempt} von {request.method} {request.url} in {wait_for:.2f} s")
+            time.sleep(wait_for)
@@ -10,10 +10,15 @@
 """
 
 from nl.export.plone import get_auth_session
+from pathlib import Path
+import functools
 import re
+import typing
 from urllib.parse import urlparse, urlunparse
 from nl.export.plone import LicenceModel, Licence, PloneItem
-from nl.export.config import LicenceModels, NLBASE_URL
+from nl.export import config
+from nl.export.config import LicenceModels
+from nl.export.codec import response_json
 import uuid
 from nl.export.plone import get_items_found, get_search_results
 
@@ -22,6 +27,9 @@ __docformat__ = 'plaintext'
 
 WF_STATES_CACHE = {}
 
+# Anzahl der Lizenzen je Aufgabe eines Pool Prozesses
+ROWS_PER_TASK = 25
+
 
 def option_title(val: dict | str, option: str) -> str:
     if isinstance(val, dict):
@@ -63,7 +71,7 @@ def get_wf_state(item: dict) -> str:
     wfurl = "{}/@workflow".format(item["@id"])
 
     with session.get(wfurl) as req:
-        res = req.json()
+        res = response_json(req)
         WF_STATES_CACHE[item["review_state"]] = res["state"]["title"]
 
     return WF_STATES_CACHE[item["review_state"]]
@@ -82,6 +90,65 @@ def get_licence_data(lids: dict) -> None:
     return (licence, licencee)
 
 
+def licence_loader(mirror: Path | None) -> typing.Callable:
+    """Lizenzdaten aus dem CMS oder aus dem lokalen Spiegel laden
+
+    Args:
+        mirror (Path | None): SQLite Datei des Spiegels oder None für das CMS
+
+    Returns:
+        typing.Callable: Funktion wie :func:`get_licence_data`
+    """
+    if mirror is None:
+        return get_licence_data
+
+    from nl.export.mirror import get_licence_data as get_mirror_data
+
+    return functools.partial(get_mirror_data, path=mirror)
+
+
+def get_licence_variants(args: tuple) -> tuple:
+    """Lizenzen einmal laden und für mehrere Formate und Versionen kodieren
+
+    Args:
+        args (tuple): Tupel (Format, Version), Spiegel, die Lizenzen, das
+            Feld für die Sortierung (oder None) und ob die Kennungen der
+            Lizenznehmer gebraucht werden
+
+    Returns:
+        tuple: Die Schlüssel für :class:`nl.export.sorting.ExternalSorter`
+            (oder None), je Kombination die kodierten Zeilen in der
+            Reihenfolge der Lizenzen und die Kennungen (oder None)
+    """
+    from nl.export.formatter import get_formatter
+    from nl.export.identifiers import licencee_identifiers
+    from nl.export.profiling import FORMAT, RESOLVE, phase
+    from nl.export.sorting import sort_key, sorting
+
+    variants, mirror, licences_ids, sort_by, identifiers = args
+    encoders = [(get_formatter(fmt).encode_row, version) for fmt, version in variants]
+    loader = licence_loader(mirror)
+
+    keys = [] if sorting(sort_by) else None
+    idents = [] if identifiers else None
+    rows = [[] for _ in encoders]
+
+    # Erst alle Lizenzen laden, dann kodieren, so sind die Phasen im Profil getrennt
+    with phase(RESOLVE):
+        loaded = [loader(lids) for lids in licences_ids]
+
+    with phase(FORMAT):
+        for lids, (licence, licencee) in zip(licences_ids, loaded):
+            for vrows, (encode_row, version) in zip(rows, encoders):
+                vrows.append(encode_row(licence, licencee, version))
+            if keys is not None:
+                keys.append(sort_key(sort_by, lids, licencee))
+            if idents is not None:
+                idents.append(licencee_identifiers(licencee))
+
+    return (keys, rows, idents)
+
+
 def get_licencemodel(lurl: str) -> LicenceModel | None:
     """Lizenz-Modell bestimmen
 
@@ -105,7 +172,7 @@ def get_licencemodel(lurl: str) -> LicenceModel | None:
         lmodel = PloneItem(plone_uid=uuid.UUID(lurl).hex)
     else:
         urlobj = urlparse(lurl)
-        baseurl = urlparse(NLBASE_URL)
+        baseurl = urlparse(config.NLBASE_URL)
 
         if not bool(urlobj.hostname):
             # Wahrscheinlich getId
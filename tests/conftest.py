@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Die Tests laufen auch ohne Installation gegen src
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from pathlib import Path
+import os
+import sys
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+sys.path.insert(0, SRC)
+
+# Für die Messung der Importzeiten in einem eigenen Prozess
+os.environ["PYTHONPATH"] = os.pathsep.join(path for path in (SRC, os.environ.get("PYTHONPATH")) if path)
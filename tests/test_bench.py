@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Budgets für Startzeit und Formatierer, wie `nl-export bench`
+
+##############################################################################
+#
+# Copyright (c) 2024 Verbundzentrale des GBV.
+# All Rights Reserved.
+#
+##############################################################################
+"""
+
+from argparse import Namespace
+from nl.export import codec
+from nl.export.tools.export.bench import bench_formatter, bench_start
+
+__author__ = """Marc-J. Tegethoff <tegethoff@gbv.de>"""
+__docformat__ = 'plaintext'
+
+
+def formatter_options(baseline, speichern=False, toleranz=75.0) -> Namespace:
+    return Namespace(zeilen=2000, stufe=None, baseline=baseline, speichern=speichern, toleranz=toleranz)
+
+
+def test_start_budget():
+    assert bench_start(Namespace(budget=50.0, anzahl=10))
+
+
+def test_formatter_baseline(tmp_path):
+    baseline = tmp_path / "bench.json"
+
+    assert bench_formatter(formatter_options(baseline, speichern=True))
+    assert baseline.is_file()
+
+    # Kleine Stufen streuen stark, die Toleranz ist daher großzügig
+    assert bench_formatter(formatter_options(baseline))
+
+
+def test_formatter_regression(tmp_path):
+    baseline = tmp_path / "bench.json"
+
+    assert bench_formatter(formatter_options(baseline, speichern=True))
+
+    results = codec.loads(baseline.read_bytes())
+    baseline.write_bytes(codec.dumps({key: result | {"zeilen_s": result["zeilen_s"] * 100}
+                                      for key, result in results.items()}))
+
+    assert not bench_formatter(formatter_options(baseline, toleranz=20.0))